@@ -0,0 +1,172 @@
+"""
+北航自由搏击 - 后台AI决策
+把AI决策放到后台线程或进程中：主循环到了决策时间只发送双方角色的快照，
+后台在影子角色上做决策后通过队列返回(动作, 持续帧数)，
+结果返回之前主循环继续执行上一个决策，因此再慢的AI也不会拖慢渲染帧
+"""
+
+import multiprocessing
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from fight_core import (FPS, AIDifficulty, AIController, FighterCore, MatchState,
+                        create_ai_controller)
+
+def _worker_loop(requests, results, options):
+    """
+    后台循环，消息格式：
+      ('reset', 难度值, 种子)          换一局对战时重建AI
+      ('decide', 编号, 帧数, 己方快照, 对手快照)
+      None                             退出
+    每个决策返回(编号, 动作, 持续帧数, 计算耗时秒)
+    """
+    shadow = MatchState(FighterCore(0, 0, "ai"), FighterCore(0, 0, "target"))
+    controller = None
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        if message[0] == 'reset':
+            _, difficulty, seed = message
+            controller = create_ai_controller(shadow.player1, AIDifficulty(difficulty), shadow.clock,
+                                              rng=random.Random(seed), **options)
+            controller.target = shadow.player2
+            continue
+
+        _, request_id, ticks, fighter_blob, target_blob = message
+        start = time.perf_counter()
+        shadow.player1.restore(fighter_blob)
+        shadow.player2.restore(target_blob)
+        shadow.clock.ticks = ticks
+        controller._make_decision()
+        results.put((request_id, controller.current_action, controller.action_timer,
+                     time.perf_counter() - start))
+
+class AIWorker:
+    """
+    后台AI决策器，mode为'process'（默认，不受GIL影响）或'thread'
+    options原样传给create_ai_controller（如搜索预算、神经网络策略文件）
+    同一时间最多只有一个未完成的决策请求；deadline_ms内没有返回的决策记为超时
+    """
+    def __init__(self, mode='process', deadline_ms=1000 / FPS, history=1000, **options):
+        if mode == 'process':
+            self.requests = multiprocessing.Queue()
+            self.results = multiprocessing.Queue()
+            self.worker = multiprocessing.Process(target=_worker_loop,
+                                                  args=(self.requests, self.results, options), daemon=True)
+        elif mode == 'thread':
+            self.requests = queue.Queue()
+            self.results = queue.Queue()
+            self.worker = threading.Thread(target=_worker_loop,
+                                           args=(self.requests, self.results, options), daemon=True)
+        else:
+            raise ValueError(f"未知的后台模式：{mode}")
+        self.mode = mode
+        self.deadline = deadline_ms / 1000
+        self.worker.start()
+
+        self.next_id = 0
+        self.pending = None  # 未完成请求的(编号, 发送时间, 是否已记为超时)
+
+        # 延迟统计：最近history次决策的往返延迟和后台计算耗时（秒）
+        self.latencies = deque(maxlen=history)
+        self.compute_times = deque(maxlen=history)
+        self.decisions = 0
+        self.deadline_misses = 0
+
+    def reset(self, difficulty, seed):
+        """开始新的一局：丢弃未完成的请求并在后台重建AI"""
+        self.pending = None
+        self.requests.put(('reset', difficulty.value, seed))
+
+    def request(self, fighter, target, ticks):
+        """发送一次决策请求，已有未完成请求时返回False"""
+        if self.pending is not None:
+            return False
+        self.next_id += 1
+        self.pending = (self.next_id, time.perf_counter(), False)
+        self.requests.put(('decide', self.next_id, ticks, fighter.snapshot(), target.snapshot()))
+        return True
+
+    def poll(self):
+        """非阻塞地取回决策，返回(动作, 持续帧数)；还没有新决策时返回None"""
+        if self.pending is None:
+            return None
+        request_id, sent, missed = self.pending
+        decision = None
+        while True:
+            try:
+                result_id, action, timer, compute_time = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if result_id != request_id:
+                continue  # 换局前发出的旧请求
+            latency = time.perf_counter() - sent
+            self.latencies.append(latency)
+            self.compute_times.append(compute_time)
+            self.decisions += 1
+            if latency > self.deadline and not missed:
+                self.deadline_misses += 1
+            self.pending = None
+            decision = (action, timer)
+        if self.pending is not None and not missed and time.perf_counter() - sent > self.deadline:
+            # 超过期限仍未返回，本帧起继续沿用旧决策
+            self.deadline_misses += 1
+            self.pending = (request_id, sent, True)
+        return decision
+
+    def stats(self):
+        """决策次数、超时次数和延迟分位数（毫秒）"""
+        latencies = sorted(self.latencies)
+        compute_times = sorted(self.compute_times)
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000 if values else 0.0
+
+        return {
+            'decisions': self.decisions,
+            'deadline_misses': self.deadline_misses,
+            'latency_p50': percentile(latencies, 50),
+            'latency_p99': percentile(latencies, 99),
+            'latency_max': latencies[-1] * 1000 if latencies else 0.0,
+            'compute_p50': percentile(compute_times, 50),
+            'compute_p99': percentile(compute_times, 99),
+        }
+
+    def close(self):
+        if self.worker.is_alive():
+            self.requests.put(None)
+            self.worker.join(timeout=1.0)
+
+class AsyncAIController(AIController):
+    """
+    与AIController接口相同的AI，决策交给AIWorker在后台完成
+    到了决策时间只发出请求，结果返回之前继续执行当前动作
+    """
+    def __init__(self, fighter, difficulty, worker, clock=None, seed=0):
+        super().__init__(fighter, difficulty, clock)
+        self.worker = worker
+        worker.reset(difficulty, seed)
+
+    def update(self, target):
+        self.target = target
+        current_time = self.clock.get_ticks()
+
+        # 更新动作计时器；新决策还没返回时最后一个动作不过期，一直执行到结果到达
+        # （神经网络AI每个决策只持续1帧，否则后台每慢一帧角色就会停一帧）
+        if self.action_timer > 1 or (self.action_timer == 1 and self.worker.pending is None):
+            self.action_timer -= 1
+
+        decision = self.worker.poll()
+        if decision is not None:
+            self.current_action, self.action_timer = decision
+
+        # 到了决策时间就把当前状态发给后台
+        if current_time - self.last_decision_time >= self.decision_interval:
+            if self.worker.request(self.fighter, target, self.clock.ticks):
+                self.last_decision_time = current_time
+
+        return self._execute_action()
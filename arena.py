@@ -0,0 +1,336 @@
+"""
+北航自由搏击 - 多人竞技场
+N名AI角色同场混战（各自为战或分队），战斗规则沿用fight_core.FighterCore；
+AI的目标选择通过按x坐标排序的索引查找最近的敌人，攻击、特技和招式命中
+在索引中取出招式够得到的x范围内的敌人，按距离依次用攻击框判定，
+每帧只需一次近似有序的排序加O(log N)的查询，不做两两比较
+
+用法：
+  python arena.py --fighters 300 --ticks 3600               无界面压力测试
+  python arena.py --fighters 40 --teams 2 --view           打开窗口观战
+  python arena.py --fighters 200 --verify                   与两两比较的结果逐帧对照（另含角色扎堆站位的一轮）
+"""
+
+import argparse
+import random
+import time
+from bisect import bisect_left, bisect_right
+
+from fight_core import (SCREEN_WIDTH, SCREEN_HEIGHT, FPS, GROUND_Y, MATCH_DURATION, MOVE_SET, AIDifficulty,
+                        FighterCore, TickClock, create_ai_controller, virtual_keys_to_inputs)
+
+ATTACK = MOVE_SET['attack']
+SPECIAL_ATTACK = MOVE_SET['special_attack']
+
+class XIndex:
+    """
+    按x排序的角色索引
+    分队时每队一个有序列表，查询时只在敌方各队中二分查找；
+    各自为战时所有角色放在同一个列表里，最近的邻居就是敌人
+    """
+    def __init__(self, teams, team_mode):
+        self.teams = teams
+        self.team_mode = team_mode
+        self.groups = []  # [(队伍, xs, ids)]，各自为战时队伍为None
+
+    def rebuild(self, fighters, alive):
+        """每帧开始时按当前位置重建，上一帧的顺序几乎有序，排序接近线性时间"""
+        if self.team_mode:
+            members = {}
+            for i, fighter in enumerate(fighters):
+                if alive[i]:
+                    members.setdefault(self.teams[i], []).append((fighter.x, i))
+            groups = members.items()
+        else:
+            groups = [(None, [(fighter.x, i) for i, fighter in enumerate(fighters) if alive[i]])]
+        self.groups = []
+        for team, entries in groups:
+            entries.sort()
+            self.groups.append((team, [x for x, _ in entries], [i for _, i in entries]))
+
+    def nearest_enemy(self, i, x, max_range=None):
+        """距离x最近的敌人编号（距离相同时取编号小的），max_range内没有敌人时返回None"""
+        teams = self.teams
+        team = teams[i]
+        best = None
+        best_distance = float('inf') if max_range is None else max_range
+        for group_team, xs, ids in self.groups:
+            if group_team == team:
+                continue
+            start = bisect_left(xs, x)
+            # 从x处分别向左、向右扫描，距离超过当前最优值就停止；距离相同的继续看，取编号小的
+            for j, stop, direction in ((start - 1, -1, -1), (start, len(xs), 1)):
+                while j != stop:
+                    distance = abs(xs[j] - x)
+                    if distance > best_distance:
+                        break
+                    candidate = ids[j]
+                    if teams[candidate] != team and (best is None or (distance, candidate) < (best_distance, best)):
+                        best, best_distance = candidate, distance
+                    j += direction
+        return best
+
+    def enemies_in_range(self, i, x, max_range):
+        """与x的距离不超过max_range的全部敌人，按(距离, 编号)排序"""
+        teams = self.teams
+        team = teams[i]
+        found = []
+        for group_team, xs, ids in self.groups:
+            if group_team == team:
+                continue
+            for j in range(bisect_left(xs, x - max_range), bisect_right(xs, x + max_range)):
+                candidate = ids[j]
+                distance = abs(xs[j] - x)
+                if teams[candidate] != team and distance <= max_range:
+                    found.append((distance, candidate))
+        found.sort()
+        return [candidate for _, candidate in found]
+
+class PairwiseIndex(XIndex):
+    """两两比较的参照实现，与XIndex使用同一帧开始时的位置和相同的平局规则，只用于校验"""
+    def rebuild(self, fighters, alive):
+        self.positions = [(fighter.x, i) for i, fighter in enumerate(fighters) if alive[i]]
+
+    def nearest_enemy(self, i, x, max_range=None):
+        team = self.teams[i]
+        best = None
+        best_key = None
+        for other_x, other in self.positions:
+            if self.teams[other] == team:
+                continue
+            distance = abs(other_x - x)
+            if max_range is not None and distance > max_range:
+                continue
+            if best_key is None or (distance, other) < best_key:
+                best, best_key = other, (distance, other)
+        return best
+
+    def enemies_in_range(self, i, x, max_range):
+        team = self.teams[i]
+        found = [(abs(other_x - x), other) for other_x, other in self.positions
+                 if self.teams[other] != team and abs(other_x - x) <= max_range]
+        found.sort()
+        return [other for _, other in found]
+
+class ArenaState:
+    """
+    N名角色的竞技场，teams为0时各自为战，否则按编号轮流分成teams队
+    positions可指定出生点，默认在场地内均匀分布
+    """
+    def __init__(self, count, teams=0, difficulty=AIDifficulty.HARD, seed=None, positions=None,
+                 ground_y=GROUND_Y, fighter_factory=None, index_class=XIndex, **ai_options):
+        self.ground_y = ground_y
+        self.clock = TickClock()
+        self.team_mode = teams > 0
+        self.teams = [i % teams if teams else i for i in range(count)]
+        if positions is None:
+            spacing = (SCREEN_WIDTH - 60) / max(1, count - 1)
+            positions = [i * spacing for i in range(count)]
+        factory = fighter_factory or (lambda x, y, name, team: FighterCore(x, y, name))
+
+        rng = random.Random(seed)
+        self.fighters = []
+        self.controllers = []
+        for i, x in enumerate(positions):
+            fighter = factory(x, ground_y - 80, f"{i}", self.teams[i])
+            fighter.clock = self.clock
+            self.fighters.append(fighter)
+            self.controllers.append(create_ai_controller(fighter, difficulty, self.clock,
+                                                         rng=random.Random(rng.getrandbits(64)), **ai_options))
+        self.alive = [True] * count
+        self.index = index_class(self.teams, self.team_mode)
+        self.finished = False
+        self.winner_team = None
+
+    @property
+    def tick(self):
+        return self.clock.ticks
+
+    def hit_target(self, i, move, frame):
+        """
+        move第frame帧的攻击框能打中的敌人中最近的一个（距离相同取编号小的）
+        最近的敌人可能在身后或攻击框外，因此范围内的敌人逐个判定；都打不中时返回最近的敌人
+        """
+        fighter = self.fighters[i]
+        candidates = self.index.enemies_in_range(i, fighter.x, move.reach)
+        for candidate in candidates:
+            if fighter.hits(move, frame, self.fighters[candidate]):
+                return candidate
+        return candidates[0] if candidates else None
+
+    def alive_teams(self):
+        return {self.teams[i] for i, alive in enumerate(self.alive) if alive}
+
+    def step(self):
+        """推进一帧：先选目标和结算动作，再统一更新移动，最后移除倒下的角色，返回是否结束"""
+        if self.finished:
+            return True
+        fighters = self.fighters
+        alive = self.alive
+        index = self.index
+        index.rebuild(fighters, alive)
+
+        # AI按最近的敌人决策
+        frame_inputs = []
+        for i, fighter in enumerate(fighters):
+            if not alive[i]:
+                frame_inputs.append(None)
+                continue
+            target = index.nearest_enemy(i, fighter.x)
+            if target is None:
+                frame_inputs.append({})
+                continue
+            keys = self.controllers[i].update(fighters[target])
+            frame_inputs.append(virtual_keys_to_inputs(keys, fighter.controls))
+
+        # 与fight_core.step相同，按编号顺序结算本帧触发的动作
+        for i, inputs in enumerate(frame_inputs):
+            if not inputs:
+                continue
+            fighter = fighters[i]
+            if inputs.get('attack'):
+                target = self.hit_target(i, ATTACK, ATTACK.startup)
+                if target is not None:
+                    fighter.attack(fighters[target])
+            if inputs.get('special'):
+                target = self.hit_target(i, SPECIAL_ATTACK, SPECIAL_ATTACK.startup)
+                if target is not None:
+                    fighter.special_attack(fighters[target])
+            if inputs.get('dash'):
+                fighter.dash()
+
+        # 起手后进入有效帧的招式打攻击框碰到的最近的敌人
+        for i, inputs in enumerate(frame_inputs):
+            fighter = fighters[i]
+            if inputs is not None and fighter.move >= 0 and not fighter.move_hit:
+                move = MOVE_SET.by_index[fighter.move]
+                target = self.hit_target(i, move, move.total - fighter.attack_animation_time)
+                if target is not None:
+                    fighter.resolve_hit(fighters[target])
+
+        for i, inputs in enumerate(frame_inputs):
+            if inputs is not None:
+                fighters[i].update(inputs, self.ground_y)
+        for i, fighter in enumerate(fighters):
+            if alive[i] and fighter.health <= 0:
+                alive[i] = False
+
+        self.clock.advance()
+        teams = self.alive_teams()
+        if len(teams) <= 1:
+            self.winner_team = next(iter(teams), None)
+            self.finished = True
+        elif MATCH_DURATION - self.clock.seconds() <= 0:
+            # 时间到，剩余总血量最多的队伍获胜
+            totals = {}
+            for i, fighter in enumerate(fighters):
+                if alive[i]:
+                    totals[self.teams[i]] = totals.get(self.teams[i], 0) + fighter.health
+            best = max(totals.values())
+            leaders = [team for team, total in totals.items() if total == best]
+            self.winner_team = leaders[0] if len(leaders) == 1 else None
+            self.finished = True
+        return self.finished
+
+    def snapshot(self):
+        return b''.join(fighter.snapshot() for fighter in self.fighters)
+
+def stacked_positions(count, stack=4):
+    """每stack名角色站在同一个x上，用来检查距离相同和重叠时的目标选择"""
+    piles = max(1, (count + stack - 1) // stack)
+    spacing = (SCREEN_WIDTH - 60) / max(1, piles - 1)
+    return [(i // stack) * spacing for i in range(count)]
+
+def verify(count, teams, difficulty, seed, ticks, positions=None):
+    """与两两比较的参照实现逐帧对照，返回第一个不一致的帧号，全部一致时返回None"""
+    arena = ArenaState(count, teams, difficulty, seed, positions=positions)
+    reference = ArenaState(count, teams, difficulty, seed, positions=positions, index_class=PairwiseIndex)
+    while arena.tick < ticks:
+        finished = arena.step()
+        reference.step()
+        if reference.snapshot() != arena.snapshot():
+            return arena.tick
+        if finished:
+            break
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="多人竞技场")
+    parser.add_argument('--fighters', type=int, default=200, help="角色数量")
+    parser.add_argument('--teams', type=int, default=0, help="队伍数，0为各自为战")
+    parser.add_argument('--difficulty', default='HARD', choices=[d.name for d in AIDifficulty])
+    parser.add_argument('--ticks', type=int, default=MATCH_DURATION * FPS, help="最多运行的帧数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verify', action='store_true', help="同时运行两两比较的参照实现并逐帧对照")
+    parser.add_argument('--view', action='store_true', help="打开窗口观战")
+    args = parser.parse_args()
+
+    difficulty = AIDifficulty[args.difficulty]
+    if args.view:
+        view(args.fighters, args.teams, difficulty, args.seed)
+        return
+
+    if args.verify:
+        for layout, positions in (("均匀站位", None), ("扎堆站位", stacked_positions(args.fighters))):
+            tick = verify(args.fighters, args.teams, difficulty, args.seed, args.ticks, positions)
+            if tick is not None:
+                print(f"{layout}：第{tick}帧与两两比较的结果不一致")
+                return
+            print(f"{layout}：与两两比较的结果逐帧一致")
+
+    arena = ArenaState(args.fighters, args.teams, difficulty, args.seed)
+    tick_times = []
+    while arena.tick < args.ticks:
+        start = time.perf_counter()
+        finished = arena.step()
+        tick_times.append(time.perf_counter() - start)
+        if finished:
+            break
+
+    tick_times.sort()
+    total = sum(tick_times)
+    p50 = tick_times[len(tick_times) // 2] * 1000
+    p99 = tick_times[int(len(tick_times) * 0.99)] * 1000
+    budget = 1000 / FPS
+    print(f"{args.fighters}名角色 {arena.tick}帧 用时{total:.2f}秒（{arena.tick / total:,.0f}帧/秒），"
+          f"每帧p50 {p50:.2f}ms p99 {p99:.2f}ms，{'满足' if p99 <= budget else '超出'}{budget:.1f}ms预算")
+    survivors = sum(arena.alive)
+    winner = "平局" if arena.winner_team is None else f"队伍{arena.winner_team}"
+    print(f"剩余{survivors}名角色，{'已结束：' + winner if arena.finished else '未结束'}")
+
+def view(count, teams, difficulty, seed):
+    """用游戏的Fighter绘制竞技场，按队伍着色"""
+    import pygame
+    from fighting_game import Fighter
+    from sprites import load_sprite_atlas
+
+    palette = [(0, 200, 0), (255, 165, 0), (128, 0, 128), (0, 128, 255), (200, 0, 0), (0, 200, 200)]
+
+    def factory(x, y, name, team):
+        return Fighter(x, y, name, palette[team % len(palette)], None)
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("北航自由搏击 - 竞技场")
+    # 各队颜色的角色帧一次性烘焙进同一张图集
+    load_sprite_atlas(palette, MOVE_SET.body_width, MOVE_SET.body_height)
+    clock = pygame.time.Clock()
+    arena = ArenaState(count, teams, difficulty, seed, fighter_factory=factory)
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                running = False
+        if not arena.finished:
+            arena.step()
+        screen.fill((135, 206, 235))
+        pygame.draw.rect(screen, (139, 69, 19), (0, arena.ground_y, SCREEN_WIDTH, SCREEN_HEIGHT - arena.ground_y))
+        for i, fighter in enumerate(arena.fighters):
+            if arena.alive[i]:
+                fighter.draw(screen)
+        pygame.display.flip()
+        clock.tick(FPS)
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+"""
+北航自由搏击 - NumPy批量对战模拟
+用结构化数组同时推进N局对战，每个字段一列数组，形状为(N, 2)，第二维是玩家1/玩家2
+规则与fight_core.step逐帧一致，用于大规模评估AI和数值平衡
+
+吞吐量：单核上默认1万局并发约4.2万局/分钟，3万局并发约5.2万局/分钟（随机输入，平均每局约3200帧）
+瓶颈是每帧数十次NumPy调用的固定开销和(N, 2)列的跨步访问，而不是判定本身；
+再往上需要多进程分片或把step编译成原生代码
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from fight_core import (SCREEN_WIDTH, FPS, GROUND_Y, MATCH_DURATION, ACTIONS, MOVE_SET,
+                        FighterCore, MatchState, step, mask_to_inputs)
+
+# 输入位掩码中每个动作对应的位
+BIT = {action: 1 << i for i, action in enumerate(ACTIONS)}
+
+# 角色数值直接取自标量规则，保证两边参数一致
+_PROTO = FighterCore(0, 0, '')
+
+def _compile_move_tables(move_set):
+    """
+    把招式帧数据展开成按[招式, 是否面向右, 帧]下标的数组，最后一行是“没有出招”（招式编号-1），
+    其攻击框全部无效、受击框为整个身体；框用float64存放，与坐标相加时不必转换类型
+    """
+    moves = move_set.by_index
+    rows = len(moves) + 1
+    frames = max(move.total for move in moves)
+    total = np.zeros(rows, dtype=np.int32)
+    active = np.zeros((rows, 2, frames), dtype=bool)
+    hitboxes = np.zeros((rows, 2, frames, 4), dtype=np.float64)
+    hurtboxes = np.zeros((rows, 2, frames, 4), dtype=np.float64)
+    hurtboxes[-1] = move_set.body_box
+    stats = {name: np.zeros(rows, dtype=np.int32)
+             for name in ('damage', 'block_damage', 'combo_bonus', 'stun', 'energy_gain')}
+    for m, move in enumerate(moves):
+        total[m] = move.total
+        for facing in (0, 1):
+            for frame in range(move.total):
+                box = move.hitboxes[facing][frame]
+                if box is not None:
+                    active[m, facing, frame] = True
+                    hitboxes[m, facing, frame] = box
+                hurtboxes[m, facing, frame] = move.hurtboxes[facing][frame]
+        for name, column in stats.items():
+            column[m] = getattr(move, name)
+    return total, active, hitboxes, hurtboxes, stats
+
+(_MOVE_TOTAL, _HIT_ACTIVE, _HITBOXES, _HURTBOXES, _MOVE_STATS) = _compile_move_tables(MOVE_SET)
+# 判定时按(招式 * 2 + 朝向) * 帧数 + 帧算出一维下标，一次取出整行，比多维花式索引快；
+# 招式-1算出的负下标正好落在最后一行
+_FRAMES = _HIT_ACTIVE.shape[2]
+_HIT_ACTIVE_FLAT = _HIT_ACTIVE.reshape(-1)
+_HITBOXES_FLAT = _HITBOXES.reshape(-1, 4)
+_HURTBOXES_FLAT = _HURTBOXES.reshape(-1, 4)
+_TIME_LIMIT = MATCH_DURATION * FPS
+
+class BatchMatch:
+    """N局对战的批量状态"""
+    def __init__(self, count, ground_y=GROUND_Y):
+        self.count = count
+        self.ground_y = ground_y
+
+        # 每局各自的帧数，结束的对局可以单独重开，不必等整批结束
+        self.ticks = np.zeros(count, dtype=np.int64)
+
+        shape = (count, 2)
+        self.x = np.zeros(shape, dtype=np.float64)
+        self.y = np.zeros(shape, dtype=np.float64)
+        self.velocity_y = np.zeros(shape, dtype=np.float64)
+        self.on_ground = np.zeros(shape, dtype=bool)
+        self.facing_right = np.zeros(shape, dtype=bool)
+        self.health = np.zeros(shape, dtype=np.int32)
+        self.special_energy = np.zeros(shape, dtype=np.int32)
+        self.combo_count = np.zeros(shape, dtype=np.int32)
+        self.last_attack_time = np.zeros(shape, dtype=np.int64)
+        self.is_attacking = np.zeros(shape, dtype=bool)
+        self.attack_animation_time = np.zeros(shape, dtype=np.int32)
+        self.move = np.zeros(shape, dtype=np.int8)
+        self.move_hit = np.zeros(shape, dtype=bool)
+        self.is_blocking = np.zeros(shape, dtype=bool)
+        self.last_dash_time = np.zeros(shape, dtype=np.int64)
+        self.is_dashing = np.zeros(shape, dtype=bool)
+        self.dash_animation_time = np.zeros(shape, dtype=np.int32)
+        self.stunned = np.zeros(shape, dtype=bool)
+        self.stun_timer = np.zeros(shape, dtype=np.int32)
+
+        # 每局的结果：winner为0/1表示玩家1/玩家2获胜，-1表示平局或未结束
+        self.finished = np.zeros(count, dtype=bool)
+        self.winner = np.full(count, -1, dtype=np.int8)
+        self.end_tick = np.zeros(count, dtype=np.int32)
+
+        # _update每帧复用的布尔数组，所有逐元素运算都写进这些数组，不产生临时数组
+        self._act = np.zeros(shape, dtype=bool)
+        self._free = np.zeros(shape, dtype=bool)
+        self._stunned = np.zeros(shape, dtype=bool)
+        self._scratch = np.zeros(shape, dtype=bool)
+        self._scratch2 = np.zeros(shape, dtype=bool)
+
+        self.reset()
+
+    def reset(self, rows=slice(None)):
+        """把指定对局（默认全部）恢复到开局状态，rows可以是切片、下标或布尔掩码"""
+        self.ticks[rows] = 0
+        self.x[rows, 0] = 200
+        self.x[rows, 1] = 600
+        self.y[rows] = self.ground_y - _PROTO.height
+        self.velocity_y[rows] = 0
+        self.on_ground[rows] = True
+        self.facing_right[rows] = True
+        self.health[rows] = _PROTO.max_health
+        self.special_energy[rows] = 0
+        self.combo_count[rows] = 0
+        self.last_attack_time[rows] = -_PROTO.attack_cooldown
+        self.is_attacking[rows] = False
+        self.attack_animation_time[rows] = 0
+        self.move[rows] = -1
+        self.move_hit[rows] = False
+        self.is_blocking[rows] = False
+        self.last_dash_time[rows] = -_PROTO.dash_cooldown
+        self.is_dashing[rows] = False
+        self.dash_animation_time[rows] = 0
+        self.stunned[rows] = False
+        self.stun_timer[rows] = 0
+        self.finished[rows] = False
+        self.winner[rows] = -1
+        self.end_tick[rows] = 0
+
+    def compact(self, rows):
+        """只保留rows（下标数组）中的对局，对局数随之变为len(rows)"""
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray):
+                setattr(self, name, value[rows].copy())
+        self.count = len(rows)
+
+    def step(self, masks):
+        """
+        所有未结束的对局推进一帧
+        masks为(N, 2)的整数数组，每个元素是fight_core.inputs_to_mask的位掩码
+        返回是否全部对局都已结束
+        """
+        active = ~self.finished
+        # 一次拆出全部按键位，结束的对局输入清零
+        masks = masks.astype(np.uint8)
+        masks[self.finished] = 0
+        pressed = {action: (masks & BIT[action]) != 0 for action in ACTIONS}
+
+        # 与fight_core.step相同：玩家1先结算动作，玩家2后结算
+        # 攻击、特技和闪现的按键很稀疏，先取出按下的对局，条件只在这些对局上判断
+        for attacker, target in ((0, 1), (1, 0)):
+            self._attack(attacker, target, pressed['attack'][:, attacker])
+            self._special_attack(attacker, target, pressed['special'][:, attacker])
+            self._dash(attacker, pressed['dash'][:, attacker])
+        # 起手后进入有效帧的招式按双方当前的受击框判定命中
+        self._resolve_hit(0, 1, active)
+        self._resolve_hit(1, 0, active)
+
+        self._update(pressed, active)
+
+        self.ticks += active
+        self._check_finished(active)
+        return bool(self.finished.all())
+
+    def _hits(self, rows, a, t, move, frame):
+        """
+        对应FighterCore.hits：rows中各局玩家a的招式move第frame帧的攻击框是否与对手当前的受击框相交
+        rows为对局下标数组，move/frame为同长度的数组或标量
+        """
+        index = (np.asarray(move, dtype=np.intp) * 2 + self.facing_right[rows, a]) * _FRAMES + frame
+        box = _HITBOXES_FLAT[index]
+        target_move = self.move[rows, t].astype(np.intp)
+        target_frame = _MOVE_TOTAL[target_move] - self.attack_animation_time[rows, t]
+        hurt = _HURTBOXES_FLAT[(target_move * 2 + self.facing_right[rows, t]) * _FRAMES + target_frame]
+        left = self.x[rows, a] + box[:, 0]
+        top = self.y[rows, a] + box[:, 1]
+        target_left = self.x[rows, t] + hurt[:, 0]
+        target_top = self.y[rows, t] + hurt[:, 1]
+        return (_HIT_ACTIVE_FLAT[index]
+                & (left <= target_left + hurt[:, 2]) & (target_left <= left + box[:, 2])
+                & (top <= target_top + hurt[:, 3]) & (target_top <= top + box[:, 3]))
+
+    def _startable(self, a, t, rows, move):
+        """对应FighterCore._start_move开头的判断，返回rows中能出招的对局下标"""
+        if not move.whiff and len(rows):
+            rows = rows[self._hits(rows, a, t, move.index, move.startup)]
+        return rows
+
+    def _start_move(self, a, t, rows, move):
+        self.move[rows, a] = move.index
+        self.move_hit[rows, a] = False
+        self.is_attacking[rows, a] = True
+        self.attack_animation_time[rows, a] = move.total
+        if move.startup == 0:
+            self._resolve_hit(a, t, rows)
+
+    def _resolve_hit(self, a, t, rows):
+        """对应FighterCore.resolve_hit，只处理rows（下标数组或布尔掩码）中的对局"""
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows & (self.move[:, a] >= 0) & ~self.move_hit[:, a] & ~self.stunned[:, a])
+        if len(rows) == 0:
+            return
+        move = self.move[rows, a]
+        rows = rows[self._hits(rows, a, t, move, _MOVE_TOTAL[move] - self.attack_animation_time[rows, a])]
+        if len(rows) == 0:
+            return
+        move = self.move[rows, a]
+        self.move_hit[rows, a] = True
+
+        # 被防御时只受防御伤害，否则计算连击加成和击晕
+        blocked = self.is_blocking[rows, t]
+        combo_bonus = _MOVE_STATS['combo_bonus'][move]
+        combo = ~blocked & (combo_bonus > 0)
+        self.combo_count[rows[combo], a] += 1
+        damage = np.where(blocked, _MOVE_STATS['block_damage'][move],
+                          _MOVE_STATS['damage'][move] + self.combo_count[rows, a] * combo_bonus)
+        stun_time = _MOVE_STATS['stun'][move]
+        stun = ~blocked & (stun_time > 0)
+        self.stunned[rows[stun], t] = True
+        self.stun_timer[rows[stun], t] = stun_time[stun]
+        actual = np.maximum(1, damage - _PROTO.defense)
+        self.health[rows, t] = np.maximum(0, self.health[rows, t] - actual)
+
+        gain = _MOVE_STATS['energy_gain'][move]
+        self.special_energy[rows, a] = np.minimum(_PROTO.max_special_energy, self.special_energy[rows, a] + gain)
+
+    def _current_time(self, rows):
+        """rows中各局的毫秒时间，与TickClock.get_ticks相同"""
+        return self.ticks[rows] * 1000 // FPS
+
+    def _attack(self, a, t, mask):
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return
+        ok = ((self._current_time(rows) - self.last_attack_time[rows, a] >= _PROTO.attack_cooldown)
+              & ~self.is_attacking[rows, a] & ~self.stunned[rows, a] & ~self.is_dashing[rows, a])
+        move = MOVE_SET['attack']
+        rows = self._startable(a, t, rows[ok], move)
+        self.last_attack_time[rows, a] = self._current_time(rows)
+        self._start_move(a, t, rows, move)
+
+    def _special_attack(self, a, t, mask):
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return
+        ok = ((self.special_energy[rows, a] >= _PROTO.special_energy_cost)
+              & ~self.stunned[rows, a] & ~self.is_dashing[rows, a])
+        move = MOVE_SET['special_attack']
+        rows = self._startable(a, t, rows[ok], move)
+        self.special_energy[rows, a] -= _PROTO.special_energy_cost
+        self._start_move(a, t, rows, move)
+
+    def _dash(self, a, mask):
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return
+        current_time = self._current_time(rows)
+        ok = ((current_time - self.last_dash_time[rows, a] >= _PROTO.dash_cooldown)
+              & ~self.stunned[rows, a] & ~self.is_attacking[rows, a] & ~self.is_dashing[rows, a])
+        rows = rows[ok]
+
+        self.last_dash_time[rows, a] = current_time[ok]
+        self.is_dashing[rows, a] = True
+        self.dash_animation_time[rows, a] = 10
+
+        offset = np.where(self.facing_right[rows, a], _PROTO.dash_distance, -_PROTO.dash_distance)
+        self.x[rows, a] = np.clip(self.x[rows, a] + offset, 0, SCREEN_WIDTH - _PROTO.width)
+
+    def _update(self, pressed, active):
+        """
+        对应FighterCore.update，两名玩家同时处理
+        全部写成带out/where的原地运算；布尔数组的a & ~b写成a > b，省掉取反的临时数组
+        """
+        act = self._act
+        stunned = self._stunned
+        scratch = self._scratch
+        scratch2 = self._scratch2
+        np.copyto(act, active[:, None])
+        np.logical_and(self.stunned, act, out=stunned)
+        if stunned.any():
+            np.subtract(self.stun_timer, 1, out=self.stun_timer, where=stunned)
+            np.less_equal(self.stun_timer, 0, out=scratch)
+            scratch &= stunned
+            np.greater(self.stunned, scratch, out=self.stunned)
+            # 被击晕的角色本帧不做其他更新
+            np.greater(act, stunned, out=act)
+
+        # 闪现动画更新
+        np.logical_and(act, self.is_dashing, out=scratch)
+        if scratch.any():
+            np.subtract(self.dash_animation_time, 1, out=self.dash_animation_time, where=scratch)
+            np.less_equal(self.dash_animation_time, 0, out=scratch2)
+            scratch2 &= scratch
+            np.greater(self.is_dashing, scratch2, out=self.is_dashing)
+
+        # 移动控制
+        # 角色始终在场地内，所以整列夹紧与只夹紧移动过的角色等价
+        free = self._free
+        np.greater(act, self.is_attacking, out=free)
+        np.greater(free, self.is_dashing, out=free)
+        np.logical_and(free, pressed['left'], out=scratch)
+        np.subtract(self.x, _PROTO.speed, out=self.x, where=scratch)
+        np.maximum(self.x, 0, out=self.x)
+        np.greater(self.facing_right, scratch, out=self.facing_right)
+        np.logical_and(free, pressed['right'], out=scratch)
+        np.add(self.x, _PROTO.speed, out=self.x, where=scratch)
+        np.minimum(self.x, SCREEN_WIDTH - _PROTO.width, out=self.x)
+        self.facing_right |= scratch
+
+        # 跳跃控制
+        np.logical_and(free, pressed['jump'], out=scratch)
+        scratch &= self.on_ground
+        np.copyto(self.velocity_y, -_PROTO.jump_power, where=scratch)
+        np.greater(self.on_ground, scratch, out=self.on_ground)
+
+        # 防御控制
+        np.greater(pressed['block'], self.is_dashing, out=scratch)
+        np.copyto(self.is_blocking, scratch, where=act)
+
+        # 重力和落地检测
+        np.greater(act, self.on_ground, out=scratch)
+        if scratch.any():
+            np.add(self.velocity_y, 0.8, out=self.velocity_y, where=scratch)
+            np.add(self.y, self.velocity_y, out=self.y, where=scratch)
+            floor = self.ground_y - _PROTO.height
+            np.greater_equal(self.y, floor, out=scratch2)
+            scratch2 &= scratch
+            np.copyto(self.y, floor, where=scratch2)
+            np.copyto(self.velocity_y, 0, where=scratch2)
+            self.on_ground |= scratch2
+
+        # 攻击动画更新
+        np.logical_and(act, self.is_attacking, out=scratch)
+        if scratch.any():
+            np.subtract(self.attack_animation_time, 1, out=self.attack_animation_time, where=scratch)
+            np.less_equal(self.attack_animation_time, 0, out=scratch2)
+            scratch2 &= scratch
+            np.greater(self.is_attacking, scratch2, out=self.is_attacking)
+            np.copyto(self.move, -1, where=scratch2)
+
+    def _check_finished(self, active):
+        # 绝大多数帧没有对局结束，先用一次判断筛出本帧结束的对局，再只对它们分胜负
+        # 帧数是整数，ticks >= MATCH_DURATION * FPS与fight_core中剩余时间<=0等价
+        done = (self.health[:, 0] <= 0) | (self.health[:, 1] <= 0) | (self.ticks >= _TIME_LIMIT)
+        rows = np.flatnonzero(done & active)
+        if len(rows) == 0:
+            return
+        health = self.health[rows]
+        p1_dead = health[:, 0] <= 0
+        p2_dead = ~p1_dead & (health[:, 1] <= 0)
+        time_up = ~p1_dead & ~p2_dead
+
+        winner = self.winner[rows]
+        winner[p1_dead] = 1
+        winner[p2_dead] = 0
+        winner[time_up & (health[:, 0] > health[:, 1])] = 0
+        winner[time_up & (health[:, 1] > health[:, 0])] = 1
+        self.winner[rows] = winner
+        self.finished[rows] = True
+        self.end_tick[rows] = self.ticks[rows]
+
+# 随机输入中各动作的按下概率（单位1/256），攻击类按键较低，接近真实操作
+_RANDOM_PRESS = np.array([77, 77, 13, 51, 51, 13, 5], dtype=np.uint8)
+
+def random_masks(rng, count):
+    """生成一帧随机输入位掩码，形状(count, 2)"""
+    # 按动作分块抽取，逐个动作比较后或进对应的位，每步都是连续内存上的uint8运算
+    draws = rng.integers(0, 256, size=(len(ACTIONS), count, 2), dtype=np.uint8)
+    masks = np.zeros((count, 2), dtype=np.uint8)
+    for i, press in enumerate(_RANDOM_PRESS):
+        masks |= (draws[i] < press).view(np.uint8) << np.uint8(i)
+    return masks
+
+def run_random_matches(total, concurrency=10000, seed=0):
+    """
+    用随机输入跑完total局对战，结束的槽位立即开新局以保持数组满载
+    返回(winner, end_tick)两个长度为total的数组
+    """
+    rng = np.random.default_rng(seed)
+    batch = BatchMatch(min(concurrency, total))
+    retired = np.zeros(batch.count, dtype=bool)  # 不再开新局的槽位
+    started = batch.count
+    winners = []
+    lengths = []
+    while not retired.all():
+        batch.step(random_masks(rng, batch.count))
+        done = np.flatnonzero(batch.finished & ~retired)
+        if len(done) == 0:
+            continue
+        winners.append(batch.winner[done].copy())
+        lengths.append(batch.end_tick[done].copy())
+
+        refill = done[:total - started]
+        started += len(refill)
+        batch.reset(refill)
+        retired[done[len(refill):]] = True
+        # 收尾阶段超过一半槽位已停用时收缩数组，剩下的对局不再带着空槽位计算
+        if retired.sum() * 2 > batch.count:
+            keep = np.flatnonzero(~retired)
+            batch.compact(keep)
+            retired = retired[keep]
+    return np.concatenate(winners), np.concatenate(lengths)
+
+def verify_against_scalar(count=32, ticks=3000, seed=0):
+    """用相同的随机输入分别运行批量模拟和fight_core.step，返回第一处不一致的描述，完全一致时返回None"""
+    rng = np.random.default_rng(seed)
+    batch = BatchMatch(count)
+    matches = [MatchState() for _ in range(count)]
+    fields = ('x', 'y', 'velocity_y', 'health', 'special_energy', 'combo_count',
+              'is_attacking', 'move', 'move_hit', 'is_blocking', 'is_dashing', 'stunned', 'stun_timer')
+
+    for tick in range(ticks):
+        masks = random_masks(rng, count)
+        batch.step(masks)
+        for i, state in enumerate(matches):
+            step(state, mask_to_inputs(int(masks[i, 0])), mask_to_inputs(int(masks[i, 1])))
+            for p, fighter in enumerate((state.player1, state.player2)):
+                for field in fields:
+                    if getattr(fighter, field) != getattr(batch, field)[i, p]:
+                        return f"第{tick}帧 对局{i} 玩家{p + 1} {field}: {getattr(fighter, field)} != {getattr(batch, field)[i, p]}"
+            if state.finished != batch.finished[i]:
+                return f"第{tick}帧 对局{i} 结束状态不一致"
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy批量对战模拟")
+    parser.add_argument('--matches', type=int, default=100000, help="总对局数")
+    parser.add_argument('--concurrency', type=int, default=10000, help="同时模拟的对局数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verify', action='store_true', help="与标量规则逐帧对比")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatch = verify_against_scalar(seed=args.seed)
+        print("批量模拟与标量规则一致" if mismatch is None else mismatch)
+        return
+
+    start = time.perf_counter()
+    winners, lengths = run_random_matches(args.matches, args.concurrency, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{len(winners)}局 用时{elapsed:.2f}秒，{len(winners) / elapsed * 60:.0f}局/分钟")
+    print(f"玩家1胜率{(winners == 0).mean():.1%} 玩家2胜率{(winners == 1).mean():.1%} "
+          f"平局{(winners == -1).mean():.1%} 平均时长{lengths.mean() / FPS:.1f}秒")
+
+if __name__ == "__main__":
+    main()
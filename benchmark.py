@@ -0,0 +1,375 @@
+"""
+北航自由搏击 - 性能基准测试
+在SDL_VIDEODRIVER=dummy下测量对战逻辑、AI和渲染热路径的吞吐量，
+支持预热、多次重复、JSON输出，并可与保存的基线比较以发现性能退化
+
+用法：
+  python benchmark.py --output result.json
+  python benchmark.py --save-baseline benchmark_baseline.json
+  python benchmark.py --baseline benchmark_baseline.json --tolerance 0.1
+  python benchmark.py --alloc-check                   检查稳态绘制不分配内存
+"""
+
+import os
+
+# 必须在导入pygame之前设置，保证无显示器的机器也能运行
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from fight_core import (ACTIONS, AIDifficulty, AIController, FighterCore, MatchState,
+                        step, mask_to_inputs, virtual_keys_to_inputs)
+
+def bench_fighter_update():
+    """FighterCore.update：循环使用全部按键组合"""
+    fighter = FighterCore(400, 588, "bench")
+    inputs = [mask_to_inputs(mask) for mask in range(1 << len(ACTIONS))]
+    count = len(inputs)
+    index = [0]
+
+    def run():
+        fighter.update(inputs[index[0] % count], 668)
+        index[0] += 1
+    return run
+
+def bench_fighter_attack():
+    """FighterCore.attack：每次都命中的完整路径"""
+    attacker = FighterCore(400, 588, "attacker")
+    target = FighterCore(450, 588, "target")
+
+    def run():
+        attacker.last_attack_time = -attacker.attack_cooldown
+        attacker.is_attacking = False
+        attacker.clock.ticks += 1
+        target.health = target.max_health
+        attacker.attack(target)
+    return run
+
+def bench_fighter_special():
+    """FighterCore.special_attack：每次都命中的完整路径"""
+    attacker = FighterCore(400, 588, "attacker")
+    target = FighterCore(450, 588, "target")
+
+    def run():
+        attacker.special_energy = attacker.max_special_energy
+        target.health = target.max_health
+        attacker.special_attack(target)
+    return run
+
+def bench_ai(difficulty):
+    """AIController.update：两名角色在不同距离间循环，覆盖远/中/近三种决策分支"""
+    def factory():
+        state = MatchState()
+        ai = AIController(state.player2, difficulty, rng=random.Random(0))
+        positions = [200, 380, 560, 640]
+        index = [0]
+
+        def run():
+            state.player1.x = positions[index[0] % 4]
+            index[0] += 1
+            state.clock.advance()
+            ai.update(state.player1)
+        return run
+    factory.__doc__ = f"AIController.update（{difficulty.name}）"
+    return factory
+
+def bench_search_ai():
+    """SearchAIController.update（MASTER）：每次决策都在2毫秒预算内完成一次搜索"""
+    from search_ai import SearchAIController
+
+    state = MatchState()
+    ai = SearchAIController(state.player2, rng=random.Random(0))
+    positions = [200, 380, 560, 640]
+    index = [0]
+
+    def run():
+        state.player1.x = positions[index[0] % 4]
+        index[0] += 1
+        state.clock.advance(9)  # 每次调用都跨过一个决策间隔
+        ai.update(state.player1)
+    run.stats = ai.search_stats
+    return run
+
+def bench_neural_ai():
+    """NeuralAIController.update（NEURAL）：随机初始化的64x64网络，单个AI每帧推理"""
+    from neural_policy import MLPPolicy, NeuralAIController
+
+    state = MatchState()
+    ai = NeuralAIController(state.player2, clock=state.clock, policy=MLPPolicy.random())
+    positions = [200, 380, 560, 640]
+    index = [0]
+
+    def run():
+        state.player1.x = positions[index[0] % 4]
+        index[0] += 1
+        state.clock.advance()
+        ai.update(state.player1)
+    return run
+
+def bench_match_step():
+    """fight_core.step：AI对AI的完整一帧，结束后自动重开"""
+    state = MatchState()
+    rng = random.Random(0)
+    ais = [None, None]
+
+    def new_match():
+        state.reset()
+        ais[0] = AIController(state.player1, AIDifficulty.HARD, rng=rng)
+        ais[1] = AIController(state.player2, AIDifficulty.HARD, rng=rng)
+    new_match()
+
+    def run():
+        if state.finished:
+            new_match()
+        inputs_p1 = virtual_keys_to_inputs(ais[0].update(state.player2), state.player1.controls)
+        inputs_p2 = virtual_keys_to_inputs(ais[1].update(state.player1), state.player2.controls)
+        step(state, inputs_p1, inputs_p2)
+    return run
+
+def bench_fighter_draw():
+    """Fighter.draw：轮流切换攻击/闪现状态、朝向和动画帧"""
+    import pygame
+    import fighting_game
+
+    screen = pygame.display.set_mode((fighting_game.SCREEN_WIDTH, fighting_game.SCREEN_HEIGHT))
+    fighter = fighting_game.Fighter(400, 588, "bench", fighting_game.GREEN, None)
+    index = [0]
+
+    def run():
+        i = index[0]
+        fighter.is_attacking = i % 3 == 1
+        fighter.is_dashing = i % 3 == 2
+        fighter.facing_right = i % 2 == 0
+        fighter.animation_frame = i % 4
+        fighter.draw(screen)
+        index[0] += 1
+    return run
+
+def bench_particles():
+    """ParticleSystem.update + draw：粒子池保持满载（每次补满被回收的粒子）"""
+    import pygame
+    import fighting_game
+    from fight_core import EVENT_HIT, EVENT_STUN
+    from particles import ParticleSystem
+
+    screen = pygame.display.set_mode((fighting_game.SCREEN_WIDTH, fighting_game.SCREEN_HEIGHT))
+    particles = ParticleSystem(seed=0)
+    events = [(EVENT_HIT, 100 + 40 * i, 500, 1 if i % 2 else -1) for i in range(20)] + [(EVENT_STUN, 500, 400, 60)]
+
+    def run():
+        while particles.count < particles.capacity:
+            particles.spawn_events(events)
+        particles.update()
+        particles.draw(screen)
+    return run
+
+def bench_game_frame():
+    """Game.update + Game.draw：人机对战中的完整一帧（不含flip）"""
+    import fighting_game
+
+    game = fighting_game.Game()
+    game.game_mode = fighting_game.GameMode.PVE
+    game.state = fighting_game.GameState.PLAYING
+    game.create_fighters(seed=0)
+    game.reset_game()
+
+    def run():
+        if game.state != fighting_game.GameState.PLAYING:
+            game.state = fighting_game.GameState.PLAYING
+            game.create_fighters(seed=0)
+            game.reset_game()
+        game.update()
+        game.draw()
+    return run
+
+BENCHMARKS = {
+    'fighter_update': (bench_fighter_update, 200000),
+    'fighter_attack': (bench_fighter_attack, 200000),
+    'fighter_special_attack': (bench_fighter_special, 200000),
+    'ai_update_easy': (bench_ai(AIDifficulty.EASY), 100000),
+    'ai_update_medium': (bench_ai(AIDifficulty.MEDIUM), 100000),
+    'ai_update_hard': (bench_ai(AIDifficulty.HARD), 100000),
+    'ai_update_expert': (bench_ai(AIDifficulty.EXPERT), 100000),
+    'ai_update_master': (bench_search_ai, 500),
+    'ai_update_neural': (bench_neural_ai, 20000),
+    'match_step': (bench_match_step, 50000),
+    'fighter_draw': (bench_fighter_draw, 20000),
+    'particles': (bench_particles, 2000),
+    'game_frame': (bench_game_frame, 500),
+}
+
+# 解释器的float/tuple空闲链表会留住少量对象，存活的新分配不超过这个字节数时不算问题
+ALLOC_TOLERANCE = 1024
+
+def check_allocations(frames=600, warmup=60):
+    """
+    用tracemalloc检查稳态绘制是否分配内存：对战中（双方都在闪现）和暂停画面轮流绘制frames帧，
+    统计期间新建的Surface数量和由本项目代码分配、绘制结束后仍然存活的内存；返回发现的问题列表
+    """
+    import pygame
+    import fighting_game
+    from render_cache import surface_pool
+
+    game = fighting_game.Game()
+    game.game_mode = fighting_game.GameMode.PVE
+    game.create_fighters(seed=0)
+    game.reset_game()
+
+    # pygame.Surface在C代码里分配像素，tracemalloc看不到，新建次数单独统计
+    created = [0]
+    surface_type = pygame.Surface
+
+    class CountingSurface(surface_type):
+        def __init__(self, *args, **kwargs):
+            created[0] += 1
+            super().__init__(*args, **kwargs)
+
+    def draw_frame(i):
+        for fighter in (game.player1, game.player2):
+            fighter.is_dashing = True
+            fighter.dash_animation_time = 10
+        game.state = fighting_game.GameState.PAUSE if i % 2 else fighting_game.GameState.PLAYING
+        game.draw(i % 10 / 10)
+
+    project_files = [tracemalloc.Filter(True, os.path.join('*', name), all_frames=True)
+                     for name in ('fighting_game.py', 'render_cache.py', 'frame_profiler.py')]
+    # 预热也在追踪下进行，上一帧留下的对象（如绘制位置）在前后两次快照中都有，不算作新增
+    tracemalloc.start(16)
+    for i in range(warmup):
+        draw_frame(i)
+    pool_created = surface_pool.created
+    pygame.Surface = CountingSurface
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(project_files)
+        peak = 0
+        for i in range(frames):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            draw_frame(i)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        after = tracemalloc.take_snapshot().filter_traces(project_files)
+    finally:
+        pygame.Surface = surface_type
+        tracemalloc.stop()
+
+    growth = [stat for stat in after.compare_to(before, 'lineno') if stat.size_diff > 0]
+    retained = sum(stat.size_diff for stat in growth)
+    print(f"绘制{frames}帧：新建Surface {created[0]}个，Surface池新增{surface_pool.created - pool_created}个，"
+          f"存活的新分配{retained}字节，单帧临时分配峰值{peak}字节")
+
+    problems = []
+    if created[0] or surface_pool.created != pool_created:
+        problems.append("稳态绘制中新建了Surface")
+    if retained > ALLOC_TOLERANCE:
+        problems.append("稳态绘制后有新分配的内存未释放")
+        for stat in growth[:5]:
+            print(f"  {stat}")
+    return problems
+
+def measure(factory, iterations, repeats, warmup):
+    """返回每次重复的吞吐量（次/秒）"""
+    run = factory()
+    for _ in range(warmup):
+        run()
+    rates = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            run()
+        elapsed = time.perf_counter() - start
+        rates.append(iterations / elapsed)
+    return rates, getattr(run, 'stats', None)
+
+def run_benchmarks(names, repeats, warmup, scale):
+    results = {}
+    for name in names:
+        factory, iterations = BENCHMARKS[name]
+        iterations = max(1, int(iterations * scale))
+        rates, stats = measure(factory, iterations, repeats, min(warmup, iterations))
+        results[name] = {
+            'median': statistics.median(rates),
+            'best': max(rates),
+            'worst': min(rates),
+            'iterations': iterations,
+            'repeats': repeats,
+        }
+        print(f"{name:<24}{results[name]['median']:>14,.0f} 次/秒  (最好 {results[name]['best']:,.0f})")
+        if stats is not None:
+            # 额外的统计（如搜索AI的每秒节点数）一并写入结果
+            results[name]['stats'] = stats()
+            print(" " * 24 + "  ".join(f"{key}={value:,.1f}" for key, value in results[name]['stats'].items()))
+    return results
+
+def compare(results, baseline, tolerance):
+    """中位数吞吐量低于基线(1 - tolerance)倍的项目视为退化，返回退化列表"""
+    regressions = []
+    print()
+    print(f"{'项目':<24}{'基线':>14}{'本次':>14}{'变化':>9}")
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        change = result['median'] / base['median'] - 1
+        flag = ""
+        if change < -tolerance:
+            flag = "  <-- 退化"
+            regressions.append(name)
+        print(f"{name:<24}{base['median']:>14,.0f}{result['median']:>14,.0f}{change:>+9.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    parser.add_argument('names', nargs='*', help="只运行指定项目，默认全部：" + ", ".join(BENCHMARKS))
+    parser.add_argument('--repeats', type=int, default=5, help="每个项目重复次数")
+    parser.add_argument('--warmup', type=int, default=1000, help="每个项目的预热次数")
+    parser.add_argument('--scale', type=float, default=1.0, help="迭代次数缩放系数，快速检查时可设为0.1")
+    parser.add_argument('--output', help="把结果写入JSON文件")
+    parser.add_argument('--baseline', help="与该基线JSON比较，出现退化时返回码为1")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="允许的吞吐量下降比例")
+    parser.add_argument('--save-baseline', help="把本次结果保存为基线")
+    parser.add_argument('--alloc-check', type=int, nargs='?', const=600, metavar='FRAMES',
+                        help="用tracemalloc检查稳态绘制是否分配内存，发现问题时返回码为1")
+    args = parser.parse_args()
+
+    if args.alloc_check:
+        problems = check_allocations(args.alloc_check)
+        if problems:
+            print("\n" + "；".join(problems))
+            sys.exit(1)
+        return
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error("未知项目：" + ", ".join(unknown))
+
+    results = run_benchmarks(names, args.repeats, args.warmup, args.scale)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n性能退化：" + ", ".join(regressions))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
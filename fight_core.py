@@ -0,0 +1,761 @@
+"""
+北航自由搏击 - 对战内核
+不依赖pygame的战斗规则：角色、AI控制器与逐帧推进的step引擎
+图形界面(fighting_game.py)只负责输入采集和绘制，批量对战可直接调用本模块
+"""
+
+import random
+import struct
+from enum import Enum
+
+from moves import load_moves
+
+# 游戏常量
+SCREEN_WIDTH = 1024
+SCREEN_HEIGHT = 768
+FPS = 60
+GROUND_Y = SCREEN_HEIGHT - 100
+MATCH_DURATION = 180  # 3分钟倒计时
+
+# 引擎输入使用的动作名称
+ACTIONS = ('left', 'right', 'jump', 'attack', 'block', 'special', 'dash')
+# 无界面模式下的默认“键位”：动作名即键名
+DEFAULT_CONTROLS = {action: action for action in ACTIONS}
+
+# 战斗事件，由角色追加到events列表里供特效等表现层使用，格式为(事件, x, y, 参数)：
+# 命中/被防御时参数为攻击方向（1向右，-1向左），击晕时为击晕帧数，闪现时为位移距离
+EVENT_HIT = 'hit'
+EVENT_BLOCK = 'block'
+EVENT_STUN = 'stun'
+EVENT_DASH = 'dash'
+
+# 招式帧数据（moves.json），导入时编译一次
+MOVE_SET = load_moves()
+_MOVES = MOVE_SET.by_index
+_BODY_BOX = MOVE_SET.body_box
+_ATTACK = MOVE_SET['attack']
+_SPECIAL_ATTACK = MOVE_SET['special_attack']
+
+class TickClock:
+    """
+    以帧为单位的对战时钟
+    冷却、AI决策间隔和比赛倒计时都从这里读时间，每次step前进一帧，
+    因此对战结果与实际帧率无关，批量运行时也可以任意快进
+    """
+    def __init__(self, fps=FPS):
+        self.fps = fps
+        self.ticks = 0
+
+    def advance(self, count=1):
+        self.ticks += count
+
+    def reset(self):
+        self.ticks = 0
+
+    def get_ticks(self):
+        """返回对战开始以来的毫秒数（替代pygame.time.get_ticks）"""
+        return self.ticks * 1000 // self.fps
+
+    def seconds(self):
+        return self.ticks / self.fps
+
+class AIDifficulty(Enum):
+    EASY = 1    # 简单
+    MEDIUM = 2  # 中等
+    HARD = 3    # 困难
+    EXPERT = 4  # 专家
+    MASTER = 5  # 大师（前瞻搜索，见search_ai.py）
+    NEURAL = 6  # 神经网络（加载训练好的策略，见neural_policy.py）
+
+# 各难度的技能参数
+AI_SKILLS = {
+    AIDifficulty.EASY: {
+        'accuracy': 0.3,        # 攻击精度
+        'block_chance': 0.2,    # 防御概率
+        'special_chance': 0.1,  # 特殊技能使用概率
+        'combo_chance': 0.1,    # 连击概率
+        'dodge_chance': 0.2,    # 闪避概率
+        'dash_chance': 0.1      # 闪现概率
+    },
+    AIDifficulty.MEDIUM: {
+        'accuracy': 0.5,
+        'block_chance': 0.4,
+        'special_chance': 0.3,
+        'combo_chance': 0.3,
+        'dodge_chance': 0.4,
+        'dash_chance': 0.3
+    },
+    AIDifficulty.HARD: {
+        'accuracy': 0.7,
+        'block_chance': 0.6,
+        'special_chance': 0.5,
+        'combo_chance': 0.5,
+        'dodge_chance': 0.6,
+        'dash_chance': 0.5
+    },
+    AIDifficulty.EXPERT: {
+        'accuracy': 0.9,
+        'block_chance': 0.8,
+        'special_chance': 0.7,
+        'combo_chance': 0.7,
+        'dodge_chance': 0.8,
+        'dash_chance': 0.7
+    }
+}
+
+def _policy_cell_actions(skill, bucket, energy_ok, can_dash, target_attacking):
+    """
+    按AI的决策规则展开一个局面下的动作分布，返回[(概率, 动作, 最短帧数, 最长帧数)]
+    bucket: 0为远距离(>200)，1为中距离(80~200)，2为近距离(<=80)
+    远距离的'approach'在决策时根据目标方向换成move_left/move_right
+    """
+    dash_chance = skill['dash_chance'] if can_dash else 0.0
+
+    if bucket == 0:
+        # 距离较远，接近目标或使用闪现
+        return [(dash_chance, 'dash', 10, 10), (1 - dash_chance, 'approach', 30, 90)]
+
+    if bucket == 1:
+        # 中等距离：特技和闪现各自以一定概率加入候选，再从候选中等概率选择
+        special_chance = skill['special_chance'] if energy_ok else 0.0
+        weights = {'move_closer': 0.0, 'jump': 0.0, 'wait': 0.0, 'special_attack': 0.0, 'dash': 0.0}
+        for has_special, p_special in ((True, special_chance), (False, 1 - special_chance)):
+            for has_dash, p_dash in ((True, dash_chance), (False, 1 - dash_chance)):
+                actions = ['move_closer', 'jump', 'wait']
+                if has_special:
+                    actions.append('special_attack')
+                if has_dash:
+                    actions.append('dash')
+                for action in actions:
+                    weights[action] += p_special * p_dash / len(actions)
+        return [(weight, action, 20, 60) for action, weight in weights.items()]
+
+    # 近距离，战斗动作
+    block = skill['block_chance'] if target_attacking else 0.0
+    rest = 1 - block
+    attack = rest * skill['accuracy']
+    special = attack * skill['special_chance'] if energy_ok else 0.0
+    dodge = rest * (1 - skill['accuracy']) * skill['dodge_chance']
+    return [
+        (block, 'block', 20, 20),
+        (special, 'special_attack', 15, 15),
+        (attack - special, 'attack', 15, 15),
+        (dodge * dash_chance, 'dash', 30, 30),
+        (dodge * (1 - dash_chance) * 0.5, 'jump', 30, 30),
+        (dodge * (1 - dash_chance) * 0.5, 'move_back', 30, 30),
+        (rest - attack - dodge, 'wait', 10, 10),
+    ]
+
+def compile_policy(skill):
+    """
+    把一个难度的决策规则编译成24格的查找表，下标为
+    距离档位*8 + 能量足够*4 + 可以闪现*2 + 目标正在攻击
+    每格是(累积概率, 动作, 最短帧数, 最长帧数)的元组，已去掉概率为0的动作
+    """
+    table = []
+    for bucket in range(3):
+        for energy_ok in (False, True):
+            for can_dash in (False, True):
+                for target_attacking in (False, True):
+                    cell = []
+                    total = 0.0
+                    for probability, action, low, high in _policy_cell_actions(
+                            skill, bucket, energy_ok, can_dash, target_attacking):
+                        if probability > 0:
+                            total += probability
+                            cell.append((total, action, low, high))
+                    table.append(tuple(cell))
+    return tuple(table)
+
+def sample_policy_cell(cell, draw):
+    """用一个[0, 1)随机数在表格中选出动作，落在该动作区间内的位置再换算成持续帧数"""
+    previous = 0.0
+    for total, action, low, high in cell:
+        if draw < total:
+            fraction = (draw - previous) / (total - previous)
+            return action, low + min(int(fraction * (high - low + 1)), high - low)
+        previous = total
+    # 浮点累加误差导致draw落在最后一格之外时取最后一个动作
+    _, action, low, high = cell[-1]
+    return action, high
+
+AI_POLICY_TABLES = {difficulty: compile_policy(skill) for difficulty, skill in AI_SKILLS.items()}
+
+class AIController:
+    def __init__(self, fighter, difficulty, clock=None, rng=None):
+        self.fighter = fighter
+        self.difficulty = difficulty
+        self.clock = clock if clock is not None else fighter.clock
+        # 随机数来源，传入random.Random(seed)即可复现对局
+        self.rng = rng if rng is not None else random
+        self.target = None
+        self.decision_interval = self._get_decision_interval()
+        self.policy = AI_POLICY_TABLES.get(difficulty, AI_POLICY_TABLES[AIDifficulty.MEDIUM])
+        self.last_decision_time = -self.decision_interval  # 第一帧即可决策
+        self.current_action = None
+        self.action_timer = 0
+        self.reaction_time = self._get_reaction_time()
+        self.last_seen_player_x = 0
+
+    def _get_decision_interval(self):
+        """根据难度获取决策间隔"""
+        intervals = {
+            AIDifficulty.EASY: 1000,    # 1秒
+            AIDifficulty.MEDIUM: 600,   # 0.6秒
+            AIDifficulty.HARD: 300,     # 0.3秒
+            AIDifficulty.EXPERT: 150,   # 0.15秒
+            AIDifficulty.MASTER: 150,
+            AIDifficulty.NEURAL: 0      # 每帧决策
+        }
+        return intervals.get(self.difficulty, 600)
+
+    def _get_reaction_time(self):
+        """根据难度获取反应时间"""
+        times = {
+            AIDifficulty.EASY: 500,     # 0.5秒
+            AIDifficulty.MEDIUM: 300,   # 0.3秒
+            AIDifficulty.HARD: 150,     # 0.15秒
+            AIDifficulty.EXPERT: 50,    # 0.05秒
+            AIDifficulty.MASTER: 50,
+            AIDifficulty.NEURAL: 0
+        }
+        return times.get(self.difficulty, 300)
+
+    def update(self, target):
+        self.target = target
+        current_time = self.clock.get_ticks()
+
+        # 更新动作计时器
+        if self.action_timer > 0:
+            self.action_timer -= 1
+
+        # 检查是否需要做出新决策
+        if current_time - self.last_decision_time >= self.decision_interval:
+            self._make_decision()
+            self.last_decision_time = current_time
+
+        # 执行当前动作
+        return self._execute_action()
+
+    def _make_decision(self):
+        """AI决策：按当前局面查预编译的策略表，一次随机数同时决定动作和持续帧数"""
+        if not self.target:
+            return
+
+        fighter = self.fighter
+        distance = abs(fighter.x - self.target.x)
+        if distance > 200:
+            bucket = 0
+        elif distance > 80:
+            bucket = 1
+        else:
+            bucket = 2
+        cell = self.policy[bucket * 8
+                           + (fighter.special_energy >= fighter.special_energy_cost) * 4
+                           + fighter.can_dash() * 2
+                           + bool(self.target.is_attacking)]
+        action, self.action_timer = sample_policy_cell(cell, self.rng.random())
+        if action == 'approach':
+            action = 'move_right' if self.target.x > fighter.x else 'move_left'
+        self.current_action = action
+
+    def _execute_action(self):
+        """执行AI动作，返回模拟的按键状态"""
+        if not self.current_action or self.action_timer <= 0:
+            return {}
+
+        # 创建虚拟按键状态
+        virtual_keys = {}
+        for key in self.fighter.controls.values():
+            virtual_keys[key] = False
+
+        if self.current_action == 'move_right':
+            virtual_keys[self.fighter.controls['right']] = True
+        elif self.current_action == 'move_left':
+            virtual_keys[self.fighter.controls['left']] = True
+        elif self.current_action == 'move_closer':
+            if self.target.x > self.fighter.x:
+                virtual_keys[self.fighter.controls['right']] = True
+            else:
+                virtual_keys[self.fighter.controls['left']] = True
+        elif self.current_action == 'move_back':
+            if self.target.x > self.fighter.x:
+                virtual_keys[self.fighter.controls['left']] = True
+            else:
+                virtual_keys[self.fighter.controls['right']] = True
+        elif self.current_action == 'jump':
+            virtual_keys[self.fighter.controls['jump']] = True
+        elif self.current_action == 'attack':
+            virtual_keys[self.fighter.controls['attack']] = True
+        elif self.current_action == 'special_attack':
+            virtual_keys[self.fighter.controls['special']] = True
+        elif self.current_action == 'block':
+            virtual_keys[self.fighter.controls['block']] = True
+        elif self.current_action == 'dash':
+            virtual_keys[self.fighter.controls['dash']] = True
+
+        return virtual_keys
+
+def create_ai_controller(fighter, difficulty, clock=None, rng=None, **options):
+    """
+    按难度创建AI控制器，options中只把对应控制器认识的参数传过去：
+    大师难度为搜索型AI（budget_ms、max_nodes），神经网络难度需要policy（.npz路径）
+    """
+    if difficulty == AIDifficulty.MASTER:
+        from search_ai import SearchAIController
+        search_options = {key: options[key] for key in ('budget_ms', 'max_nodes') if key in options}
+        return SearchAIController(fighter, difficulty, clock, rng, **search_options)
+    if difficulty == AIDifficulty.NEURAL:
+        from neural_policy import NeuralAIController
+        return NeuralAIController(fighter, difficulty, clock, rng, policy=options.get('policy'))
+    return AIController(fighter, difficulty, clock, rng)
+
+def virtual_keys_to_inputs(virtual_keys, controls):
+    """把AI的虚拟按键（以键位为键）转换成引擎输入（以动作名为键）"""
+    return {action: virtual_keys.get(key, False) for action, key in controls.items()}
+
+def inputs_to_mask(inputs):
+    """把一帧输入压缩成位掩码，第i位对应ACTIONS[i]"""
+    mask = 0
+    for bit, action in enumerate(ACTIONS):
+        if inputs.get(action):
+            mask |= 1 << bit
+    return mask
+
+def mask_to_inputs(mask):
+    """位掩码还原为以动作名为键的输入"""
+    return {action: bool(mask >> bit & 1) for bit, action in enumerate(ACTIONS)}
+
+# 角色快照的固定布局：位置速度用double，计时用int/long long，招式编号用signed char，状态标志用bool
+_FIGHTER_STRUCT = struct.Struct('<dddiiiqiqiiiib???????')
+FIGHTER_SNAPSHOT_SIZE = _FIGHTER_STRUCT.size
+
+class FighterCore:
+    """角色的战斗规则部分，不包含任何绘制代码"""
+    __slots__ = (
+        'x', 'y', 'width', 'height', 'name', 'color', 'health', 'max_health',
+        'speed', 'jump_power', 'velocity_y', 'on_ground', 'facing_right',
+        'controls', 'clock',
+        'defense', 'combo_count', 'attack_cooldown',
+        'last_attack_time', 'is_attacking', 'attack_animation_time', 'move', 'move_hit',
+        'special_energy', 'max_special_energy', 'special_energy_cost', 'is_blocking',
+        'dash_distance', 'dash_cooldown', 'last_dash_time', 'is_dashing', 'dash_animation_time',
+        'animation_frame', 'animation_timer',
+        'stunned', 'stun_timer', 'events',
+    )
+
+    def __init__(self, x, y, name, color=None, controls=None, clock=None):
+        self.x = x
+        self.y = y
+        self.width = MOVE_SET.body_width
+        self.height = MOVE_SET.body_height
+        self.name = name
+        self.color = color
+        self.health = 100
+        self.max_health = 100
+        self.speed = 5
+        self.jump_power = 15
+        self.velocity_y = 0
+        self.on_ground = True
+        self.facing_right = True
+        self.controls = controls if controls is not None else dict(DEFAULT_CONTROLS)
+        self.clock = clock if clock is not None else TickClock()
+
+        # 战斗属性
+        self.defense = 5
+        self.combo_count = 0
+        self.attack_cooldown = 300  # 毫秒
+        self.last_attack_time = -self.attack_cooldown
+        self.is_attacking = False
+        self.attack_animation_time = 0
+        self.move = -1  # 正在出的招式在MOVE_SET.by_index中的编号，-1表示没有
+        self.move_hit = False  # 本次出招是否已经命中
+
+        # 特殊技能 - 降低能量消耗
+        self.special_energy = 0
+        self.max_special_energy = 100
+        self.special_energy_cost = 25  # 从50降低到25
+        self.is_blocking = False
+
+        # 闪现功能
+        self.dash_distance = 100  # 闪现距离
+        self.dash_cooldown = 3000  # 3秒冷却时间
+        self.last_dash_time = -self.dash_cooldown
+        self.is_dashing = False
+        self.dash_animation_time = 0
+
+        # 动画状态
+        self.animation_frame = 0
+        self.animation_timer = 0
+
+        # 状态效果
+        self.stunned = False
+        self.stun_timer = 0
+
+        # 战斗事件接收列表，为None时不记录（无界面模拟和搜索时不产生任何开销）
+        self.events = None
+
+    def reset(self, x, y):
+        """回到开局状态：除位置外，所有会随对战变化的状态都恢复为构造时的值"""
+        self.x = x
+        self.y = y
+        self.velocity_y = 0
+        self.on_ground = True
+        self.facing_right = True
+        self.health = self.max_health
+        self.combo_count = 0
+        self.last_attack_time = -self.attack_cooldown
+        self.is_attacking = False
+        self.attack_animation_time = 0
+        self.move = -1
+        self.move_hit = False
+        self.special_energy = 0
+        self.is_blocking = False
+        self.last_dash_time = -self.dash_cooldown
+        self.is_dashing = False
+        self.dash_animation_time = 0
+        self.animation_frame = 0
+        self.animation_timer = 0
+        self.stunned = False
+        self.stun_timer = 0
+
+    def update(self, inputs, ground_y):
+        """按一帧的输入推进角色，inputs以动作名为键"""
+        if self.stunned:
+            self.stun_timer -= 1
+            if self.stun_timer <= 0:
+                self.stunned = False
+            return
+
+        # 闪现动画更新
+        if self.is_dashing:
+            self.dash_animation_time -= 1
+            if self.dash_animation_time <= 0:
+                self.is_dashing = False
+
+        # 移动控制
+        if inputs.get('left') and not self.is_attacking and not self.is_dashing:
+            self.x -= self.speed
+            self.facing_right = False
+            if self.x < 0:
+                self.x = 0
+
+        if inputs.get('right') and not self.is_attacking and not self.is_dashing:
+            self.x += self.speed
+            self.facing_right = True
+            if self.x > SCREEN_WIDTH - self.width:
+                self.x = SCREEN_WIDTH - self.width
+
+        # 跳跃控制
+        if inputs.get('jump') and self.on_ground and not self.is_attacking and not self.is_dashing:
+            self.velocity_y = -self.jump_power
+            self.on_ground = False
+
+        # 防御控制
+        self.is_blocking = bool(inputs.get('block')) and not self.is_dashing
+
+        # 重力和落地检测
+        if not self.on_ground:
+            self.velocity_y += 0.8  # 重力
+            self.y += self.velocity_y
+
+            if self.y >= ground_y - self.height:
+                self.y = ground_y - self.height
+                self.velocity_y = 0
+                self.on_ground = True
+
+        # 攻击动画更新
+        if self.is_attacking:
+            self.attack_animation_time -= 1
+            if self.attack_animation_time <= 0:
+                self.is_attacking = False
+                self.move = -1
+
+        # 动画更新
+        self.animation_timer += 1
+        if self.animation_timer >= 10:
+            self.animation_frame = (self.animation_frame + 1) % 4
+            self.animation_timer = 0
+
+    def hurtbox(self):
+        """当前帧的受击框(dx, dy, 宽, 高)，不出招时为整个身体"""
+        if self.move < 0:
+            return _BODY_BOX
+        move = _MOVES[self.move]
+        return move.hurtboxes[self.facing_right][move.total - self.attack_animation_time]
+
+    def hits(self, move, frame, target):
+        """move第frame帧的攻击框是否与target当前的受击框相交，边界接触也算"""
+        box = move.hitboxes[self.facing_right][frame]
+        if box is None:
+            return False
+        # 与hurtbox()相同，这里展开以减少每帧的调用开销
+        if target.move < 0:
+            hurt = _BODY_BOX
+        else:
+            target_move = _MOVES[target.move]
+            hurt = target_move.hurtboxes[target.facing_right][target_move.total - target.attack_animation_time]
+        left = self.x + box[0]
+        top = self.y + box[1]
+        target_left = target.x + hurt[0]
+        target_top = target.y + hurt[1]
+        return (left <= target_left + hurt[2] and target_left <= left + box[2]
+                and top <= target_top + hurt[3] and target_top <= top + box[3])
+
+    def _start_move(self, move, target, energy_cost=0):
+        """
+        出招，返回是否出招成功
+        不会挥空的招式只在首个有效帧能打中target时才出；起手为0帧时当帧结算命中
+        """
+        hit = self.hits(move, move.startup, target)
+        if not hit and not move.whiff:
+            return False
+        self.special_energy -= energy_cost
+        self.move = move.index
+        self.move_hit = False
+        self.is_attacking = True
+        self.attack_animation_time = move.total
+        if hit and move.startup == 0:
+            self._land_hit(move, target)
+        return True
+
+    def resolve_hit(self, target):
+        """出招的当前帧是有效帧且攻击框碰到target时结算伤害，每次出招只命中一次"""
+        if self.move < 0 or self.move_hit or self.stunned:
+            return False
+        move = _MOVES[self.move]
+        if not self.hits(move, move.total - self.attack_animation_time, target):
+            return False
+        self._land_hit(move, target)
+        return True
+
+    def _land_hit(self, move, target):
+        self.move_hit = True
+        if target.is_blocking:
+            damage = move.block_damage
+        else:
+            damage = move.damage
+            # 连击加成，combo_bonus为0的招式不计入连击
+            if move.combo_bonus:
+                self.combo_count += 1
+                damage += self.combo_count * move.combo_bonus
+            if move.stun:
+                target.stunned = True
+                target.stun_timer = move.stun
+
+        target.take_damage(damage)
+        if move.energy_gain:
+            self.special_energy = min(self.max_special_energy, self.special_energy + move.energy_gain)
+
+        if self.events is not None:
+            # 命中点取对手身体靠近攻击方的一侧、手臂的高度
+            direction = 1 if self.facing_right else -1
+            hit_x = target.x + target.width / 2 - direction * target.width / 2
+            self.events.append((EVENT_BLOCK if target.is_blocking else EVENT_HIT, hit_x, self.y + 30, direction))
+            if move.stun and not target.is_blocking:
+                self.events.append((EVENT_STUN, target.x + target.width / 2, target.y - 10, move.stun))
+
+    def attack(self, target):
+        current_time = self.clock.get_ticks()
+        if current_time - self.last_attack_time < self.attack_cooldown:
+            return False
+
+        if self.is_attacking or self.stunned or self.is_dashing:
+            return False
+
+        if not self._start_move(_ATTACK, target):
+            return False
+        self.last_attack_time = current_time
+        return True
+
+    def special_attack(self, target):
+        if self.special_energy < self.special_energy_cost or self.stunned or self.is_dashing:
+            return False
+
+        return self._start_move(_SPECIAL_ATTACK, target, self.special_energy_cost)
+
+    def dash(self):
+        """闪现功能"""
+        current_time = self.clock.get_ticks()
+        if current_time - self.last_dash_time < self.dash_cooldown:
+            return False
+
+        if self.stunned or self.is_attacking or self.is_dashing:
+            return False
+
+        # 执行闪现
+        self.last_dash_time = current_time
+        self.is_dashing = True
+        self.dash_animation_time = 10  # 闪现动画持续时间
+        start_x = self.x
+
+        # 根据面向方向闪现
+        if self.facing_right:
+            self.x += self.dash_distance
+            if self.x > SCREEN_WIDTH - self.width:
+                self.x = SCREEN_WIDTH - self.width
+        else:
+            self.x -= self.dash_distance
+            if self.x < 0:
+                self.x = 0
+
+        if self.events is not None:
+            self.events.append((EVENT_DASH, start_x + self.width / 2, self.y + self.height / 2, self.x - start_x))
+        return True
+
+    def can_dash(self):
+        """检查是否可以闪现"""
+        current_time = self.clock.get_ticks()
+        return current_time - self.last_dash_time >= self.dash_cooldown and not self.stunned and not self.is_attacking and not self.is_dashing
+
+    def get_dash_cooldown_remaining(self):
+        """获取闪现剩余冷却时间"""
+        current_time = self.clock.get_ticks()
+        remaining = self.dash_cooldown - (current_time - self.last_dash_time)
+        return max(0, remaining) / 1000  # 转换为秒
+
+    def take_damage(self, damage):
+        actual_damage = max(1, damage - self.defense)
+        self.health -= actual_damage
+        if self.health < 0:
+            self.health = 0
+
+    def snapshot(self):
+        """把全部会随对战变化的状态打包成定长bytes（FIGHTER_SNAPSHOT_SIZE字节）"""
+        return _FIGHTER_STRUCT.pack(
+            self.x, self.y, self.velocity_y,
+            self.health, self.special_energy, self.combo_count,
+            self.last_attack_time, self.attack_animation_time,
+            self.last_dash_time, self.dash_animation_time,
+            self.stun_timer, self.animation_frame, self.animation_timer, self.move,
+            self.on_ground, self.facing_right, self.is_attacking, self.move_hit,
+            self.is_blocking, self.is_dashing, self.stunned)
+
+    def restore(self, data, offset=0):
+        """从snapshot()的结果恢复状态，data可以是更长的缓冲区，从offset处读取"""
+        (self.x, self.y, self.velocity_y,
+         self.health, self.special_energy, self.combo_count,
+         self.last_attack_time, self.attack_animation_time,
+         self.last_dash_time, self.dash_animation_time,
+         self.stun_timer, self.animation_frame, self.animation_timer, self.move,
+         self.on_ground, self.facing_right, self.is_attacking, self.move_hit,
+         self.is_blocking, self.is_dashing, self.stunned) = _FIGHTER_STRUCT.unpack_from(data, offset)
+
+_MATCH_STRUCT = struct.Struct('<qBb')
+
+class MatchState:
+    """一局对战的完整状态，两名角色共用同一个TickClock"""
+    def __init__(self, player1=None, player2=None, ground_y=GROUND_Y, clock=None):
+        self.ground_y = ground_y
+        self.clock = clock if clock is not None else TickClock()
+        self.player1 = player1 if player1 is not None else FighterCore(200, ground_y - 80, "北航学霸")
+        self.player2 = player2 if player2 is not None else FighterCore(600, ground_y - 80, "AI导师")
+        self.player1.clock = self.clock
+        self.player2.clock = self.clock
+        self.winner = None
+        self.finished = False
+
+    @property
+    def tick(self):
+        return self.clock.ticks
+
+    @property
+    def game_time(self):
+        """剩余比赛时间（秒），由帧数换算"""
+        return MATCH_DURATION - self.clock.seconds()
+
+    def reset(self):
+        """两名角色回到开局状态，计时归零，开始新的一局"""
+        # 时钟归零，冷却时间戳也随角色一起重置
+        self.player1.reset(200, self.ground_y - 80)
+        self.player2.reset(600, self.ground_y - 80)
+        self.clock.reset()
+        self.winner = None
+        self.finished = False
+
+    def snapshot(self):
+        """把帧数、胜负和双方战斗状态打包成bytes，用于回放关键帧"""
+        if self.winner is None:
+            winner = -1
+        else:
+            winner = 0 if self.winner is self.player1 else 1
+        return (_MATCH_STRUCT.pack(self.clock.ticks, self.finished, winner)
+                + self.player1.snapshot() + self.player2.snapshot())
+
+    def restore(self, data):
+        """从snapshot()的结果恢复状态"""
+        ticks, finished, winner = _MATCH_STRUCT.unpack_from(data, 0)
+        self.player1.restore(data, _MATCH_STRUCT.size)
+        self.player2.restore(data, _MATCH_STRUCT.size + FIGHTER_SNAPSHOT_SIZE)
+        self.clock.ticks = ticks
+        self.finished = bool(finished)
+        self.winner = (self.player1, self.player2)[winner] if winner >= 0 else None
+
+def _apply_actions(fighter, target, inputs):
+    """处理一帧内触发的攻击、特技和闪现"""
+    if inputs.get('attack'):
+        fighter.attack(target)
+    if inputs.get('special'):
+        fighter.special_attack(target)
+    if inputs.get('dash'):
+        fighter.dash()
+
+def step(state, inputs_p1, inputs_p2):
+    """
+    推进一帧对战
+    inputs以动作名为键：left/right/jump/block为按住状态，attack/special/dash为本帧触发
+    返回对战是否已经结束
+    """
+    if state.finished:
+        return True
+
+    player1 = state.player1
+    player2 = state.player2
+
+    # 先结算本帧触发的动作，再更新移动和物理
+    _apply_actions(player1, player2, inputs_p1)
+    _apply_actions(player2, player1, inputs_p2)
+    # 起手后进入有效帧的招式按双方当前的受击框判定命中
+    player1.resolve_hit(player2)
+    player2.resolve_hit(player1)
+    player1.update(inputs_p1, state.ground_y)
+    player2.update(inputs_p2, state.ground_y)
+
+    # 更新游戏时间
+    state.clock.advance()
+
+    # 检查游戏结束条件
+    if player1.health <= 0:
+        state.winner = player2
+        state.finished = True
+    elif player2.health <= 0:
+        state.winner = player1
+        state.finished = True
+    elif state.game_time <= 0:
+        # 时间结束，血量多的获胜
+        if player1.health > player2.health:
+            state.winner = player1
+        elif player2.health > player1.health:
+            state.winner = player2
+        else:
+            state.winner = None  # 平局
+        state.finished = True
+    return state.finished
+
+def run_ai_match(difficulty_p1, difficulty_p2, max_ticks=None, seed=None, ai_options=None):
+    """
+    无界面运行一局AI对AI的对战，返回结束时的MatchState；给定seed时结果可复现
+    ai_options传给大师难度的搜索型AI，按时间限制搜索时结果与机器速度有关
+    """
+    state = MatchState()
+    rng = random.Random(seed)
+    options = ai_options or {}
+    ai1 = create_ai_controller(state.player1, difficulty_p1, rng=random.Random(rng.getrandbits(64)), **options)
+    ai2 = create_ai_controller(state.player2, difficulty_p2, rng=random.Random(rng.getrandbits(64)), **options)
+    while not state.finished:
+        if max_ticks is not None and state.tick >= max_ticks:
+            break
+        inputs_p1 = virtual_keys_to_inputs(ai1.update(state.player2), state.player1.controls)
+        inputs_p2 = virtual_keys_to_inputs(ai2.update(state.player1), state.player2.controls)
+        step(state, inputs_p1, inputs_p2)
+    return state
@@ -5,20 +5,35 @@
 """
 
 import pygame
+import argparse
+import os
 import sys
+import time
 import random
 import math
-import os
 from enum import Enum
 
+from fight_core import (SCREEN_WIDTH, SCREEN_HEIGHT, FPS, ACTIONS, AIDifficulty,
+                        FighterCore, MatchState, create_ai_controller, step,
+                        virtual_keys_to_inputs)
+from render_cache import get_chinese_font, get_font, get_filled_surface, render_text
+from frame_profiler import FrameProfiler
+from replay import ReplayRecorder, ReplayPlayer
+from ai_worker import AIWorker, AsyncAIController
+from particles import ParticleSystem
+from spectator import SpectatorServer
+from match_server import MatchClient
+from rollback import DEFAULT_INPUT_DELAY, RollbackSession, UdpTransport
+from sprites import SPRITE_MARGIN, frame_size, get_sprite_frames, load_sprite_atlas, sprite_state
+
+# 固定步长循环：每个逻辑帧的时长，以及一次渲染最多追赶的逻辑帧数
+TICK_SECONDS = 1 / FPS
+MAX_CATCH_UP_TICKS = 5
+MAX_FRAME_SECONDS = 0.25
+
 # 初始化pygame
 pygame.init()
 
-# 游戏常量
-SCREEN_WIDTH = 1024
-SCREEN_HEIGHT = 768
-FPS = 60
-
 # 颜色定义
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -31,29 +46,22 @@ ORANGE = (255, 165, 0)
 GRAY = (128, 128, 128)
 LIGHT_BLUE = (173, 216, 230)
 
-def get_chinese_font(size):
-    """获取支持中文的字体"""
-    # Windows系统中文字体路径
-    font_paths = [
-        "C:/Windows/Fonts/msyh.ttc",      # 微软雅黑
-        "C:/Windows/Fonts/simhei.ttf",   # 黑体
-        "C:/Windows/Fonts/simsun.ttc",   # 宋体
-        "C:/Windows/Fonts/simkai.ttf",   # 楷体
-    ]
-    
-    # 尝试加载中文字体
-    for font_path in font_paths:
-        if os.path.exists(font_path):
-            try:
-                return pygame.font.Font(font_path, size)
-            except:
-                continue
-    
-    # 如果系统字体都不可用，尝试使用pygame的默认字体
-    try:
-        return pygame.font.Font(None, size)
-    except:
-        return pygame.font.Font(pygame.font.get_default_font(), size)
+# 游戏中角色的颜色，开始时一起烘焙进同一张精灵图集
+FIGHTER_COLORS = (GREEN, ORANGE, PURPLE)
+
+# 暂停时覆盖层的透明度
+PAUSE_OVERLAY_ALPHA = 128
+
+def keys_to_inputs(keys, controls, pressed_keys):
+    """把键盘状态转换为引擎输入：移动/跳跃/防御看按住状态，攻击/特技/闪现看本帧按下"""
+    inputs = {}
+    for action in ACTIONS:
+        key = controls[action]
+        if action in ('attack', 'special', 'dash'):
+            inputs[action] = key in pressed_keys
+        else:
+            inputs[action] = bool(keys[key])
+    return inputs
 
 class GameState(Enum):
     MENU = 1
@@ -67,457 +75,66 @@ class GameMode(Enum):
     PVP = 1  # 玩家对玩家
     PVE = 2  # 玩家对AI
 
-class AIDifficulty(Enum):
-    EASY = 1    # 简单
-    MEDIUM = 2  # 中等
-    HARD = 3    # 困难
-    EXPERT = 4  # 专家
-
-class AIController:
-    def __init__(self, fighter, difficulty):
-        self.fighter = fighter
-        self.difficulty = difficulty
-        self.target = None
-        self.last_decision_time = 0
-        self.decision_interval = self._get_decision_interval()
-        self.current_action = None
-        self.action_timer = 0
-        self.reaction_time = self._get_reaction_time()
-        self.last_seen_player_x = 0
-        
-    def _get_decision_interval(self):
-        """根据难度获取决策间隔"""
-        intervals = {
-            AIDifficulty.EASY: 1000,    # 1秒
-            AIDifficulty.MEDIUM: 600,   # 0.6秒
-            AIDifficulty.HARD: 300,     # 0.3秒
-            AIDifficulty.EXPERT: 150    # 0.15秒
-        }
-        return intervals.get(self.difficulty, 600)
-        
-    def _get_reaction_time(self):
-        """根据难度获取反应时间"""
-        times = {
-            AIDifficulty.EASY: 500,     # 0.5秒
-            AIDifficulty.MEDIUM: 300,   # 0.3秒
-            AIDifficulty.HARD: 150,     # 0.15秒
-            AIDifficulty.EXPERT: 50     # 0.05秒
-        }
-        return times.get(self.difficulty, 300)
-        
-    def _get_skill_level(self):
-        """根据难度获取技能等级参数"""
-        skills = {
-            AIDifficulty.EASY: {
-                'accuracy': 0.3,        # 攻击精度
-                'block_chance': 0.2,    # 防御概率
-                'special_chance': 0.1,  # 特殊技能使用概率
-                'combo_chance': 0.1,    # 连击概率
-                'dodge_chance': 0.2,    # 闪避概率
-                'dash_chance': 0.1      # 闪现概率
-            },
-            AIDifficulty.MEDIUM: {
-                'accuracy': 0.5,
-                'block_chance': 0.4,
-                'special_chance': 0.3,
-                'combo_chance': 0.3,
-                'dodge_chance': 0.4,
-                'dash_chance': 0.3
-            },
-            AIDifficulty.HARD: {
-                'accuracy': 0.7,
-                'block_chance': 0.6,
-                'special_chance': 0.5,
-                'combo_chance': 0.5,
-                'dodge_chance': 0.6,
-                'dash_chance': 0.5
-            },
-            AIDifficulty.EXPERT: {
-                'accuracy': 0.9,
-                'block_chance': 0.8,
-                'special_chance': 0.7,
-                'combo_chance': 0.7,
-                'dodge_chance': 0.8,
-                'dash_chance': 0.7
-            }
-        }
-        return skills.get(self.difficulty, skills[AIDifficulty.MEDIUM])
-        
-    def update(self, target):
-        self.target = target
-        current_time = pygame.time.get_ticks()
-        
-        # 更新动作计时器
-        if self.action_timer > 0:
-            self.action_timer -= 1
-            
-        # 检查是否需要做出新决策
-        if current_time - self.last_decision_time >= self.decision_interval:
-            self._make_decision()
-            self.last_decision_time = current_time
-            
-        # 执行当前动作
-        return self._execute_action()
-        
-    def _make_decision(self):
-        """AI决策逻辑"""
-        if not self.target:
-            return
-            
-        distance = abs(self.fighter.x - self.target.x)
-        skill = self._get_skill_level()
-        
-        # 根据距离和情况选择动作
-        if distance > 200:
-            # 距离较远，接近目标或使用闪现
-            if self.fighter.can_dash() and random.random() < skill['dash_chance']:
-                self.current_action = 'dash'
-                self.action_timer = 10
-            elif self.target.x > self.fighter.x:
-                self.current_action = 'move_right'
-                self.action_timer = random.randint(30, 90)
-            else:
-                self.current_action = 'move_left'
-                self.action_timer = random.randint(30, 90)
-            
-        elif distance > 80:
-            # 中等距离，随机选择动作
-            actions = ['move_closer', 'jump', 'wait']
-            if random.random() < skill['special_chance'] and self.fighter.special_energy >= self.fighter.special_energy_cost:
-                actions.append('special_attack')
-            if self.fighter.can_dash() and random.random() < skill['dash_chance']:
-                actions.append('dash')
-            self.current_action = random.choice(actions)
-            self.action_timer = random.randint(20, 60)
-            
-        else:
-            # 近距离，战斗动作
-            if self.target.is_attacking and random.random() < skill['block_chance']:
-                self.current_action = 'block'
-                self.action_timer = 20
-            elif random.random() < skill['accuracy']:
-                if random.random() < skill['special_chance'] and self.fighter.special_energy >= self.fighter.special_energy_cost:
-                    self.current_action = 'special_attack'
-                else:
-                    self.current_action = 'attack'
-                self.action_timer = 15
-            elif random.random() < skill['dodge_chance']:
-                # 闪避
-                if self.fighter.can_dash() and random.random() < skill['dash_chance']:
-                    self.current_action = 'dash'
-                elif random.random() < 0.5:
-                    self.current_action = 'jump'
-                else:
-                    self.current_action = 'move_back'
-                self.action_timer = 30
-            else:
-                self.current_action = 'wait'
-                self.action_timer = 10
-                
-    def _execute_action(self):
-        """执行AI动作，返回模拟的按键状态"""
-        if not self.current_action or self.action_timer <= 0:
-            return {}
-            
-        # 创建虚拟按键状态
-        virtual_keys = {}
-        for key in self.fighter.controls.values():
-            virtual_keys[key] = False
-            
-        if self.current_action == 'move_right':
-            virtual_keys[self.fighter.controls['right']] = True
-        elif self.current_action == 'move_left':
-            virtual_keys[self.fighter.controls['left']] = True
-        elif self.current_action == 'move_closer':
-            if self.target.x > self.fighter.x:
-                virtual_keys[self.fighter.controls['right']] = True
-            else:
-                virtual_keys[self.fighter.controls['left']] = True
-        elif self.current_action == 'move_back':
-            if self.target.x > self.fighter.x:
-                virtual_keys[self.fighter.controls['left']] = True
-            else:
-                virtual_keys[self.fighter.controls['right']] = True
-        elif self.current_action == 'jump':
-            virtual_keys[self.fighter.controls['jump']] = True
-        elif self.current_action == 'attack':
-            virtual_keys[self.fighter.controls['attack']] = True
-        elif self.current_action == 'special_attack':
-            virtual_keys[self.fighter.controls['special']] = True
-        elif self.current_action == 'block':
-            virtual_keys[self.fighter.controls['block']] = True
-        elif self.current_action == 'dash':
-            virtual_keys[self.fighter.controls['dash']] = True
-            
-        return virtual_keys
-
-class Fighter:
+class Fighter(FighterCore):
+    """带绘制功能的角色，战斗规则见fight_core.FighterCore"""
+    __slots__ = ('prev_x', 'prev_y', 'render_position', 'sprites')
+    
     def __init__(self, x, y, name, color, controls):
-        self.x = x
-        self.y = y
-        self.width = 60
-        self.height = 80
-        self.name = name
-        self.color = color
-        self.health = 100
-        self.max_health = 100
-        self.speed = 5
-        self.jump_power = 15
-        self.velocity_y = 0
-        self.on_ground = True
-        self.facing_right = True
-        self.controls = controls
-        
-        # 战斗属性
-        self.attack_power = 10
-        self.defense = 5
-        self.combo_count = 0
-        self.last_attack_time = 0
-        self.attack_cooldown = 300  # 毫秒
-        self.is_attacking = False
-        self.attack_animation_time = 0
-        
-        # 特殊技能 - 降低能量消耗
-        self.special_energy = 0
-        self.max_special_energy = 100
-        self.special_energy_cost = 25  # 从50降低到25
-        self.is_blocking = False
-        
-        # 闪现功能
-        self.dash_distance = 100  # 闪现距离
-        self.dash_cooldown = 3000  # 3秒冷却时间
-        self.last_dash_time = 0
-        self.is_dashing = False
-        self.dash_animation_time = 0
-        
-        # 动画状态
-        self.animation_frame = 0
-        self.animation_timer = 0
-        
-        # 状态效果
-        self.stunned = False
-        self.stun_timer = 0
-        
-    def update(self, keys, ground_y):
-        if self.stunned:
-            self.stun_timer -= 1
-            if self.stun_timer <= 0:
-                self.stunned = False
-            return
-            
-        # 闪现动画更新
-        if self.is_dashing:
-            self.dash_animation_time -= 1
-            if self.dash_animation_time <= 0:
-                self.is_dashing = False
-            
-        # 移动控制
-        if keys[self.controls['left']] and not self.is_attacking and not self.is_dashing:
-            self.x -= self.speed
-            self.facing_right = False
-            if self.x < 0:
-                self.x = 0
-                
-        if keys[self.controls['right']] and not self.is_attacking and not self.is_dashing:
-            self.x += self.speed
-            self.facing_right = True
-            if self.x > SCREEN_WIDTH - self.width:
-                self.x = SCREEN_WIDTH - self.width
-                
-        # 跳跃控制
-        if keys[self.controls['jump']] and self.on_ground and not self.is_attacking and not self.is_dashing:
-            self.velocity_y = -self.jump_power
-            self.on_ground = False
-            
-        # 防御控制
-        self.is_blocking = keys[self.controls['block']] and not self.is_dashing
-        
-        # 重力和落地检测
-        if not self.on_ground:
-            self.velocity_y += 0.8  # 重力
-            self.y += self.velocity_y
-            
-            if self.y >= ground_y - self.height:
-                self.y = ground_y - self.height
-                self.velocity_y = 0
-                self.on_ground = True
-                
-        # 攻击动画更新
-        if self.is_attacking:
-            self.attack_animation_time -= 1
-            if self.attack_animation_time <= 0:
-                self.is_attacking = False
-                
-        # 动画更新
-        self.animation_timer += 1
-        if self.animation_timer >= 10:
-            self.animation_frame = (self.animation_frame + 1) % 4
-            self.animation_timer = 0
-            
-    def attack(self, target):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_attack_time < self.attack_cooldown:
-            return False
-            
-        if self.is_attacking or self.stunned or self.is_dashing:
-            return False
-            
-        # 检查攻击范围
-        attack_range = 80
-        distance = abs(self.x - target.x)
-        
-        if distance <= attack_range:
-            self.is_attacking = True
-            self.attack_animation_time = 15
-            self.last_attack_time = current_time
-            
-            # 计算伤害
-            damage = self.attack_power
-            if target.is_blocking:
-                damage = max(1, damage // 2)  # 防御减半伤害
-            else:
-                # 连击加成
-                if current_time - self.last_attack_time < 1000:
-                    self.combo_count += 1
-                    damage += self.combo_count * 2
-                else:
-                    self.combo_count = 0
-                    
-            target.take_damage(damage)
-            
-            # 增加特殊能量 - 提高能量获得
-            self.special_energy = min(self.max_special_energy, self.special_energy + 15)  # 从10提高到15
-            
-            return True
-        return False
-        
-    def special_attack(self, target):
-        if self.special_energy < self.special_energy_cost or self.stunned or self.is_dashing:
-            return False
-            
-        # 检查特殊攻击范围
-        special_range = 120
-        distance = abs(self.x - target.x)
-        
-        if distance <= special_range:
-            self.special_energy -= self.special_energy_cost  # 使用新的能量消耗
-            self.is_attacking = True
-            self.attack_animation_time = 30
-            
-            # 特殊攻击造成更大伤害和击晕效果
-            damage = self.attack_power * 2
-            if not target.is_blocking:
-                target.stunned = True
-                target.stun_timer = 60
-                
-            target.take_damage(damage)
-            return True
-        return False
-        
-    def dash(self):
-        """闪现功能"""
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_dash_time < self.dash_cooldown:
-            return False
-            
-        if self.stunned or self.is_attacking or self.is_dashing:
-            return False
-            
-        # 执行闪现
-        self.last_dash_time = current_time
-        self.is_dashing = True
-        self.dash_animation_time = 10  # 闪现动画持续时间
-        
-        # 根据面向方向闪现
-        if self.facing_right:
-            self.x += self.dash_distance
-            if self.x > SCREEN_WIDTH - self.width:
-                self.x = SCREEN_WIDTH - self.width
-        else:
-            self.x -= self.dash_distance
-            if self.x < 0:
-                self.x = 0
-                
-        return True
-        
-    def can_dash(self):
-        """检查是否可以闪现"""
-        current_time = pygame.time.get_ticks()
-        return current_time - self.last_dash_time >= self.dash_cooldown and not self.stunned and not self.is_attacking and not self.is_dashing
-        
-    def get_dash_cooldown_remaining(self):
-        """获取闪现剩余冷却时间"""
-        current_time = pygame.time.get_ticks()
-        remaining = self.dash_cooldown - (current_time - self.last_dash_time)
-        return max(0, remaining) / 1000  # 转换为秒
-        
-    def take_damage(self, damage):
-        actual_damage = max(1, damage - self.defense)
-        self.health -= actual_damage
-        if self.health < 0:
-            self.health = 0
-            
-    def draw(self, screen):
-        # 绘制角色主体
-        color = self.color
-        if self.stunned:
-            color = YELLOW  # 击晕状态用黄色显示
-        elif self.is_blocking:
-            color = BLUE  # 防御状态用蓝色显示
-        elif self.is_attacking:
-            color = RED   # 攻击状态用红色显示
-        elif self.is_dashing:
-            color = WHITE  # 闪现状态用白色显示
-            
-        # 闪现时添加透明效果
-        if self.is_dashing:
-            # 创建半透明表面
-            dash_surface = pygame.Surface((self.width, self.height))
-            dash_surface.set_alpha(150)  # 半透明
-            dash_surface.fill(color)
-            screen.blit(dash_surface, (self.x, self.y))
-        else:
-            pygame.draw.rect(screen, color, (self.x, self.y, self.width, self.height))
-        
-        # 绘制眼睛
-        eye_size = 5
-        if self.facing_right:
-            eye_x = self.x + self.width - 15
-        else:
-            eye_x = self.x + 10
-        pygame.draw.circle(screen, WHITE, (eye_x, self.y + 15), eye_size)
-        pygame.draw.circle(screen, BLACK, (eye_x, self.y + 15), eye_size - 2)
-        
-        # 绘制手臂（攻击时延伸）
-        arm_length = 20
-        if self.is_attacking:
-            arm_length = 40
-            
-        if self.facing_right:
-            arm_end_x = self.x + self.width + arm_length
-        else:
-            arm_end_x = self.x - arm_length
-            
-        pygame.draw.line(screen, color, 
-                        (self.x + self.width//2, self.y + 30), 
-                        (arm_end_x, self.y + 30), 5)
-        
-        # 绘制腿部
-        leg_y = self.y + self.height
-        pygame.draw.line(screen, color,
-                        (self.x + 15, leg_y),
-                        (self.x + 15, leg_y + 10), 8)
-        pygame.draw.line(screen, color,
-                        (self.x + self.width - 15, leg_y),
-                        (self.x + self.width - 15, leg_y + 10), 8)
+        super().__init__(x, y, name, color, controls)
+        self.prev_x = x
+        self.prev_y = y
+        self.render_position = (x, y)
+        self.sprites = None  # 图集中本角色颜色的帧表，第一次绘制时获取
+        
+    def draw(self, screen, alpha=1.0):
+        # 在上一帧和当前帧的位置之间插值，渲染帧率高于逻辑帧率时动作依然平滑
+        x, y = self.get_render_position(alpha)
+        self.render_position = (x, y)
+        
+        # 角色本体：按状态、朝向和动画帧从图集中取出预先画好的一帧，一次blit
+        if self.sprites is None:
+            self.sprites = get_sprite_frames(self.color, self.width, self.height)
+        sprite = self.sprites[sprite_state(self)][self.facing_right][self.animation_frame]
+        screen.blit(sprite, (x - SPRITE_MARGIN, y - 1))
         
         # 绘制名字（使用中文字体）
         font = get_chinese_font(24)
-        name_text = font.render(self.name, True, WHITE)
-        screen.blit(name_text, (self.x, self.y - 25))
+        name_text = render_text(font, self.name, WHITE)
+        screen.blit(name_text, (x, y - 25))
+        
+    def get_render_position(self, alpha):
+        """按插值系数alpha（0~1）计算绘制位置"""
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        return x, y
+        
+    def save_position(self):
+        """逻辑帧开始前记录位置，供渲染插值使用"""
+        self.prev_x = self.x
+        self.prev_y = self.y
+        
+    def get_draw_rect(self):
+        """返回最近一次draw涉及的屏幕区域（身体、伸出的手臂、腿和名字）"""
+        x, y = self.render_position
+        rect = pygame.Rect((x - SPRITE_MARGIN, y - 1), frame_size(self.width, self.height))
+        name_text = render_text(get_chinese_font(24), self.name, WHITE)
+        return rect.union(name_text.get_rect(topleft=(x, y - 25)))
+
+# 局部刷新模式下每帧都要重画的UI区域：双方血条/能量条/连击数和倒计时
+UI_DIRTY_RECTS = [
+    pygame.Rect(48, 48, 304, 90),
+    pygame.Rect(SCREEN_WIDTH - 352, 48, 304, 90),
+    pygame.Rect(SCREEN_WIDTH // 2 - 100, 30, 200, 40),
+]
+
+# 帧耗时叠加层的位置（F3切换显示）
+PROFILER_RECT = pygame.Rect(SCREEN_WIDTH - 330, 150, 320, 250)
 
 class Game:
-    def __init__(self):
+    def __init__(self, dirty_rects=False, render_fps=FPS, record_dir=None, replay_path=None,
+                 profile_dump=None, ai_worker=None, policy=None, spectate_port=None,
+                 connect=None, room='default', peer=None, listen_port=None, slot=1,
+                 input_delay=DEFAULT_INPUT_DELAY):
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("北航自由搏击大赛")
         self.clock = pygame.time.Clock()
@@ -532,28 +149,91 @@ class Game:
         self.game_mode = GameMode.PVP
         self.ai_difficulty = AIDifficulty.MEDIUM
         self.ai_controller = None
+        # 神经网络策略文件，指定后难度选择中出现“神经网络”
+        self.policy = policy
+        # 联网对战：connect为"主机:端口"时由对战服务器推进对局，本地只发送输入并绘制服务器的快照；
+        # 服务器上没有神经网络策略，联网时不提供该难度
+        self.net = None
+        self.room = room
+        if connect:
+            host, port = connect.rsplit(':', 1)
+            self.net = MatchClient(host, int(port))
+            policy = None
+        self.difficulty_choices = [d for d in AIDifficulty if d != AIDifficulty.NEURAL or policy]
+        # 点对点回滚对战：peer为对方的"主机:端口"，双人对战时本地控制slot号玩家
+        self.transport = None
+        self.rollback = None
+        if peer:
+            host, port = peer.rsplit(':', 1)
+            self.transport = UdpTransport(listen_port if listen_port is not None else int(port), (host, int(port)))
+        self.net_slot = slot - 1
+        self.input_delay = input_delay
+        self.match_counter = 0
+        if policy:
+            self.ai_difficulty = AIDifficulty.NEURAL
+        # 后台AI决策：ai_worker为'thread'或'process'时AI不在主循环里做决策
+        self.ai_worker = AIWorker(ai_worker, policy=policy) if ai_worker else None
         
         # 地面高度
         self.ground_y = SCREEN_HEIGHT - 100
         
+        # 本帧按下的攻击/特技/闪现键，在update中交给对战引擎
+        self.pressed_keys = set()
+        
+        # 命中、防御、击晕和闪现的粒子特效，由角色产生的战斗事件驱动
+        self.combat_events = []
+        self.particles = ParticleSystem()
+        
+        # 每局的随机种子，决定AI行为和背景，随录像一起保存
+        self.match_seed = random.getrandbits(32)
+        
+        # 观战广播：spectate_port不为空时每个逻辑帧把对战状态推送给观众
+        self.spectators = SpectatorServer(port=spectate_port) if spectate_port is not None else None
+        
+        # 录像：record_dir不为空时每局对战都写入一个录像文件；replay为正在回放的录像
+        self.record_dir = record_dir
+        self.recorder = None
+        self.replay = None
+        
         # 创建战斗角色
         self.create_fighters()
         
-        # 游戏状态
-        self.game_time = 180  # 3分钟倒计时
-        self.winner = None
+        # 游戏状态（倒计时和胜负保存在self.match中）
         self.round_count = 1
         self.max_rounds = 3
         
-        # 背景元素
+        # 背景元素，预先绘制到静态图层上
         self.background_elements = self.create_background()
+        self.background = self.bake_background()
+        self.prepare_surfaces()
+        
+        # 局部刷新模式：对战中只重画并提交角色和UI所在的矩形
+        self.dirty_rects = dirty_rects
+        self.match_layer = None
+        self.previous_rects = []
+        self.last_drawn_state = None
+        
+        # 固定步长循环：渲染帧率与逻辑帧率(FPS)相互独立，0表示不限制渲染帧率
+        self.render_fps = render_fps
+        self.loop_stats = {'frames': 0, 'ticks': 0, 'caught_up_ticks': 0, 'dropped_ticks': 0}
+        
+        # 分阶段帧耗时统计，F3显示叠加层，profile_dump不为空时退出时导出
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        self.profile_dump = profile_dump
+        self.font_profiler = get_font(None, 20)
         
         # 菜单选择
         self.menu_selection = 0
         self.mode_selection = 0
         self.difficulty_selection = 0
         
-    def create_fighters(self):
+        if replay_path:
+            self.start_replay(replay_path)
+        
+    def create_fighters(self, seed=None):
+        self.match_seed = seed if seed is not None else random.getrandbits(32)
+        
         # 玩家1控制键位
         p1_controls = {
             'left': pygame.K_a,
@@ -579,19 +259,38 @@ class Game:
         self.player1 = Fighter(200, self.ground_y - 80, "北航学霸", GREEN, p1_controls)
         if self.game_mode == GameMode.PVE:
             self.player2 = Fighter(600, self.ground_y - 80, "AI导师", ORANGE, p2_controls)
-            self.ai_controller = AIController(self.player2, self.ai_difficulty)
         else:
             self.player2 = Fighter(600, self.ground_y - 80, "计算机系大神", PURPLE, p2_controls)
+        
+        # 对战状态持有共享的帧时钟，AI也从这个时钟读时间
+        self.match = MatchState(self.player1, self.player2, self.ground_y)
+        self.player1.events = self.combat_events
+        self.player2.events = self.combat_events
+        if self.game_mode == GameMode.PVE and self.ai_worker:
+            self.ai_controller = AsyncAIController(self.player2, self.ai_difficulty, self.ai_worker,
+                                                   self.match.clock, seed=self.match_seed)
+        elif self.game_mode == GameMode.PVE:
+            self.ai_controller = create_ai_controller(self.player2, self.ai_difficulty, self.match.clock,
+                                                      rng=random.Random(self.match_seed), policy=self.policy)
+        else:
             self.ai_controller = None
         
-    def create_background(self):
+    @property
+    def game_time(self):
+        return self.match.game_time
+        
+    @property
+    def winner(self):
+        return self.match.winner
+        
+    def create_background(self, rng=random):
         elements = []
         # 创建一些装饰性背景元素（代表北航建筑）
         for i in range(5):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(50, 200)
-            width = random.randint(40, 80)
-            height = random.randint(60, 120)
+            x = rng.randint(0, SCREEN_WIDTH)
+            y = rng.randint(50, 200)
+            width = rng.randint(40, 80)
+            height = rng.randint(60, 120)
             elements.append({'x': x, 'y': y, 'width': width, 'height': height})
         return elements
         
@@ -601,6 +300,12 @@ class Game:
                 return False
                 
             if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3:
+                    # 切换帧耗时叠加层，下一帧整屏重画
+                    self.show_profiler = not self.show_profiler
+                    self.last_drawn_state = None
+                    continue
+                    
                 if self.state == GameState.MENU:
                     if event.key == pygame.K_UP:
                         self.menu_selection = (self.menu_selection - 1) % 3
@@ -620,12 +325,11 @@ class Game:
                             
                 elif self.state == GameState.DIFFICULTY_SELECT:
                     if event.key == pygame.K_UP:
-                        self.difficulty_selection = (self.difficulty_selection - 1) % 4
+                        self.difficulty_selection = (self.difficulty_selection - 1) % len(self.difficulty_choices)
                     elif event.key == pygame.K_DOWN:
-                        self.difficulty_selection = (self.difficulty_selection + 1) % 4
+                        self.difficulty_selection = (self.difficulty_selection + 1) % len(self.difficulty_choices)
                     elif event.key == pygame.K_RETURN or event.key == pygame.K_SPACE:
-                        difficulties = [AIDifficulty.EASY, AIDifficulty.MEDIUM, AIDifficulty.HARD, AIDifficulty.EXPERT]
-                        self.ai_difficulty = difficulties[self.difficulty_selection]
+                        self.ai_difficulty = self.difficulty_choices[self.difficulty_selection]
                         self.state = GameState.PLAYING
                         self.create_fighters()
                         self.reset_game()
@@ -635,107 +339,158 @@ class Game:
                 elif self.state == GameState.PLAYING:
                     if event.key == pygame.K_ESCAPE:
                         self.state = GameState.PAUSE
-                    elif event.key == self.player1.controls['attack']:
-                        self.player1.attack(self.player2)
-                    elif event.key == self.player1.controls['special']:
-                        self.player1.special_attack(self.player2)
-                    elif event.key == self.player1.controls['dash']:
-                        self.player1.dash()
-                    # 只有在PVP模式下才处理玩家2的输入
-                    elif self.game_mode == GameMode.PVP:
-                        if event.key == self.player2.controls['attack']:
-                            self.player2.attack(self.player1)
-                        elif event.key == self.player2.controls['special']:
-                            self.player2.special_attack(self.player1)
-                        elif event.key == self.player2.controls['dash']:
-                            self.player2.dash()
+                    elif self.replay and event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                        # 回放时左右方向键后退/快进5秒
+                        offset = 5 * FPS if event.key == pygame.K_RIGHT else -5 * FPS
+                        self.replay.seek(self.match.tick + offset)
+                        self.player1.save_position()
+                        self.player2.save_position()
+                    else:
+                        # 攻击、特技和闪现在下一次update时由对战引擎结算
+                        self.pressed_keys.add(event.key)
                             
                 elif self.state == GameState.PAUSE:
                     if event.key == pygame.K_ESCAPE:
                         self.state = GameState.PLAYING
                     elif event.key == pygame.K_q:
+                        self.stop_recording()
+                        self.replay = None
                         self.state = GameState.MENU
                         
                 elif self.state == GameState.GAME_OVER:
                     if event.key == pygame.K_SPACE:
+                        self.replay = None
                         self.state = GameState.MENU
                         
         return True
         
     def update(self):
         if self.state == GameState.PLAYING:
+            self.player1.save_position()
+            self.player2.save_position()
             keys = pygame.key.get_pressed()
             
-            # 更新玩家1
-            self.player1.update(keys, self.ground_y)
+            if self.net:
+                self.update_network(keys)
+                return
             
-            # 更新玩家2或AI
-            if self.game_mode == GameMode.PVE and self.ai_controller:
-                # AI控制玩家2
-                ai_keys = self.ai_controller.update(self.player1)
-                
-                # 创建一个可以处理AI虚拟按键的键状态对象
-                class CombinedKeys:
-                    def __init__(self, real_keys, virtual_keys):
-                        self.real_keys = real_keys
-                        self.virtual_keys = virtual_keys
-                    
-                    def __getitem__(self, key):
-                        # 首先检查虚拟按键
-                        if key in self.virtual_keys:
-                            return self.virtual_keys[key]
-                        # 然后检查真实按键，确保索引在范围内
-                        if key < len(self.real_keys):
-                            return self.real_keys[key]
-                        return False
+            if self.rollback:
+                # 联网双人对战：本地输入交给回滚会话，由它推进、原地等待或回滚重算
+                inputs = keys_to_inputs(keys, self.player1.controls, self.pressed_keys)
+                self.pressed_keys.clear()
+                finished = self.rollback.advance(inputs)
+            else:
+                if self.replay:
+                    # 回放：输入来自录像文件
+                    inputs = self.replay.next_inputs()
+                    if inputs is None:
+                        self.state = GameState.GAME_OVER
+                        return
+                    inputs_p1, inputs_p2 = inputs
+                else:
+                    inputs_p1 = keys_to_inputs(keys, self.player1.controls, self.pressed_keys)
+                    # 玩家2的输入来自AI或键盘
+                    if self.game_mode == GameMode.PVE and self.ai_controller:
+                        with self.profiler.phase('ai'):
+                            ai_keys = self.ai_controller.update(self.player1)
+                        inputs_p2 = virtual_keys_to_inputs(ai_keys, self.player2.controls)
+                    else:
+                        inputs_p2 = keys_to_inputs(keys, self.player2.controls, self.pressed_keys)
+                self.pressed_keys.clear()
                 
-                combined_keys = CombinedKeys(keys, ai_keys)
-                self.player2.update(combined_keys, self.ground_y)
+                if self.recorder:
+                    self.recorder.record(inputs_p1, inputs_p2)
                 
-                # AI执行攻击和闪现
-                if ai_keys.get(self.player2.controls['attack'], False):
-                    self.player2.attack(self.player1)
-                elif ai_keys.get(self.player2.controls['special'], False):
-                    self.player2.special_attack(self.player1)
-                elif ai_keys.get(self.player2.controls['dash'], False):
-                    self.player2.dash()
-            else:
-                # 玩家控制玩家2
-                self.player2.update(keys, self.ground_y)
+                # 由对战引擎推进一帧并判断胜负
+                finished = step(self.match, inputs_p1, inputs_p2)
             
-            # 更新游戏时间
-            self.game_time -= 1/FPS
+            # 本帧的战斗事件生成粒子，全部粒子一起推进一帧
+            with self.profiler.phase('effects'):
+                self.particles.spawn_events(self.combat_events)
+                self.combat_events.clear()
+                self.particles.update()
             
-            # 检查游戏结束条件
-            if self.player1.health <= 0:
-                self.winner = self.player2
-                self.state = GameState.GAME_OVER
-            elif self.player2.health <= 0:
-                self.winner = self.player1
-                self.state = GameState.GAME_OVER
-            elif self.game_time <= 0:
-                # 时间结束，血量多的获胜
-                if self.player1.health > self.player2.health:
-                    self.winner = self.player1
-                elif self.player2.health > self.player1.health:
-                    self.winner = self.player2
-                else:
-                    self.winner = None  # 平局
+            if self.spectators:
+                with self.profiler.phase('broadcast'):
+                    self.spectators.publish(self.match)
+            
+            if finished:
+                self.stop_recording()
                 self.state = GameState.GAME_OVER
+        elif self.state == GameState.GAME_OVER and self.rollback:
+            # 结束画面里继续发送最后几帧的输入，对方丢了包也能确认胜负
+            self.rollback.advance({})
                 
+    def update_network(self, keys):
+        """联网对战：把本地输入发给服务器，用收到的最新快照替换本地状态"""
+        inputs = keys_to_inputs(keys, self.player1.controls, self.pressed_keys)
+        self.pressed_keys.clear()
+        try:
+            self.net.send_inputs(inputs)
+            snapshot = self.net.poll()
+        except ConnectionError as e:
+            print(f"与对战服务器的连接中断：{e}")
+            self.net = None
+            self.state = GameState.MENU
+            return
+        if snapshot is not None:
+            self.match.restore(snapshot)
+        if self.match.finished:
+            self.state = GameState.GAME_OVER
+            
     def reset_game(self):
-        self.player1.health = self.player1.max_health
-        self.player2.health = self.player2.max_health
-        self.player1.special_energy = 0
-        self.player2.special_energy = 0
-        self.player1.x = 200
-        self.player2.x = 600
-        self.player1.y = self.ground_y - 80
-        self.player2.y = self.ground_y - 80
-        self.game_time = 180
-        self.winner = None
-        
-    def draw_ui(self):
+        if self.net:
+            # 服务器分配的种子决定对局和背景
+            difficulty = self.ai_difficulty.value if self.game_mode == GameMode.PVE else 0
+            _, self.match_seed = self.net.join(self.room, self.game_mode.value, difficulty)
+        self.match.reset()
+        self.rollback = None
+        if self.transport and self.game_mode == GameMode.PVP:
+            # 双方按同样的顺序开局，对局编号一致，上一局迟到的包会被丢掉
+            self.match_counter += 1
+            self.rollback = RollbackSession(self.match, self.net_slot, self.transport,
+                                            input_delay=self.input_delay, match_id=self.match_counter)
+        self.pressed_keys.clear()
+        self.combat_events.clear()
+        self.particles.clear()
+        self.player1.save_position()
+        self.player2.save_position()
+        # 每局开始时按种子生成背景并重新烘焙背景图层
+        self.background_elements = self.create_background(random.Random(self.match_seed))
+        self.background = self.bake_background()
+        self.match_layer = None
+        self.start_recording()
+        
+    def start_recording(self):
+        self.stop_recording()
+        if not self.record_dir or self.replay or self.net or self.rollback:
+            return
+        os.makedirs(self.record_dir, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%d_%H%M%S')}_{self.match_seed:08x}.bkr"
+        difficulty = self.ai_difficulty.value if self.game_mode == GameMode.PVE else 0
+        self.recorder = ReplayRecorder(os.path.join(self.record_dir, filename), self.match,
+                                       seed=self.match_seed, mode=self.game_mode.value,
+                                       difficulty=difficulty)
+        
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+            
+    def start_replay(self, path):
+        """载入录像，按录像中的模式和种子重建对局后开始回放"""
+        replay = ReplayPlayer(path)
+        self.game_mode = GameMode(replay.mode)
+        if replay.difficulty:
+            self.ai_difficulty = AIDifficulty(replay.difficulty)
+        self.create_fighters(seed=replay.seed)
+        self.replay = replay
+        self.reset_game()
+        replay.state = self.match
+        replay.seek(0)
+        self.state = GameState.PLAYING
+        
+    def draw_ui(self, include_hints=True):
         # 绘制血条
         bar_width = 300
         bar_height = 20
@@ -789,44 +544,50 @@ class Game:
             pygame.draw.rect(self.screen, WHITE, (SCREEN_WIDTH - 350, 95, bar_width, dash_bar_height), 1)
         
         # 绘制时间
-        time_text = self.font_medium.render(f"时间: {int(self.game_time)}", True, WHITE)
+        time_text = render_text(self.font_medium, f"时间: {int(self.game_time)}", WHITE)
         time_rect = time_text.get_rect(center=(SCREEN_WIDTH//2, 50))
         self.screen.blit(time_text, time_rect)
         
         # 绘制连击数
         if self.player1.combo_count > 0:
-            combo_text = self.font_small.render(f"连击: {self.player1.combo_count}", True, YELLOW)
+            combo_text = render_text(self.font_small, f"连击: {self.player1.combo_count}", YELLOW)
             self.screen.blit(combo_text, (50, 110))
             
         if self.player2.combo_count > 0:
-            combo_text = self.font_small.render(f"连击: {self.player2.combo_count}", True, YELLOW)
+            combo_text = render_text(self.font_small, f"连击: {self.player2.combo_count}", YELLOW)
             self.screen.blit(combo_text, (SCREEN_WIDTH - 150, 110))
             
+        if include_hints:
+            self.draw_ui_hints()
+            
+    def draw_ui_hints(self):
         # 绘制控制说明
         control_y = SCREEN_HEIGHT - 80
         if self.game_mode == GameMode.PVP:
             # 双人对战控制说明
-            p1_controls = self.font_small.render("玩家1: WASD移动 F攻击 S防御 G特技 空格闪现", True, WHITE)
-            p2_controls = self.font_small.render("玩家2: 方向键移动 .攻击 ↓防御 /特技 右Shift闪现", True, WHITE)
+            p1_controls = render_text(self.font_small, "玩家1: WASD移动 F攻击 S防御 G特技 空格闪现", WHITE)
+            p2_controls = render_text(self.font_small, "玩家2: 方向键移动 .攻击 ↓防御 /特技 右Shift闪现", WHITE)
             self.screen.blit(p1_controls, (20, control_y))
             self.screen.blit(p2_controls, (20, control_y + 25))
         else:
             # 人机对战控制说明
-            player_controls = self.font_small.render("控制: WASD移动 F攻击 S防御 G特技 空格闪现 ESC暂停", True, WHITE)
+            player_controls = render_text(self.font_small, "控制: WASD移动 F攻击 S防御 G特技 空格闪现 ESC暂停", WHITE)
             self.screen.blit(player_controls, (20, control_y))
             
         # 绘制UI说明
-        ui_hint1 = self.font_small.render("蓝色条: 特技能量(25%即可释放) 橙/绿条: 闪现冷却", True, YELLOW)
-        ui_hint2 = self.font_small.render("特技能量消耗降低，闪现CD3秒，攻击更频繁", True, YELLOW)
+        ui_hint1 = render_text(self.font_small, "蓝色条: 特技能量(25%即可释放) 橙/绿条: 闪现冷却", YELLOW)
+        ui_hint2 = render_text(self.font_small, "特技能量消耗降低，闪现CD3秒，攻击更频繁", YELLOW)
         self.screen.blit(ui_hint1, (SCREEN_WIDTH//2 - 200, SCREEN_HEIGHT - 50))
         self.screen.blit(ui_hint2, (SCREEN_WIDTH//2 - 180, SCREEN_HEIGHT - 25))
         
-    def draw(self):
-        self.screen.fill(LIGHT_BLUE)  # 天空色背景
+    def bake_background(self):
+        """把天空、建筑和地面一次性画到Surface上，之后每帧直接blit"""
+        background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        background.fill(LIGHT_BLUE)  # 天空色背景
         
         # 绘制背景建筑
         for element in self.background_elements:
-            pygame.draw.rect(self.screen, GRAY, 
+            pygame.draw.rect(background, GRAY, 
                            (element['x'], element['y'], element['width'], element['height']))
             # 窗户
             for i in range(2):
@@ -834,33 +595,96 @@ class Game:
                     window_x = element['x'] + 10 + i * 20
                     window_y = element['y'] + 10 + j * 25
                     if window_x < element['x'] + element['width'] - 10 and window_y < element['y'] + element['height'] - 10:
-                        pygame.draw.rect(self.screen, YELLOW, (window_x, window_y, 8, 12))
+                        pygame.draw.rect(background, YELLOW, (window_x, window_y, 8, 12))
         
         # 绘制地面
-        pygame.draw.rect(self.screen, GREEN, (0, self.ground_y, SCREEN_WIDTH, SCREEN_HEIGHT - self.ground_y))
+        pygame.draw.rect(background, GREEN, (0, self.ground_y, SCREEN_WIDTH, SCREEN_HEIGHT - self.ground_y))
+        return background
+        
+    def prepare_surfaces(self):
+        """预先烘焙角色图集和暂停覆盖层，对战中绘制时不再分配Surface"""
+        load_sprite_atlas(FIGHTER_COLORS, self.player1.width, self.player1.height)
+        get_filled_surface((SCREEN_WIDTH, SCREEN_HEIGHT), BLACK, PAUSE_OVERLAY_ALPHA)
+        
+    def bake_match_layer(self):
+        """对战图层：背景加上整局不变的操作说明，局部刷新时用来擦除旧画面"""
+        layer = self.background.copy()
+        screen = self.screen
+        self.screen = layer
+        self.draw_ui_hints()
+        self.screen = screen
+        return layer
+        
+    def draw(self, alpha=1.0):
+        """
+        绘制一帧；alpha为角色位置的插值系数
+        返回需要提交的矩形列表，返回None表示整屏都需要刷新
+        """
+        if self.dirty_rects and self.state == GameState.PLAYING and self.last_drawn_state == GameState.PLAYING:
+            return self.draw_dirty(alpha)
+        self.last_drawn_state = self.state
+        
+        self.screen.blit(self.background, (0, 0))
         
         if self.state == GameState.MENU:
             self.draw_menu()
         elif self.state == GameState.DIFFICULTY_SELECT:
             self.draw_difficulty_select()
         elif self.state == GameState.PLAYING:
-            self.player1.draw(self.screen)
-            self.player2.draw(self.screen)
-            self.draw_ui()
+            with self.profiler.phase('fighter_draw'):
+                self.player1.draw(self.screen, alpha)
+                self.player2.draw(self.screen, alpha)
+            with self.profiler.phase('effects'):
+                self.particles.draw(self.screen)
+            with self.profiler.phase('draw_ui'):
+                self.draw_ui()
+            self.previous_rects = self.get_draw_rects()
         elif self.state == GameState.PAUSE:
             self.player1.draw(self.screen)
             self.player2.draw(self.screen)
+            self.particles.draw(self.screen)
             self.draw_ui()
             self.draw_pause()
         elif self.state == GameState.GAME_OVER:
             self.draw_game_over()
-            
+        return None
+        
+    def draw_dirty(self, alpha=1.0):
+        """局部刷新：用对战图层擦掉上一帧的角色和UI，再画出这一帧"""
+        if self.match_layer is None:
+            self.match_layer = self.bake_match_layer()
+            
+        erase = self.previous_rects + UI_DIRTY_RECTS
+        if self.show_profiler:
+            erase.append(PROFILER_RECT)
+        for rect in erase:
+            self.screen.blit(self.match_layer, rect, rect)
+            
+        with self.profiler.phase('fighter_draw'):
+            self.player1.draw(self.screen, alpha)
+            self.player2.draw(self.screen, alpha)
+        with self.profiler.phase('effects'):
+            self.particles.draw(self.screen)
+        with self.profiler.phase('draw_ui'):
+            self.draw_ui(include_hints=False)
+        
+        self.previous_rects = self.get_draw_rects()
+        return erase + self.previous_rects
+        
+    def get_draw_rects(self):
+        """本帧角色和粒子所在的区域，局部刷新时下一帧先擦除这些区域"""
+        rects = [self.player1.get_draw_rect(), self.player2.get_draw_rect()]
+        particle_rect = self.particles.get_draw_rect()
+        if particle_rect is not None:
+            rects.append(particle_rect.clip(self.screen.get_rect()))
+        return rects
+        
     def draw_menu(self):
-        title_text = self.font_large.render("北航自由搏击大赛", True, BLACK)
+        title_text = render_text(self.font_large, "北航自由搏击大赛", BLACK)
         title_rect = title_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 150))
         self.screen.blit(title_text, title_rect)
         
-        subtitle_text = self.font_medium.render("AI+X 创意作品", True, BLACK)
+        subtitle_text = render_text(self.font_medium, "AI+X 创意作品", BLACK)
         subtitle_rect = subtitle_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 100))
         self.screen.blit(subtitle_text, subtitle_rect)
         
@@ -868,17 +692,17 @@ class Game:
         menu_options = ["人机对战", "双人对战", "退出游戏"]
         for i, option in enumerate(menu_options):
             color = RED if i == self.menu_selection else BLACK
-            option_text = self.font_medium.render(option, True, color)
+            option_text = render_text(self.font_medium, option, color)
             option_rect = option_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 20 + i * 50))
             self.screen.blit(option_text, option_rect)
             
         # 控制说明
-        instruction_text = self.font_small.render("使用↑↓键选择，回车确认", True, BLACK)
+        instruction_text = render_text(self.font_small, "使用↑↓键选择，回车确认", BLACK)
         instruction_rect = instruction_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 150))
         self.screen.blit(instruction_text, instruction_rect)
         
     def draw_difficulty_select(self):
-        title_text = self.font_large.render("选择AI难度", True, BLACK)
+        title_text = render_text(self.font_large, "选择AI难度", BLACK)
         title_rect = title_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 150))
         self.screen.blit(title_text, title_rect)
         
@@ -887,65 +711,150 @@ class Game:
             ("简单", "AI反应较慢，攻击精度低"),
             ("中等", "AI有一定战术，适中难度"),
             ("困难", "AI反应迅速，攻击精准"),
-            ("专家", "AI大师级别，极具挑战性")
+            ("专家", "AI大师级别，极具挑战性"),
+            ("大师", "AI实时推演招式，每次决策限时2毫秒"),
+            ("神经网络", "加载训练好的策略（--policy）")
         ]
         
-        for i, (name, desc) in enumerate(difficulty_options):
+        for i, (name, desc) in enumerate(difficulty_options[:len(self.difficulty_choices)]):
             color = RED if i == self.difficulty_selection else BLACK
-            name_text = self.font_medium.render(name, True, color)
-            name_rect = name_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 80 + i * 60))
+            name_text = render_text(self.font_medium, name, color)
+            name_rect = name_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 100 + i * 55))
             self.screen.blit(name_text, name_rect)
             
             desc_color = GRAY if i == self.difficulty_selection else BLACK
-            desc_text = self.font_small.render(desc, True, desc_color)
-            desc_rect = desc_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 50 + i * 60))
+            desc_text = render_text(self.font_small, desc, desc_color)
+            desc_rect = desc_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 72 + i * 55))
             self.screen.blit(desc_text, desc_rect)
             
         # 控制说明
-        instruction_text = self.font_small.render("使用↑↓键选择难度，回车确认，ESC返回", True, BLACK)
-        instruction_rect = instruction_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 200))
+        instruction_text = render_text(self.font_small, "使用↑↓键选择难度，回车确认，ESC返回", BLACK)
+        instruction_rect = instruction_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 250))
         self.screen.blit(instruction_text, instruction_rect)
             
     def draw_pause(self):
         # 半透明覆盖层
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(128)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blit(get_filled_surface((SCREEN_WIDTH, SCREEN_HEIGHT), BLACK, PAUSE_OVERLAY_ALPHA), (0, 0))
         
-        pause_text = self.font_large.render("游戏暂停", True, WHITE)
+        pause_text = render_text(self.font_large, "游戏暂停", WHITE)
         pause_rect = pause_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2))
         self.screen.blit(pause_text, pause_rect)
         
-        resume_text = self.font_medium.render("按ESC继续, 按Q返回主菜单", True, WHITE)
+        resume_text = render_text(self.font_medium, "按ESC继续, 按Q返回主菜单", WHITE)
         resume_rect = resume_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 50))
         self.screen.blit(resume_text, resume_rect)
         
     def draw_game_over(self):
         if self.winner:
-            winner_text = self.font_large.render(f"{self.winner.name} 获胜!", True, BLACK)
+            winner_text = render_text(self.font_large, f"{self.winner.name} 获胜!", BLACK)
         else:
-            winner_text = self.font_large.render("平局!", True, BLACK)
+            winner_text = render_text(self.font_large, "平局!", BLACK)
             
         winner_rect = winner_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2))
         self.screen.blit(winner_text, winner_rect)
         
-        restart_text = self.font_medium.render("按空格键返回主菜单", True, BLACK)
+        restart_text = render_text(self.font_medium, "按空格键返回主菜单", BLACK)
         restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 50))
         self.screen.blit(restart_text, restart_rect)
         
     def run(self):
+        """
+        固定步长主循环：按实际经过的时间累积，每满一个TICK_SECONDS执行一次update，
+        慢帧时一次渲染补跑多个逻辑帧，超过MAX_CATCH_UP_TICKS的部分直接丢弃
+        """
         running = True
+        accumulator = 0.0
+        previous_time = time.perf_counter()
         while running:
-            running = self.handle_events()
-            self.update()
-            self.draw()
-            pygame.display.flip()
-            self.clock.tick(FPS)
-            
+            now = time.perf_counter()
+            accumulator += min(now - previous_time, MAX_FRAME_SECONDS)
+            previous_time = now
+            
+            with self.profiler.phase('handle_events'):
+                running = self.handle_events()
+            
+            ticks = 0
+            while accumulator >= TICK_SECONDS and ticks < MAX_CATCH_UP_TICKS:
+                with self.profiler.phase('update'):
+                    self.update()
+                accumulator -= TICK_SECONDS
+                ticks += 1
+            if accumulator >= TICK_SECONDS:
+                dropped = int(accumulator / TICK_SECONDS)
+                accumulator -= dropped * TICK_SECONDS
+                self.loop_stats['dropped_ticks'] += dropped
+            if ticks > 1:
+                self.loop_stats['caught_up_ticks'] += ticks - 1
+            self.loop_stats['ticks'] += ticks
+            self.loop_stats['frames'] += 1
+            
+            with self.profiler.phase('draw'):
+                dirty = self.draw(accumulator / TICK_SECONDS)
+                if self.show_profiler:
+                    self.profiler.draw_overlay(self.screen, self.font_profiler, PROFILER_RECT)
+                    if dirty is not None:
+                        dirty.append(PROFILER_RECT)
+            with self.profiler.phase('flip'):
+                if dirty is None:
+                    pygame.display.flip()
+                else:
+                    pygame.display.update(dirty)
+            self.profiler.end_frame()
+            self.clock.tick(self.render_fps)
+            
+        if self.profile_dump:
+            self.profiler.dump(self.profile_dump)
+        stats = self.loop_stats
+        print(f"渲染{stats['frames']}帧，逻辑{stats['ticks']}帧，"
+              f"追帧{stats['caught_up_ticks']}，丢帧{stats['dropped_ticks']}")
+        if self.ai_worker:
+            self.ai_worker.close()
+            ai_stats = self.ai_worker.stats()
+            print(f"后台AI决策{ai_stats['decisions']}次，超时{ai_stats['deadline_misses']}次，"
+                  f"延迟p50 {ai_stats['latency_p50']:.2f}ms p99 {ai_stats['latency_p99']:.2f}ms，"
+                  f"计算p99 {ai_stats['compute_p99']:.2f}ms")
+        if self.net:
+            self.net.close()
+        if self.transport:
+            if self.rollback:
+                rollback_stats = self.rollback.stats()
+                print(f"回滚对战：推进{rollback_stats['frames']}帧，等待{rollback_stats['stalls']}帧，"
+                      f"回滚{rollback_stats['rollbacks']}次（单次最多{rollback_stats['max_resimulated']}帧），"
+                      f"重算耗时p99 {rollback_stats['resim_p99_ms']:.3f}毫秒")
+            self.transport.close()
+        if self.spectators:
+            self.spectators.close()
+            spectator_stats = self.spectators.stats()
+            print(f"观战广播：观众{spectator_stats['connected']}个，断开慢速观众{spectator_stats['dropped']}个，"
+                  f"发送{spectator_stats['bytes_sent'] / 1024:.0f}KB")
         pygame.quit()
         sys.exit()
 
+def main():
+    parser = argparse.ArgumentParser(description="北航自由搏击大赛")
+    parser.add_argument('--dirty-rects', action='store_true', help="对战中只刷新变化的区域，适合低配机器")
+    parser.add_argument('--render-fps', type=int, default=FPS, help="渲染帧率（如30/60/144），0为不限制；逻辑帧率固定为60")
+    parser.add_argument('--record-dir', help="把每局对战的录像保存到该目录")
+    parser.add_argument('--replay', help="回放录像文件（左右方向键跳转5秒）")
+    parser.add_argument('--profile-dump', help="退出时把帧耗时统计导出到该文件（.csv或.json）")
+    parser.add_argument('--ai-worker', choices=('thread', 'process'),
+                        help="在后台线程或进程中做AI决策，主循环不等待AI")
+    parser.add_argument('--policy', help="神经网络AI的策略文件（.npz），人机对战默认使用该AI")
+    parser.add_argument('--spectate', type=int, metavar='PORT', help="在该端口开启观战广播")
+    parser.add_argument('--connect', metavar='HOST:PORT', help="连接对战服务器（match_server.py），对局由服务器推进")
+    parser.add_argument('--room', default='default', help="联网对战的房间名，双人对战时两名玩家填同一个房间")
+    parser.add_argument('--peer', metavar='HOST:PORT', help="点对点双人对战（回滚网络）的对方地址")
+    parser.add_argument('--listen', type=int, metavar='PORT', help="点对点对战的本地UDP端口，默认与对方端口相同")
+    parser.add_argument('--slot', type=int, choices=(1, 2), default=1, help="点对点对战中本地控制的玩家")
+    parser.add_argument('--input-delay', type=int, default=DEFAULT_INPUT_DELAY, help="点对点对战的本地输入延迟（帧）")
+    args = parser.parse_args()
+    
+    game = Game(dirty_rects=args.dirty_rects, render_fps=args.render_fps,
+                record_dir=args.record_dir, replay_path=args.replay,
+                profile_dump=args.profile_dump, ai_worker=args.ai_worker, policy=args.policy,
+                spectate_port=args.spectate, connect=args.connect, room=args.room,
+                peer=args.peer, listen_port=args.listen, slot=args.slot, input_delay=args.input_delay)
+    game.run()
+
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    main()
\ No newline at end of file
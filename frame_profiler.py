@@ -0,0 +1,159 @@
+"""
+北航自由搏击 - 帧耗时统计
+按阶段（事件处理、逻辑更新、AI、绘制、翻页等）记录每帧耗时到定长环形缓冲区，
+可在游戏内显示p50/p95/p99和折线图，退出时导出CSV或JSON
+"""
+
+import csv
+import json
+import time
+from array import array
+
+import pygame
+
+from render_cache import TextCache
+
+class RingBuffer:
+    """定长环形缓冲区，写满后覆盖最旧的数据，不会随运行时间增长"""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = array('d', [0.0]) * capacity
+        self.index = 0
+        self.count = 0
+
+    def append(self, value):
+        self.data[self.index] = value
+        self.index = (self.index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def values(self):
+        """按时间顺序返回缓冲区中的数据"""
+        if self.count < self.capacity:
+            return list(self.data[:self.count])
+        return list(self.data[self.index:]) + list(self.data[:self.index])
+
+    def percentiles(self, *points):
+        values = sorted(self.values())
+        if not values:
+            return [0.0] * len(points)
+        return [values[min(len(values) - 1, int(len(values) * p / 100))] for p in points]
+
+class _Phase:
+    """计时上下文，每个阶段只创建一次，避免每帧分配对象"""
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+class FrameProfiler:
+    """
+    分阶段的帧耗时统计，单位为毫秒
+    同一阶段在一帧内可以计时多次（例如一帧补跑多个逻辑帧），end_frame时合计写入缓冲区
+    """
+    PHASES = ('frame', 'handle_events', 'update', 'ai', 'effects', 'broadcast', 'draw', 'fighter_draw', 'draw_ui', 'flip')
+
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        self.buffers = {name: RingBuffer(capacity) for name in self.PHASES}
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.phases = {name: _Phase(self, name) for name in self.PHASES}
+        self.frame_start = time.perf_counter()
+
+        # 叠加层显示的统计每隔若干帧才重新计算，避免排序本身拖慢帧率
+        self.overlay_interval = 15
+        self.overlay_lines = []
+        self.frames_since_overlay = self.overlay_interval
+        # 叠加层的数字不断变化，用单独的小缓存，不挤掉全局缓存里的界面文字
+        self.overlay_text = TextCache(max_size=len(self.PHASES) + 1)
+        # 叠加层所在区域的子Surface，屏幕和区域不变时只创建一次
+        self.overlay_surface = None
+        self.overlay_target = None
+
+    def phase(self, name):
+        return self.phases[name]
+
+    def add(self, name, seconds):
+        self.current[name] += seconds * 1000
+
+    def end_frame(self):
+        now = time.perf_counter()
+        self.current['frame'] = (now - self.frame_start) * 1000
+        self.frame_start = now
+        for name, value in self.current.items():
+            self.buffers[name].append(value)
+            self.current[name] = 0.0
+        self.frames_since_overlay += 1
+
+    def summary(self):
+        """各阶段的p50/p95/p99/平均/最大值（毫秒）"""
+        result = {}
+        for name, buffer in self.buffers.items():
+            values = buffer.values()
+            p50, p95, p99 = buffer.percentiles(50, 95, 99)
+            result[name] = {
+                'p50': p50, 'p95': p95, 'p99': p99,
+                'mean': sum(values) / len(values) if values else 0.0,
+                'max': max(values) if values else 0.0,
+            }
+        return result
+
+    def dump(self, path):
+        """按扩展名导出：.json为统计加原始数据，其余导出为逐帧CSV"""
+        if path.endswith('.json'):
+            data = {'summary': self.summary(),
+                    'samples': {name: buffer.values() for name, buffer in self.buffers.items()}}
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            return
+
+        columns = [self.buffers[name].values() for name in self.PHASES]
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(('frame_index',) + self.PHASES)
+            for index, row in enumerate(zip(*columns)):
+                writer.writerow((index,) + tuple(f"{value:.4f}" for value in row))
+
+    def draw_overlay(self, screen, font, rect):
+        """在rect区域内绘制各阶段分位数和最近帧耗时的折线图"""
+        if self.frames_since_overlay >= self.overlay_interval:
+            self.frames_since_overlay = 0
+            self.overlay_lines = []
+            for name in self.PHASES:
+                p50, p95, p99 = self.buffers[name].percentiles(50, 95, 99)
+                self.overlay_lines.append(f"{name:<14}{p50:6.2f}{p95:7.2f}{p99:7.2f}")
+
+        target = (screen, tuple(rect))
+        if self.overlay_target != target:
+            self.overlay_target = target
+            self.overlay_surface = screen.subsurface(rect)
+        overlay = self.overlay_surface
+        overlay.fill((0, 0, 0))
+        line_height = font.get_linesize()
+        render = self.overlay_text.render
+        overlay.blit(render(font, f"{'ms':<14}{'p50':>6}{'p95':>7}{'p99':>7}", (255, 255, 0)), (6, 4))
+        for i, line in enumerate(self.overlay_lines):
+            overlay.blit(render(font, line, (255, 255, 255)), (6, 4 + (i + 1) * line_height))
+
+        # 折线图：最近的帧耗时，虚线为16.6毫秒预算
+        graph_top = 8 + (len(self.overlay_lines) + 1) * line_height
+        graph_height = rect.height - graph_top - 6
+        values = self.buffers['frame'].values()[-(rect.width - 12):]
+        if graph_height > 10 and len(values) > 1:
+            scale = graph_height / max(33.3, max(values))
+            budget_y = graph_top + graph_height - 16.6 * scale
+            for x in range(6, rect.width - 6, 6):
+                pygame.draw.line(overlay, (255, 0, 0), (x, budget_y), (x + 3, budget_y))
+            points = [(6 + i, graph_top + graph_height - min(value * scale, graph_height))
+                      for i, value in enumerate(values)]
+            pygame.draw.lines(overlay, (0, 255, 0), False, points)
@@ -0,0 +1,428 @@
+"""
+北航自由搏击 - 对战服务器
+一个asyncio事件循环同时托管多个无界面房间，每个房间以60帧/秒用fight_core.step推进对战，
+收取各玩家每帧的输入，每帧把完整的MatchState快照发回客户端；游戏以--connect连接后只负责输入和绘制
+
+消息格式（小端）：长度u16 | 类型u8 | 内容
+  客户端 → 服务器  JOIN   模式u8 | AI难度u8 | 房间名（UTF-8）
+                   INPUT  输入掩码u8（fight_core.inputs_to_mask）
+  服务器 → 客户端  WELCOME 玩家位置u8（0为玩家1）| 种子u64
+                   STATE   MatchState.snapshot()
+
+用法：
+  python match_server.py --port 9700
+  python fighting_game.py --connect 127.0.0.1:9700 --room 比赛1
+  python match_server.py --load-test 50 100 200 --seconds 10     本地压力测试，找出单核能承载的房间数
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import socket
+import struct
+import time
+from collections import deque
+
+from fight_core import (FPS, ACTIONS, AIDifficulty, MatchState, create_ai_controller, step,
+                        inputs_to_mask, mask_to_inputs, virtual_keys_to_inputs)
+
+DEFAULT_PORT = 9700
+TICK_SECONDS = 1 / FPS
+MAX_BEHIND_TICKS = 5  # 落后超过这么多帧就不再追帧，直接从当前时间重新排程
+INPUT_BUFFER = 8  # 每名玩家最多缓存的未处理输入帧数，多出的丢弃最旧的
+WRITE_LIMIT = 64 * 1024  # 客户端积压的待发送字节超过该值时断开
+STEP_HISTORY = 600  # 每个房间保留最近多少帧的耗时用于计算p99
+
+MODE_PVP = 1  # 与fighting_game.GameMode的取值一致
+MODE_PVE = 2
+# 服务器上没有神经网络策略文件，人机房间只支持其余难度
+SERVER_DIFFICULTIES = frozenset(d.value for d in AIDifficulty if d != AIDifficulty.NEURAL)
+
+MSG_JOIN = 1
+MSG_INPUT = 2
+MSG_WELCOME = 3
+MSG_STATE = 4
+
+_LENGTH = struct.Struct('<H')
+_JOIN = struct.Struct('<BB')
+_WELCOME = struct.Struct('<BQ')
+
+# 只在按下的那一帧生效的动作，缓存的输入用完后重复上一帧时要去掉
+_EDGE_ACTIONS = ('attack', 'special', 'dash')
+HELD_MASK = inputs_to_mask({action: action not in _EDGE_ACTIONS for action in ACTIONS})
+
+def pack_message(kind, payload=b''):
+    return _LENGTH.pack(len(payload) + 1) + bytes((kind,)) + payload
+
+def split_messages(buffer):
+    """从缓冲区中取出完整的消息，返回[(类型, 内容)]并删除已取出的字节"""
+    messages = []
+    offset = 0
+    while len(buffer) - offset >= _LENGTH.size:
+        (length,) = _LENGTH.unpack_from(buffer, offset)
+        end = offset + _LENGTH.size + length
+        if end > len(buffer):
+            break
+        messages.append((buffer[offset + _LENGTH.size], bytes(buffer[offset + _LENGTH.size + 1:end])))
+        offset = end
+    del buffer[:offset]
+    return messages
+
+class Room:
+    """
+    一个房间内的一局对战：PVE只需要一名玩家（玩家2为AI），PVP等两名玩家都加入后开始
+    on_leave(room, slot)在房间自己断开某个玩家时调用，与玩家主动断开走同一条处理路径
+    """
+    def __init__(self, name, mode, difficulty, seed, on_leave):
+        self.name = name
+        self.mode = mode
+        self.seed = seed
+        self.state = MatchState()
+        self.players = [None, None]  # 各位置的StreamWriter
+        self.inputs = (deque(maxlen=INPUT_BUFFER), deque(maxlen=INPUT_BUFFER))
+        self.held = [0, 0]
+        self.ai = None
+        if mode == MODE_PVE:
+            self.ai = create_ai_controller(self.state.player2, AIDifficulty(difficulty), self.state.clock,
+                                           rng=random.Random(seed))
+        self.on_leave = on_leave
+        self.task = None
+        self.closed = False
+
+        # 排程统计：开始时间比预定时间晚一帧以上记为一次超时
+        self.ticks = 0
+        self.overruns = 0
+        self.max_late = 0.0
+        self.step_times = deque(maxlen=STEP_HISTORY)
+
+    @property
+    def ready(self):
+        if self.mode == MODE_PVE:
+            return self.players[0] is not None
+        return all(player is not None for player in self.players)
+
+    def free_slot(self):
+        slots = (0,) if self.mode == MODE_PVE else (0, 1)
+        for slot in slots:
+            if self.players[slot] is None:
+                return slot
+        return None
+
+    def next_mask(self, slot):
+        """取出该玩家下一帧的输入；没有新输入时沿用上一帧按住的键"""
+        queue = self.inputs[slot]
+        if queue:
+            mask = queue.popleft()
+            self.held[slot] = mask & HELD_MASK
+            return mask
+        return self.held[slot]
+
+    def tick(self):
+        """推进一帧并把快照发给房间内的玩家，返回对战是否结束"""
+        state = self.state
+        inputs_p1 = mask_to_inputs(self.next_mask(0))
+        if self.ai:
+            inputs_p2 = virtual_keys_to_inputs(self.ai.update(state.player1), state.player2.controls)
+        else:
+            inputs_p2 = mask_to_inputs(self.next_mask(1))
+        finished = step(state, inputs_p1, inputs_p2)
+
+        message = pack_message(MSG_STATE, state.snapshot())
+        for slot, writer in enumerate(self.players):
+            if writer is None:
+                continue
+            if writer.transport.get_write_buffer_size() > WRITE_LIMIT:
+                # 客户端读得太慢，断开它而不是让发送缓冲无限增长
+                writer.close()
+                self.on_leave(self, slot)
+                continue
+            writer.write(message)
+        return finished
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while not self.closed:
+            late = loop.time() - due
+            if late > TICK_SECONDS:
+                self.overruns += 1
+            self.max_late = max(self.max_late, late)
+
+            start = time.perf_counter()
+            finished = self.tick()
+            self.step_times.append(time.perf_counter() - start)
+            self.ticks += 1
+            if finished:
+                break
+
+            due += TICK_SECONDS
+            now = loop.time()
+            if now - due > MAX_BEHIND_TICKS * TICK_SECONDS:
+                due = now
+            await asyncio.sleep(max(0.0, due - now))
+        self.closed = True
+
+    def stats(self):
+        times = sorted(self.step_times)
+        p99 = times[int(len(times) * 0.99)] if times else 0.0
+        return {'room': self.name, 'ticks': self.ticks, 'overruns': self.overruns,
+                'max_late_ms': self.max_late * 1000, 'step_p99_ms': p99 * 1000}
+
+class MatchServer:
+    """托管全部房间；房间在对战结束或玩家全部离开时关闭，统计并入finished"""
+    def __init__(self, seed=None):
+        self.rooms = {}
+        self.finished = []
+        self.rng = random.Random(seed)
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        for room in list(self.rooms.values()):
+            self._close_room(room)
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def all_stats(self):
+        return self.finished + [room.stats() for room in self.rooms.values()]
+
+    def _join(self, writer, name, mode, difficulty):
+        room = self.rooms.get(name)
+        if room is None or room.closed:
+            room = Room(name, mode, difficulty, self.rng.getrandbits(64), self._leave)
+            self.rooms[name] = room
+        slot = room.free_slot()
+        if slot is None:
+            return None, None
+        room.players[slot] = writer
+        writer.write(pack_message(MSG_WELCOME, _WELCOME.pack(slot, room.seed)))
+        if room.ready and room.task is None:
+            room.task = asyncio.create_task(room.run())
+            room.task.add_done_callback(lambda _: self._close_room(room))
+        return room, slot
+
+    def _close_room(self, room):
+        room.closed = True
+        if self.rooms.get(room.name) is room:
+            del self.rooms[room.name]
+            self.finished.append(room.stats())
+
+    def _leave(self, room, slot):
+        room.players[slot] = None
+        if not any(room.players):
+            if room.task is None:
+                self._close_room(room)
+            room.closed = True
+
+    async def handle_client(self, reader, writer):
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        buffer = bytearray()
+        room = slot = None
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                buffer += data
+                for kind, payload in split_messages(buffer):
+                    if kind == MSG_INPUT and room is not None and not room.closed:
+                        if len(payload) != 1:
+                            return
+                        room.inputs[slot].append(payload[0])
+                    elif kind == MSG_JOIN:
+                        if len(payload) < _JOIN.size:
+                            return
+                        if room is not None and not room.closed:
+                            self._leave(room, slot)
+                        mode, difficulty = _JOIN.unpack_from(payload)
+                        if mode not in (MODE_PVE, MODE_PVP) or (mode == MODE_PVE and difficulty not in SERVER_DIFFICULTIES):
+                            return
+                        room, slot = self._join(writer, payload[_JOIN.size:].decode('utf-8'), mode, difficulty)
+                        if room is None:
+                            return  # 房间已满
+        except ConnectionError:
+            pass
+        except (struct.error, ValueError, IndexError) as e:
+            # 格式错误的消息只断开这一个客户端（房间名不是UTF-8时为UnicodeDecodeError）
+            print(f"断开发送了错误消息的客户端：{e!r}")
+        finally:
+            if room is not None and room.players[slot] is writer:
+                self._leave(room, slot)
+            writer.close()
+
+class MatchClient:
+    """
+    游戏一侧的同步客户端：非阻塞套接字，在游戏循环中每帧send_inputs一次、poll一次，
+    poll返回本次收到的最新快照（没有新快照时为None）
+    """
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+        self.slot = None
+        self.seed = None
+
+    def join(self, room, mode, difficulty=0, timeout=5.0):
+        """加入房间并等待服务器分配位置，返回(玩家位置, 种子)"""
+        self.slot = self.seed = None
+        self.sock.setblocking(True)
+        self.sock.sendall(pack_message(MSG_JOIN, _JOIN.pack(mode, difficulty) + room.encode('utf-8')))
+        self.sock.settimeout(timeout)
+        try:
+            while self.slot is None:
+                data = self.sock.recv(65536)
+                if not data:
+                    raise ConnectionError("服务器断开了连接（房间可能已满）")
+                self.buffer += data
+                for kind, payload in split_messages(self.buffer):
+                    if kind == MSG_WELCOME:
+                        self.slot, self.seed = _WELCOME.unpack(payload)
+        finally:
+            self.sock.setblocking(False)
+        return self.slot, self.seed
+
+    def send_inputs(self, inputs):
+        try:
+            self.sock.send(pack_message(MSG_INPUT, bytes((inputs_to_mask(inputs),))))
+        except BlockingIOError:
+            pass  # 发送缓冲区满时丢掉这一帧输入，服务器沿用上一帧按住的键
+
+    def poll(self):
+        latest = None
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            if not data:
+                raise ConnectionError("服务器断开了连接")
+            self.buffer += data
+        for kind, payload in split_messages(self.buffer):
+            if kind == MSG_STATE:
+                latest = payload
+        return latest
+
+    def close(self):
+        self.sock.close()
+
+async def _bot(host, port, room, mode, seed, deadline):
+    """模拟玩家：每收到一帧快照就回一帧随机输入，对战结束后重新加入同一房间"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    buffer = bytearray()
+    mask = 0
+    join = pack_message(MSG_JOIN, _JOIN.pack(mode, AIDifficulty.MEDIUM.value) + room.encode('utf-8'))
+    writer.write(join)
+    try:
+        while time.perf_counter() < deadline:
+            data = await reader.read(65536)
+            if not data:
+                break
+            buffer += data
+            for kind, payload in split_messages(buffer):
+                if kind != MSG_STATE:
+                    continue
+                if payload[8]:  # MatchState快照的finished标记
+                    writer.write(join)
+                    continue
+                if rng.random() < 0.1:
+                    mask = rng.getrandbits(len(ACTIONS))
+                writer.write(pack_message(MSG_INPUT, bytes((mask,))))
+    finally:
+        writer.close()
+
+def _run_bots(host, port, rooms, mode, seconds):
+    async def run_all():
+        deadline = time.perf_counter() + seconds
+        players = 1 if mode == MODE_PVE else 2
+        await asyncio.gather(*(_bot(host, port, f"load{i}", mode, i * 2 + p, deadline)
+                               for i in range(rooms) for p in range(players)))
+    asyncio.run(run_all())
+
+async def _load_level(rooms, mode, seconds):
+    server = MatchServer(seed=0)
+    host, port = await server.start(port=0)
+    context = multiprocessing.get_context('spawn')
+    bots = context.Process(target=_run_bots, args=(host, port, rooms, mode, seconds))
+    bots.start()
+    # 等所有房间都开始对战后再计时
+    while sum(room.task is not None for room in server.rooms.values()) < rooms and bots.is_alive():
+        await asyncio.sleep(0.05)
+    server.finished.clear()
+    for room in server.rooms.values():
+        room.ticks = room.overruns = 0
+        room.max_late = 0.0
+        room.step_times.clear()
+    await asyncio.sleep(seconds)
+    stats = server.all_stats()
+    await server.close()
+    await asyncio.get_running_loop().run_in_executor(None, bots.join)
+    return stats
+
+def load_test(levels, mode, seconds, max_overrun=0.01):
+    """依次以各房间数做压力测试，打印每档的超时情况，返回超时比例不超过max_overrun的最大房间数"""
+    sustained = 0
+    for rooms in levels:
+        stats = asyncio.run(_load_level(rooms, mode, seconds))
+        ticks = sum(s['ticks'] for s in stats)
+        overruns = sum(s['overruns'] for s in stats)
+        ratio = overruns / ticks if ticks else 1.0
+        worst = max(stats, key=lambda s: s['overruns'], default=None)
+        step_p99 = max((s['step_p99_ms'] for s in stats), default=0.0)
+        print(f"{rooms}个房间：{ticks}帧（{ticks / seconds:.0f}帧/秒，应为{rooms * FPS}），"
+              f"超时{overruns}帧（{ratio:.1%}），单帧耗时p99最大{step_p99:.3f}毫秒"
+              + (f"，最差房间{worst['room']}超时{worst['overruns']}帧、最多晚{worst['max_late_ms']:.1f}毫秒"
+                 if worst else ""))
+        if ratio <= max_overrun:
+            sustained = max(sustained, rooms)
+    return sustained
+
+async def serve(host, port, report_interval):
+    server = MatchServer()
+    address = await server.start(host, port)
+    print(f"对战服务器监听于{address[0]}:{address[1]}")
+    try:
+        while True:
+            await asyncio.sleep(report_interval)
+            stats = server.all_stats()
+            server.finished.clear()
+            overrun_rooms = [s for s in stats if s['overruns']]
+            print(f"房间{len(server.rooms)}个，本周期{sum(s['ticks'] for s in stats)}帧，"
+                  f"有超时的房间{len(overrun_rooms)}个")
+            for s in sorted(overrun_rooms, key=lambda s: -s['overruns'])[:10]:
+                print(f"  {s['room']}: 超时{s['overruns']}/{s['ticks']}帧，最多晚{s['max_late_ms']:.1f}毫秒，"
+                      f"单帧耗时p99 {s['step_p99_ms']:.3f}毫秒")
+            for room in server.rooms.values():
+                room.ticks = room.overruns = 0
+                room.max_late = 0.0
+    finally:
+        await server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="北航自由搏击对战服务器")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument('--report-interval', type=float, default=10.0, help="每隔多少秒打印各房间的超时统计")
+    parser.add_argument('--load-test', type=int, nargs='+', metavar='ROOMS', help="依次以这些房间数做本地压力测试")
+    parser.add_argument('--mode', choices=('pvp', 'pve'), default='pvp', help="压力测试的房间模式")
+    parser.add_argument('--seconds', type=float, default=10.0, help="压力测试每档的时长（秒）")
+    args = parser.parse_args()
+
+    if args.load_test:
+        mode = MODE_PVP if args.mode == 'pvp' else MODE_PVE
+        sustained = load_test(args.load_test, mode, args.seconds)
+        print(f"超时不超过1%的最大房间数：{sustained}")
+        return
+    try:
+        asyncio.run(serve(args.host, args.port, args.report_interval))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
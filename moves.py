@@ -0,0 +1,104 @@
+"""
+北航自由搏击 - 招式帧数据
+从moves.json读取各招式的起手/有效/收招帧数、每帧的攻击框和受击框、伤害与击晕时间，
+加载时编译成按帧展开的元组表（面向左右各一份），对战中只做查表和矩形相交判断
+
+数据格式：
+  body                     角色身体尺寸[宽, 高]，不出招时的受击框
+  moves.<招式名>:
+    startup/active/recovery  起手、有效、收招帧数，三者之和为出招的总帧数
+    hitboxes                 有效帧的攻击框[dx, dy, 宽, 高]，相对角色左上角、面向右，
+                             只写一个时所有有效帧共用
+    hurtboxes                出招期间每帧的受击框，只写一个时所有帧共用
+    damage/block_damage      命中/被防御时的伤害（之后再减去防御力）
+    combo_bonus              未被防御时每段连击追加的伤害
+    stun                     未被防御时的击晕帧数
+    energy_gain              命中后获得的特殊能量
+    whiff                    false表示只有首个有效帧能打中时才会出招（不会挥空）
+"""
+
+import json
+import os
+
+DEFAULT_MOVES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'moves.json')
+
+class MoveError(Exception):
+    """招式数据不合法"""
+
+def mirror_box(box, body_width):
+    """面向右的框换算成面向左"""
+    dx, dy, width, height = box
+    return (body_width - dx - width, dy, width, height)
+
+def _expand(boxes, count, name, field):
+    """一个框表示所有帧共用，否则数量必须与帧数一致"""
+    boxes = [tuple(box) for box in boxes]
+    if any(len(box) != 4 for box in boxes):
+        raise MoveError(f"{name}.{field}中的框应为[dx, dy, 宽, 高]")
+    if len(boxes) == 1:
+        return boxes * count
+    if len(boxes) != count:
+        raise MoveError(f"{name}.{field}需要1个或{count}个框，实际为{len(boxes)}个")
+    return boxes
+
+class Move:
+    """
+    编译后的招式，hitboxes/hurtboxes按[是否面向右][帧]查表，
+    非有效帧的攻击框为None
+    """
+    __slots__ = ('name', 'index', 'startup', 'active', 'recovery', 'total',
+                 'damage', 'block_damage', 'combo_bonus', 'stun', 'energy_gain', 'whiff',
+                 'hitboxes', 'hurtboxes', 'reach')
+
+    def __init__(self, name, index, data, body_width):
+        try:
+            self.startup = int(data['startup'])
+            self.active = int(data['active'])
+            self.recovery = int(data['recovery'])
+            self.damage = int(data['damage'])
+            self.block_damage = int(data.get('block_damage', data['damage']))
+            self.combo_bonus = int(data.get('combo_bonus', 0))
+            self.stun = int(data.get('stun', 0))
+            self.energy_gain = int(data.get('energy_gain', 0))
+            self.whiff = bool(data.get('whiff', True))
+            hitboxes = data['hitboxes']
+            hurtboxes = data['hurtboxes']
+        except KeyError as e:
+            raise MoveError(f"招式{name}缺少字段{e}") from None
+        if self.startup < 0 or self.active < 1 or self.recovery < 0:
+            raise MoveError(f"招式{name}的帧数不合法")
+
+        self.name = name
+        self.index = index
+        self.total = self.startup + self.active + self.recovery
+
+        active = _expand(hitboxes, self.active, name, 'hitboxes')
+        right = [None] * self.startup + active + [None] * self.recovery
+        left = [None if box is None else mirror_box(box, body_width) for box in right]
+        self.hitboxes = (tuple(left), tuple(right))
+
+        hurt_right = _expand(hurtboxes, self.total, name, 'hurtboxes')
+        hurt_left = [mirror_box(box, body_width) for box in hurt_right]
+        self.hurtboxes = (tuple(hurt_left), tuple(hurt_right))
+
+        # 能打到与身体同宽的受击框的最大水平距离（角色x坐标之差），用于范围查询
+        self.reach = max(max(abs(dx - body_width), abs(dx + width)) for dx, _, width, _ in active)
+
+class MoveSet:
+    """全部招式和身体尺寸"""
+    def __init__(self, data):
+        try:
+            self.body_width, self.body_height = (int(v) for v in data['body'])
+            moves = data['moves']
+        except (KeyError, TypeError, ValueError):
+            raise MoveError("招式数据缺少body或moves") from None
+        self.body_box = (0, 0, self.body_width, self.body_height)
+        self.by_index = [Move(name, i, move, self.body_width) for i, (name, move) in enumerate(moves.items())]
+        self.moves = {move.name: move for move in self.by_index}
+
+    def __getitem__(self, name):
+        return self.moves[name]
+
+def load_moves(path=DEFAULT_MOVES_PATH):
+    with open(path, encoding='utf-8') as f:
+        return MoveSet(json.load(f))
@@ -0,0 +1,281 @@
+"""
+北航自由搏击 - 神经网络AI
+从.npz文件加载小型多层感知机策略，只用NumPy推理；
+观测布局与training_env.VectorFightEnv一致，输出ENV_ACTIONS中的动作，
+再换成与AIController._execute_action相同的虚拟按键
+
+.npz格式：w0, b0, w1, b1, ...为各层权重（输入维×输出维）和偏置，
+可选activation（'tanh'或'relu'），最后一层输出len(ENV_ACTIONS)个动作分数
+
+用法：
+  python neural_policy.py --init policy.npz            生成随机初始化的策略
+  python neural_policy.py --policy policy.npz --bots 500   测量批量推理的每帧延迟
+  python neural_policy.py --policy policy.npz --check-worker   检查后台AI与主循环中的AI做出相同决策，且后台慢时不会停顿
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from fight_core import FPS, GROUND_Y, MATCH_DURATION, AIDifficulty, AIController, MatchState
+from training_env import ENV_ACTIONS, OBS_SIZE, observe
+
+_ACTIVATIONS = {
+    'tanh': np.tanh,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+}
+
+class MLPPolicy:
+    """多层感知机策略，act_batch对整批观测只做每层一次矩阵乘法"""
+    def __init__(self, weights, biases, activation='tanh'):
+        if activation not in _ACTIVATIONS:
+            raise ValueError(f"不支持的激活函数：{activation}")
+        if weights[0].shape[0] != OBS_SIZE or weights[-1].shape[1] != len(ENV_ACTIONS):
+            raise ValueError(f"策略输入输出应为{OBS_SIZE}/{len(ENV_ACTIONS)}维，"
+                             f"实际为{weights[0].shape[0]}/{weights[-1].shape[1]}维")
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        self._activate = _ACTIVATIONS[activation]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            layers = sum(1 for key in data.files if key.startswith('w'))
+            weights = [data[f'w{i}'] for i in range(layers)]
+            biases = [data[f'b{i}'] for i in range(layers)]
+            activation = str(data['activation']) if 'activation' in data.files else 'tanh'
+        return cls(weights, biases, activation)
+
+    @classmethod
+    def random(cls, hidden=(64, 64), seed=0, activation='tanh'):
+        """随机初始化的策略，用于测试和作为训练起点"""
+        rng = np.random.default_rng(seed)
+        sizes = (OBS_SIZE,) + tuple(hidden) + (len(ENV_ACTIONS),)
+        weights = [rng.normal(0, 1 / np.sqrt(n_in), (n_in, n_out)) for n_in, n_out in zip(sizes, sizes[1:])]
+        biases = [np.zeros(n_out) for n_out in sizes[1:]]
+        return cls(weights, biases, activation)
+
+    def save(self, path):
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'w{i}'] = w
+            arrays[f'b{i}'] = b
+        np.savez(path, activation=np.array(self.activation), **arrays)
+
+    def act_batch(self, observations):
+        """observations为(N, OBS_SIZE)的float32数组，返回每行分数最高的动作下标"""
+        hidden = observations
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            hidden = hidden @ w
+            hidden += b
+            if i < last:
+                hidden = self._activate(hidden)
+        return hidden.argmax(axis=1)
+
+# 同一文件只加载一次，循环赛等场景中每局新建控制器也不会重复读文件
+_policy_cache = {}
+
+def load_policy(path):
+    policy = _policy_cache.get(path)
+    if policy is None:
+        policy = _policy_cache[path] = MLPPolicy.load(path)
+    return policy
+
+class NeuralAIController(AIController):
+    """
+    由神经网络策略控制的AI，每帧都重新决策
+    多个控制器可以用update_batch一起推理，只做一次批量矩阵乘法
+    """
+    def __init__(self, fighter, difficulty=AIDifficulty.NEURAL, clock=None, rng=None,
+                 policy=None, ground_y=GROUND_Y):
+        super().__init__(fighter, difficulty, clock, rng)
+        if policy is None:
+            raise ValueError("神经网络AI需要指定策略文件")
+        # self.policy是父类的策略表，网络另存一个属性
+        self.network = load_policy(policy) if isinstance(policy, str) else policy
+        self.ground_y = ground_y
+        self.inference_seconds = 0.0
+        self.inferences = 0
+
+    def update(self, target):
+        return update_batch([self], [target])[0]
+
+    def _make_decision(self):
+        """单独推理一次；后台AI（ai_worker）在影子角色上通过这里决策"""
+        if not self.target:
+            return
+        decide_batch([self], [self.target])
+
+def decide_batch(controllers, targets):
+    """
+    一次推理多个神经网络AI（需共用同一个网络），设置各自的current_action和action_timer
+    推理耗时平均分摊到每个控制器的统计中
+    """
+    count = len(controllers)
+    observations = np.empty((count, OBS_SIZE), dtype=np.float32)
+    for row, (controller, target) in enumerate(zip(controllers, targets)):
+        controller.target = target
+        observe(controller.fighter, target, controller.clock.ticks, controller.ground_y, observations[row])
+
+    start = time.perf_counter()
+    actions = controllers[0].network.act_batch(observations)
+    share = (time.perf_counter() - start) / count
+
+    for controller, action in zip(controllers, actions):
+        controller.current_action = ENV_ACTIONS[action]
+        controller.action_timer = 1
+        controller.inference_seconds += share
+        controller.inferences += 1
+
+def update_batch(controllers, targets):
+    """一次推理多个神经网络AI并返回各自的虚拟按键"""
+    decide_batch(controllers, targets)
+    return [controller._execute_action() for controller in controllers]
+
+def check_worker(path, mode, samples=200, seed=0):
+    """
+    在随机局面上比较后台AI与主循环中的AI的决策，返回不一致的次数
+    两边使用同一个策略文件，后台只收到双方角色的快照
+    """
+    from ai_worker import AIWorker
+
+    rng = random.Random(seed)
+    state = MatchState()
+    local = NeuralAIController(state.player2, clock=state.clock, policy=path)
+    local.target = state.player1
+    worker = AIWorker(mode, policy=path)
+    worker.reset(AIDifficulty.NEURAL, seed)
+    mismatches = 0
+    try:
+        for _ in range(samples):
+            for fighter in (state.player1, state.player2):
+                fighter.x = rng.uniform(0, 900)
+                fighter.health = rng.randint(1, fighter.max_health)
+                fighter.special_energy = rng.randint(0, fighter.max_special_energy)
+                fighter.facing_right = rng.random() < 0.5
+            state.clock.ticks = rng.randrange(MATCH_DURATION * FPS)
+            local._make_decision()
+            worker.request(state.player2, state.player1, state.clock.ticks)
+            decision = None
+            while decision is None:
+                decision = worker.poll()
+            if decision != (local.current_action, local.action_timer):
+                mismatches += 1
+    finally:
+        worker.close()
+    return mismatches
+
+class _DelayedWorker:
+    """包装AIWorker，把每个决策再推迟delay帧交出，模拟比一帧更慢的后台"""
+    def __init__(self, worker, delay):
+        self.worker = worker
+        self.delay = delay
+        self.ready = None  # 已经算好但还没交出的决策
+        self.wait = 0
+
+    @property
+    def pending(self):
+        return self.worker.pending if self.ready is None else self.ready
+
+    def reset(self, difficulty, seed):
+        self.ready = None
+        self.worker.reset(difficulty, seed)
+
+    def request(self, fighter, target, ticks):
+        if self.ready is not None:
+            return False
+        return self.worker.request(fighter, target, ticks)
+
+    def poll(self):
+        if self.ready is None:
+            self.ready = self.worker.poll()
+            self.wait = self.delay
+            if self.ready is None:
+                return None
+        if self.wait > 0:
+            self.wait -= 1
+            return None
+        decision, self.ready = self.ready, None
+        return decision
+
+def check_worker_delay(path, mode, delay=3, frames=300, seed=0):
+    """
+    后台决策晚到delay帧时逐帧运行AsyncAIController，返回拿到第一个决策之后没有任何动作的帧数
+    结果返回之前应当一直执行上一个动作，正确时为0
+    """
+    from ai_worker import AIWorker, AsyncAIController
+
+    state = MatchState()
+    worker = AIWorker(mode, policy=path)
+    controller = AsyncAIController(state.player2, AIDifficulty.NEURAL, _DelayedWorker(worker, delay),
+                                   clock=state.clock, seed=seed)
+    started = False
+    idle_frames = 0
+    try:
+        for _ in range(frames):
+            state.clock.advance()
+            keys = controller.update(state.player1)
+            if keys:
+                started = True
+            elif started:
+                idle_frames += 1
+            # 等真实的后台结果返回，延迟只由delay决定
+            while worker.pending is not None and worker.results.empty():
+                time.sleep(0.0001)
+    finally:
+        worker.close()
+    return idle_frames
+
+def main():
+    parser = argparse.ArgumentParser(description="神经网络AI策略工具")
+    parser.add_argument('--init', help="生成随机初始化的策略文件")
+    parser.add_argument('--hidden', type=int, nargs='+', default=[64, 64], help="隐藏层宽度")
+    parser.add_argument('--policy', help="测量该策略的推理延迟")
+    parser.add_argument('--bots', type=int, default=500, help="同时推理的AI数量")
+    parser.add_argument('--frames', type=int, default=600, help="测量的帧数")
+    parser.add_argument('--check-worker', action='store_true', help="检查线程/进程中的后台AI与主循环中的AI决策一致")
+    args = parser.parse_args()
+
+    if args.init:
+        MLPPolicy.random(tuple(args.hidden)).save(args.init)
+        print(f"已生成策略{args.init}（隐藏层{args.hidden}）")
+    if not args.policy:
+        return
+    if args.check_worker:
+        samples = 200
+        for mode in ('thread', 'process'):
+            mismatches = check_worker(args.policy, mode, samples)
+            print(f"后台AI（{mode}）：{samples}个随机局面中{mismatches}个决策与主循环不一致")
+            idle_frames = check_worker_delay(args.policy, mode)
+            print(f"后台AI（{mode}）：决策晚到3帧时，{idle_frames}帧没有执行任何动作")
+        return
+
+    policy = load_policy(args.policy)
+    matches = [MatchState() for _ in range(args.bots)]
+    controllers = [NeuralAIController(state.player2, clock=state.clock, policy=policy) for state in matches]
+    targets = [state.player1 for state in matches]
+
+    batched = []
+    single = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        update_batch(controllers, targets)
+        batched.append(time.perf_counter() - start)
+    for _ in range(max(1, args.frames // 10)):
+        start = time.perf_counter()
+        for controller, target in zip(controllers, targets):
+            controller.update(target)
+        single.append(time.perf_counter() - start)
+
+    batched.sort()
+    single.sort()
+    print(f"{args.bots}个AI每帧推理：批量 p50 {batched[len(batched) // 2] * 1000:.3f}ms "
+          f"p99 {batched[int(len(batched) * 0.99)] * 1000:.3f}ms；"
+          f"逐个推理 p50 {single[len(single) // 2] * 1000:.3f}ms")
+
+if __name__ == "__main__":
+    main()
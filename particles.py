@@ -0,0 +1,170 @@
+"""
+北航自由搏击 - 粒子特效
+命中火花、防御闪光、击晕星星和闪现残影；全部粒子的位置、速度、寿命和颜色
+存放在预先分配好的NumPy数组里，每帧用一次向量化运算更新，绘制时一次性批量写入屏幕像素，
+粒子数量超过容量上限时新粒子被丢弃，特效开销不会随战斗规模无限增长
+"""
+
+import numpy as np
+import pygame
+
+from fight_core import EVENT_HIT, EVENT_BLOCK, EVENT_STUN, EVENT_DASH
+
+DEFAULT_CAPACITY = 1024  # 满载时更新+绘制约0.5毫秒
+GRAVITY = 0.3
+MAX_SIZE = 3
+
+# 粒子颜色表，粒子只记录颜色编号，绘制时按屏幕像素格式一次换算
+PALETTE = ((255, 255, 120), (255, 170, 0), (255, 255, 255), (120, 200, 255), (255, 255, 0), (200, 220, 255))
+
+# 各事件生成的粒子：数量、速度范围、寿命范围（帧）、重力系数、初始边长、颜色编号
+_EFFECTS = {
+    EVENT_HIT: (14, (2.0, 6.0), (12, 22), 1.0, 3, (0, 1, 2)),
+    EVENT_BLOCK: (12, (1.5, 4.0), (8, 14), 0.0, 3, (3, 2)),
+    EVENT_STUN: (8, (0.3, 0.8), (40, 60), -0.05, 3, (4, 0)),
+    EVENT_DASH: (24, (0.0, 0.4), (8, 16), 0.0, 3, (2, 5)),
+}
+
+# 方块内各像素相对左上角的偏移，以及该像素在边长至少为多少时才画出
+_OFFSET_X, _OFFSET_Y = (a.ravel() for a in np.indices((MAX_SIZE, MAX_SIZE)))
+_OFFSET_RING = np.maximum(_OFFSET_X, _OFFSET_Y)
+
+class ParticleSystem:
+    """
+    固定容量的粒子池，活着的粒子紧密排在数组前count个位置
+    spawn_events把fight_core的战斗事件换成粒子，update推进一帧，draw批量绘制
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, seed=None):
+        self.capacity = capacity
+        self.count = 0
+        self.dropped = 0  # 因容量不足没有生成的粒子数
+        self.rng = np.random.default_rng(seed)
+
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.gravity = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.int16)
+        self.max_life = np.ones(capacity, dtype=np.int16)
+        self.size = np.zeros(capacity, dtype=np.int8)
+        self.color = np.zeros(capacity, dtype=np.uint8)
+        self._mapped = None  # (屏幕像素格式, 换算后的颜色表)
+
+    def clear(self):
+        self.count = 0
+
+    def spawn_events(self, events):
+        """按战斗事件生成粒子，events为fight_core中角色追加的(事件, x, y, 参数)"""
+        for kind, x, y, param in events:
+            if kind == EVENT_DASH:
+                self.spawn_trail(kind, x, y, param)
+            else:
+                self.spawn_burst(kind, x, y, param)
+
+    def _reserve(self, count):
+        """为count个新粒子分配位置，返回切片；容量不足时只分配剩余部分"""
+        start = self.count
+        allowed = min(count, self.capacity - start)
+        self.dropped += count - allowed
+        self.count = start + allowed
+        return slice(start, start + allowed), allowed
+
+    def _fill(self, rows, count, kind):
+        _, (speed_low, speed_high), (life_low, life_high), gravity, size, colors = _EFFECTS[kind]
+        rng = self.rng
+        self.life[rows] = self.max_life[rows] = rng.integers(life_low, life_high + 1, count)
+        self.gravity[rows] = gravity * GRAVITY
+        self.size[rows] = size
+        self.color[rows] = np.array(colors, dtype=np.uint8)[rng.integers(0, len(colors), count)]
+        return rng.uniform(speed_low, speed_high, count)
+
+    def spawn_burst(self, kind, x, y, param):
+        """从一点向外喷出的粒子；命中火花偏向攻击方向，击晕星星向上飘"""
+        rows, count = self._reserve(_EFFECTS[kind][0])
+        if not count:
+            return
+        speed = self._fill(rows, count, kind)
+        rng = self.rng
+        if kind == EVENT_HIT:
+            angle = rng.normal(0.0, 0.6, count) + (0.0 if param > 0 else np.pi)
+        elif kind == EVENT_STUN:
+            angle = rng.uniform(-np.pi * 0.9, -np.pi * 0.1, count)
+        else:
+            angle = rng.uniform(0.0, 2 * np.pi, count)
+        self.x[rows] = x
+        self.y[rows] = y
+        self.vx[rows] = np.cos(angle) * speed
+        self.vy[rows] = np.sin(angle) * speed
+
+    def spawn_trail(self, kind, x, y, distance):
+        """沿闪现路径均匀铺开、几乎不动的残影"""
+        rows, count = self._reserve(_EFFECTS[kind][0])
+        if not count:
+            return
+        speed = self._fill(rows, count, kind)
+        rng = self.rng
+        self.x[rows] = x + distance * np.linspace(0.0, 1.0, count) + rng.normal(0.0, 4.0, count)
+        self.y[rows] = y + rng.uniform(-35.0, 35.0, count)
+        self.vx[rows] = -np.sign(distance) * speed
+        self.vy[rows] = 0.0
+
+    def update(self):
+        """所有粒子推进一帧，寿命耗尽的粒子移除，剩下的重新紧密排列"""
+        n = self.count
+        if not n:
+            return
+        self.vy[:n] += self.gravity[:n]
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.life[:n] -= 1
+
+        alive = self.life[:n] > 0
+        remaining = int(np.count_nonzero(alive))
+        if remaining < n:
+            for array in (self.x, self.y, self.vx, self.vy, self.gravity, self.life, self.max_life,
+                          self.size, self.color):
+                array[:remaining] = array[:n][alive]
+        self.count = remaining
+
+    def _mapped_palette(self, screen):
+        key = (screen.get_bitsize(), screen.get_masks())
+        if self._mapped is None or self._mapped[0] != key:
+            self._mapped = (key, np.array([screen.map_rgb(color) for color in PALETTE], dtype=np.uint32))
+        return self._mapped[1]
+
+    def draw(self, screen):
+        """
+        每个粒子画成随寿命缩小的方块：全部粒子的全部像素先算出坐标，
+        再用一次NumPy赋值写进屏幕像素，没有逐粒子的Python循环
+        """
+        n = self.count
+        if not n:
+            return
+        width, height = screen.get_size()
+        # 边长按剩余寿命从初始值缩小到1
+        size = np.ceil(self.size[:n] * (self.life[:n] / self.max_life[:n]))
+        px = self.x[:n, None].astype(np.intp) + _OFFSET_X
+        py = self.y[:n, None].astype(np.intp) + _OFFSET_Y
+        # 负坐标转成无符号后变成极大值，一次比较同时裁掉屏幕两侧
+        visible = ((_OFFSET_RING < size[:, None]) & (px.view(np.uintp) < width)
+                   & (py.view(np.uintp) < height))
+        colors = self._mapped_palette(screen)[self.color[:n]]
+
+        pixels = pygame.surfarray.pixels2d(screen)
+        try:
+            pixels[px[visible], py[visible]] = np.broadcast_to(colors[:, None], visible.shape)[visible]
+        finally:
+            # 释放对屏幕像素的引用，屏幕才能解锁继续blit
+            del pixels
+
+    def get_draw_rect(self):
+        """当前全部粒子所在的屏幕区域，没有粒子时返回None；局部刷新模式用它擦除和提交"""
+        n = self.count
+        if not n:
+            return None
+        left = int(self.x[:n].min())
+        top = int(self.y[:n].min())
+        right = int(self.x[:n].max()) + int(self.size[:n].max())
+        bottom = int(self.y[:n].max()) + int(self.size[:n].max())
+        return pygame.Rect(left, top, right - left + 1, bottom - top + 1)
@@ -0,0 +1,136 @@
+"""
+北航自由搏击 - 渲染缓存
+字体对象按(路径, 字号)全局缓存，渲染好的文字Surface按(字体, 文字, 颜色)做LRU缓存，
+纯色/半透明的Surface按(尺寸, 颜色, 透明度)放进Surface池，绘制时只blit不新建
+"""
+
+import os
+from collections import OrderedDict
+
+import pygame
+
+# Windows系统中文字体路径
+FONT_PATHS = [
+    "C:/Windows/Fonts/msyh.ttc",      # 微软雅黑
+    "C:/Windows/Fonts/simhei.ttf",   # 黑体
+    "C:/Windows/Fonts/simsun.ttc",   # 宋体
+    "C:/Windows/Fonts/simkai.ttf",   # 楷体
+]
+
+_font_cache = {}
+_font_path = False  # False表示尚未探测，None表示没有可用的中文字体
+
+def _find_font_path():
+    """只在第一次调用时探测字体文件，之后直接返回结果"""
+    global _font_path
+    if _font_path is False:
+        _font_path = None
+        for font_path in FONT_PATHS:
+            if os.path.exists(font_path):
+                try:
+                    pygame.font.Font(font_path, 12)
+                except Exception:
+                    continue
+                _font_path = font_path
+                break
+    return _font_path
+
+def get_font(path, size):
+    """按(路径, 字号)缓存的字体对象，path为None时使用pygame默认字体"""
+    key = (path, size)
+    font = _font_cache.get(key)
+    if font is None:
+        try:
+            font = pygame.font.Font(path, size)
+        except Exception:
+            font = pygame.font.Font(pygame.font.get_default_font(), size)
+        _font_cache[key] = font
+    return font
+
+def get_chinese_font(size):
+    """获取支持中文的字体"""
+    return get_font(_find_font_path(), size)
+
+class TextCache:
+    """渲染好的文字Surface的LRU缓存，记录命中和未命中次数"""
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.surfaces),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+# 进程内共享的文字缓存
+text_cache = TextCache()
+
+def render_text(font, text, color):
+    """渲染抗锯齿文字，结果来自全局LRU缓存"""
+    return text_cache.render(font, text, color)
+
+class SurfacePool:
+    """
+    预先填充好颜色和透明度的Surface池，同样的(尺寸, 颜色, 透明度)只创建一次
+    created记录新建的Surface数量，稳定运行后应当不再增长
+    """
+    def __init__(self):
+        self.surfaces = {}
+        self.hits = 0
+        self.created = 0
+
+    def filled(self, size, color, alpha=None):
+        key = (size, color, alpha)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.created += 1
+        surface = pygame.Surface(size)
+        if alpha is not None:
+            surface.set_alpha(alpha)
+        surface.fill(color)
+        self.surfaces[key] = surface
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.created = 0
+
+    def stats(self):
+        return {'size': len(self.surfaces), 'hits': self.hits, 'created': self.created}
+
+# 进程内共享的Surface池
+surface_pool = SurfacePool()
+
+def get_filled_surface(size, color, alpha=None):
+    """纯色Surface，alpha不为None时整体半透明，结果来自全局Surface池"""
+    return surface_pool.filled(size, color, alpha)
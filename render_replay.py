@@ -0,0 +1,141 @@
+"""
+北航自由搏击 - 录像离线渲染
+在SDL_VIDEODRIVER=dummy下用Game.draw把录像逐帧画到屏幕外，把时间轴切成若干段交给进程池并行渲染，
+按帧顺序输出PNG序列或原始RGB帧（写入文件或管道），用于批量制作比赛集锦
+
+用法：
+  python render_replay.py replays/xxx.bkr --png frames/
+  python render_replay.py replays/xxx.bkr --start 30 --end 45 --raw - | \\
+      ffmpeg -f rawvideo -pix_fmt rgb24 -s 1024x768 -r 60 -i - clip.mp4
+"""
+
+import os
+
+# 必须在导入pygame之前设置：工作进程不打开窗口，pygame的欢迎信息不能混进输出到管道的帧数据
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+# SDL默认会接管SIGINT/SIGTERM，工作进程装上它的处理函数后进程池就无法结束它们
+os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+
+import numpy as np
+import pygame
+
+from fight_core import FPS, SCREEN_WIDTH, SCREEN_HEIGHT
+from replay import ReplayPlayer
+
+DEFAULT_CHUNK_TICKS = 300  # 每段5秒
+# 每段开始前先不绘制地推进的帧数，不短于粒子的最长寿命，段首的特效与连续渲染时一样完整
+PREROLL_TICKS = 60
+
+# 工作进程中的游戏实例，每个进程只创建一次
+_game = None
+
+def _init_worker():
+    global _game
+    import fighting_game
+    _game = fighting_game.Game()
+    # 进程池的工作进程退出时不执行atexit，用multiprocessing的终结器关闭pygame
+    Finalize(_game, pygame.quit, exitpriority=10)
+
+def _advance(game, tick):
+    """推进一帧；粒子的随机数只由录像种子和帧号决定，无论怎样分段，同一帧画出的画面都相同"""
+    game.particles.rng = np.random.default_rng((game.match_seed, tick))
+    game.update()
+
+def render_chunk(task):
+    """
+    渲染[start, end)帧：从不晚于start - PREROLL_TICKS的关键帧恢复后推进到段首，再逐帧update + draw
+    png_dir不为空时每帧存为frame_<帧号>.png，否则把原始RGB帧写进raw_path；返回实际渲染的帧数
+    """
+    path, start, end, png_dir, raw_path = task
+    game = _game
+    game.start_replay(path)
+    replay = game.replay
+    replay.seek(max(0, start - PREROLL_TICKS))
+    for tick in range(replay.position, start):
+        _advance(game, tick)
+
+    rendered = 0
+    raw = open(raw_path, 'wb') if raw_path else None
+    try:
+        for tick in range(start, end):
+            _advance(game, tick)
+            game.draw()
+            if png_dir:
+                pygame.image.save(game.screen, os.path.join(png_dir, f"frame_{tick:06d}.png"))
+            else:
+                raw.write(pygame.image.tostring(game.screen, 'RGB'))
+            rendered += 1
+    finally:
+        if raw:
+            raw.close()
+    return rendered
+
+def split_chunks(start, end, chunk_ticks):
+    return [(tick, min(tick + chunk_ticks, end)) for tick in range(start, end, chunk_ticks)]
+
+def main():
+    parser = argparse.ArgumentParser(description="把录像并行渲染成帧序列")
+    parser.add_argument('path', help="录像文件")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--png', metavar='DIR', help="输出PNG序列到该目录")
+    output.add_argument('--raw', metavar='PATH', help="按顺序输出原始RGB24帧到该文件，-表示标准输出")
+    parser.add_argument('--start', type=float, default=0.0, help="起始秒数")
+    parser.add_argument('--end', type=float, help="结束秒数，默认到录像结束")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="进程数，默认使用全部CPU核心")
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK_TICKS, help="每段帧数")
+    args = parser.parse_args()
+
+    length = ReplayPlayer(args.path).length
+    start = max(0, min(int(args.start * FPS), length))
+    end = length if args.end is None else max(start, min(int(args.end * FPS), length))
+    chunks = split_chunks(start, end, max(1, args.chunk))
+
+    # 原始帧先由各进程写进临时文件，再按段的顺序拼接，内存中最多只有一段在传输
+    temp_dir = None
+    if args.png:
+        os.makedirs(args.png, exist_ok=True)
+        tasks = [(args.path, a, b, args.png, None) for a, b in chunks]
+    else:
+        temp_dir = tempfile.mkdtemp(prefix='bkr_frames_')
+        tasks = [(args.path, a, b, None, os.path.join(temp_dir, f"{i:05d}.rgb")) for i, (a, b) in enumerate(chunks)]
+    out = None
+    if args.raw:
+        out = sys.stdout.buffer if args.raw == '-' else open(args.raw, 'wb')
+
+    started = time.perf_counter()
+    frames = 0
+    try:
+        with Pool(args.workers, initializer=_init_worker) as pool:
+            for task, count in zip(tasks, pool.imap(render_chunk, tasks)):
+                frames += count
+                if out:
+                    with open(task[4], 'rb') as f:
+                        shutil.copyfileobj(f, out)
+                    os.remove(task[4])
+            # 正常结束时等工作进程自己退出，不依赖terminate()
+            pool.close()
+            pool.join()
+    finally:
+        if out and out is not sys.stdout.buffer:
+            out.close()
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+
+    # 输出原始帧到管道时统计信息不能混进标准输出
+    print(f"渲染{frames}帧（{frames / FPS:.1f}秒，{SCREEN_WIDTH}x{SCREEN_HEIGHT}），分{len(chunks)}段，"
+          f"{args.workers}个进程，用时{elapsed:.2f}秒（{frames / elapsed:.0f}帧/秒，"
+          f"实时的{frames / FPS / elapsed:.1f}倍）", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+北航自由搏击 - 对战录像
+逐帧记录双方输入（每名玩家一个字节的按键位掩码）和随机种子，定期写入状态关键帧，
+回放时把输入重新送进fight_core.step，可以无界面快进，也可以借助关键帧跳转
+
+文件格式（小端）：
+  文件头  b'BKRP' | 版本u8 | 模式u8 | AI难度u8 | 保留u8 | 种子u64 | FPS u16 | 关键帧间隔u16
+  输入段  玩家1掩码u8 | 玩家2掩码u8 | 连续帧数u8，相同输入连续出现时合并为一段
+  关键帧  0xFF | 数据长度u16 | MatchState.snapshot()
+"""
+
+import argparse
+import struct
+import time
+
+from fight_core import FPS, MatchState, step, inputs_to_mask, mask_to_inputs
+
+MAGIC = b'BKRP'
+VERSION = 3  # 3：角色快照加入招式编号和命中标记
+KEYFRAME_MARK = 0xFF
+DEFAULT_KEYFRAME_INTERVAL = 600  # 每10秒一个关键帧
+MAX_RUN = 255
+
+_HEADER = struct.Struct('<4sBBBBQHH')
+_KEYFRAME_LENGTH = struct.Struct('<H')
+
+class ReplayError(Exception):
+    """录像文件损坏或格式不支持"""
+
+class ReplayRecorder:
+    """把对战输入流式写入录像文件，需在每次step之前调用record"""
+    def __init__(self, path, state, seed=0, mode=0, difficulty=0,
+                 keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.state = state
+        self.keyframe_interval = keyframe_interval
+        self.file = open(path, 'wb')
+        self.file.write(_HEADER.pack(MAGIC, VERSION, mode, difficulty, 0, seed, FPS, keyframe_interval))
+        self.run_masks = None
+        self.run_length = 0
+
+    def record(self, inputs_p1, inputs_p2):
+        if self.state.tick % self.keyframe_interval == 0:
+            self._flush_run()
+            blob = self.state.snapshot()
+            self.file.write(bytes([KEYFRAME_MARK]) + _KEYFRAME_LENGTH.pack(len(blob)) + blob)
+
+        masks = (inputs_to_mask(inputs_p1), inputs_to_mask(inputs_p2))
+        if masks == self.run_masks and self.run_length < MAX_RUN:
+            self.run_length += 1
+        else:
+            self._flush_run()
+            self.run_masks = masks
+            self.run_length = 1
+
+    def _flush_run(self):
+        if self.run_length:
+            self.file.write(bytes((self.run_masks[0], self.run_masks[1], self.run_length)))
+            self.run_masks = None
+            self.run_length = 0
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._flush_run()
+        self.file.close()
+
+class ReplayPlayer:
+    """读取录像并在MatchState上重放，支持按帧跳转"""
+    def __init__(self, path, state=None):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            raise ReplayError("录像文件过短")
+        magic, version, self.mode, self.difficulty, _, self.seed, fps, self.keyframe_interval = \
+            _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ReplayError("不是录像文件")
+        if version != VERSION or fps != FPS:
+            raise ReplayError(f"不支持的录像版本{version}（帧率{fps}）")
+
+        # 展开成逐帧的掩码序列：masks[2*t]为玩家1，masks[2*t+1]为玩家2
+        self.masks = bytearray()
+        self.keyframes = []  # [(帧号, 快照)]，按帧号递增
+        offset = _HEADER.size
+        while offset < len(data):
+            if data[offset] == KEYFRAME_MARK:
+                (length,) = _KEYFRAME_LENGTH.unpack_from(data, offset + 1)
+                offset += 1 + _KEYFRAME_LENGTH.size
+                self.keyframes.append((len(self.masks) // 2, bytes(data[offset:offset + length])))
+                offset += length
+            else:
+                if offset + 3 > len(data):
+                    raise ReplayError("录像文件在输入段中截断")
+                p1, p2, count = data[offset:offset + 3]
+                self.masks += bytes((p1, p2)) * count
+                offset += 3
+        if not self.keyframes or self.keyframes[0][0] != 0:
+            raise ReplayError("录像缺少起始关键帧")
+
+        self.state = state if state is not None else MatchState()
+        self.position = 0
+        self.seek(0)
+
+    @property
+    def length(self):
+        """录像总帧数"""
+        return len(self.masks) // 2
+
+    def next_inputs(self):
+        """取出下一帧双方输入并前进一帧，录像结束时返回None"""
+        if self.position >= self.length:
+            return None
+        p1 = self.masks[2 * self.position]
+        p2 = self.masks[2 * self.position + 1]
+        self.position += 1
+        return mask_to_inputs(p1), mask_to_inputs(p2)
+
+    def step(self):
+        """重放一帧，返回是否还有后续输入"""
+        inputs = self.next_inputs()
+        if inputs is None:
+            return False
+        step(self.state, *inputs)
+        return True
+
+    def seek(self, tick):
+        """跳到指定帧：恢复不晚于该帧的最近关键帧，再快进剩余帧数"""
+        tick = max(0, min(tick, self.length))
+        keyframe_tick, blob = self.keyframes[0]
+        for candidate_tick, candidate in self.keyframes:
+            if candidate_tick > tick:
+                break
+            keyframe_tick, blob = candidate_tick, candidate
+        self.state.restore(blob)
+        self.position = keyframe_tick
+        while self.position < tick:
+            self.step()
+
+    def run_to_end(self):
+        """无界面快进到录像结束"""
+        while self.step():
+            pass
+        return self.state
+
+    def verify(self):
+        """从每个关键帧重放到下一个关键帧并比对快照，返回第一个不一致的帧号，全部一致时返回None"""
+        for (tick, blob), (next_tick, next_blob) in zip(self.keyframes, self.keyframes[1:]):
+            self.state.restore(blob)
+            self.position = tick
+            while self.position < next_tick:
+                self.step()
+            if self.state.snapshot() != next_blob:
+                return next_tick
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="对战录像信息、快进与校验")
+    parser.add_argument('path', help="录像文件")
+    parser.add_argument('--seek', type=float, help="跳转到指定秒数并显示当时的状态")
+    parser.add_argument('--verify', action='store_true', help="校验关键帧与重放结果是否一致")
+    args = parser.parse_args()
+
+    player = ReplayPlayer(args.path)
+    print(f"种子{player.seed} 模式{player.mode} 难度{player.difficulty} "
+          f"共{player.length}帧({player.length / FPS:.1f}秒) 关键帧{len(player.keyframes)}个")
+
+    if args.verify:
+        mismatch = player.verify()
+        print("关键帧校验通过" if mismatch is None else f"第{mismatch}帧关键帧不一致")
+
+    if args.seek is not None:
+        start = time.perf_counter()
+        player.seek(int(args.seek * FPS))
+        elapsed = time.perf_counter() - start
+        state = player.state
+        print(f"跳转到第{state.tick}帧用时{elapsed * 1000:.2f}毫秒")
+        for fighter in (state.player1, state.player2):
+            print(f"  {fighter.name}: 位置({fighter.x:.0f}, {fighter.y:.0f}) 血量{fighter.health} 能量{fighter.special_energy}")
+        return
+
+    start = time.perf_counter()
+    state = player.run_to_end()
+    elapsed = time.perf_counter() - start
+    winner = state.winner.name if state.winner else "平局"
+    print(f"快进{player.length}帧用时{elapsed * 1000:.1f}毫秒，结果：{winner}，"
+          f"血量{state.player1.health}:{state.player2.health}")
+
+if __name__ == "__main__":
+    main()
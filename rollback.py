@@ -0,0 +1,354 @@
+"""
+北航自由搏击 - 回滚网络对战
+双人联网对战时，本地输入延迟input_delay帧生效并立即发给对方；对方的输入没到时先按其上一帧按住的键预测，
+每帧推进前把状态快照存进环形缓冲区，迟到的真实输入与预测不一致时恢复到那一帧再重新模拟到当前帧
+本地最多领先对方已确认的输入max_rollback帧，超过时原地等待
+
+每个数据包都带上对方还没确认收到的全部本地输入，丢包后下一个包自然补上：
+  包格式（小端）  对局编号u16 | 起始帧u32 | 已收到对方输入的最后一帧i32 | 数量u8 | 各帧输入掩码u8…
+
+用法：
+  python rollback.py --rtt 120 --jitter 15 --loss 0.05          模拟网络下两个对等端的对战（含一致性检查）
+  python fighting_game.py --listen 9801 --peer 192.168.1.5:9801 --slot 1
+  python fighting_game.py --listen 9801 --peer 192.168.1.4:9801 --slot 2
+"""
+
+import argparse
+import heapq
+import random
+import socket
+import struct
+import time
+import zlib
+
+from fight_core import FPS, ACTIONS, MatchState, step, mask_to_inputs, inputs_to_mask
+from match_server import HELD_MASK
+
+DEFAULT_INPUT_DELAY = 2
+DEFAULT_MAX_ROLLBACK = 8
+MAX_PACKET_INPUTS = 255
+
+_PACKET = struct.Struct('<HIiB')
+
+class RollbackSession:
+    """
+    一局联网对战的回滚状态，local_slot为0时本地控制玩家1
+    transport需要提供send(bytes)和receive()（返回收到的数据包列表，不阻塞）
+    """
+    def __init__(self, state, local_slot, transport, input_delay=DEFAULT_INPUT_DELAY,
+                 max_rollback=DEFAULT_MAX_ROLLBACK, match_id=0):
+        self.state = state
+        self.local_slot = local_slot
+        self.transport = transport
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.match_id = match_id & 0xFFFF
+
+        # 快照环：ring[t % 长度]为(t, 第t帧推进之前的快照)
+        self.ring = [None] * (max_rollback + 2)
+        # 输入延迟期间的本地输入为空；local_inputs[0]是第local_base帧，已确认的旧输入会被裁掉
+        self.local_inputs = [0] * input_delay
+        self.local_base = 0
+        self.remote_inputs = {}  # 帧号 -> 对方的真实输入
+        self.predicted = {}  # 帧号 -> 模拟时对方的输入（真实或预测）
+        self.remote_confirmed = -1  # 对方输入连续收到的最后一帧
+        self.remote_ack = -1  # 对方连续收到本地输入的最后一帧
+        self.carry = 0  # 等待期间按下的攻击/特技/闪现，留到下一帧输入
+
+        # 同一帧在两端算出的快照校验值，帧号 -> crc32
+        self.checksums = {}
+
+        self.frames = 0
+        self.stalls = 0
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.max_resimulated = 0
+        self.resim_times = []
+
+    @property
+    def tick(self):
+        return self.state.tick
+
+    @property
+    def finished(self):
+        """对战已结束，且决定结局的输入都已确认，不会再被回滚推翻"""
+        return self.state.finished and self.tick - 1 <= self.remote_confirmed
+
+    def advance(self, inputs):
+        """
+        每个逻辑帧调用一次：收包、必要时回滚重算、记录本地输入并推进一帧，返回finished
+        超过回滚窗口时原地等待；按预测已经分出胜负时也不再推进，只等对方的输入确认结果
+        """
+        self._receive()
+        if self.state.finished or self.tick - self.remote_confirmed > self.max_rollback:
+            # 对方的输入落后太多，再推进就超出快照环能回滚的范围
+            if not self.state.finished:
+                self.stalls += 1
+                self.carry |= inputs_to_mask(inputs) & ~HELD_MASK
+            self._send()
+            self._record_checksums()
+            return self.finished
+
+        self.local_inputs.append(inputs_to_mask(inputs) | self.carry)
+        self.carry = 0
+        self._send()
+        self._step(self.tick)
+        self.frames += 1
+        self._record_checksums()
+        return self.finished
+
+    def _remote_mask(self, tick):
+        mask = self.remote_inputs.get(tick)
+        if mask is None:
+            # 预测：沿用对方最后一个真实输入中按住的键
+            last = self.remote_inputs.get(self.remote_confirmed, 0)
+            mask = last & HELD_MASK
+        self.predicted[tick] = mask
+        return mask
+
+    def _step(self, tick):
+        self.ring[tick % len(self.ring)] = (tick, self.state.snapshot())
+        local = self.local_inputs[tick - self.local_base]
+        remote = self._remote_mask(tick)
+        if self.local_slot == 0:
+            return step(self.state, mask_to_inputs(local), mask_to_inputs(remote))
+        return step(self.state, mask_to_inputs(remote), mask_to_inputs(local))
+
+    def _receive(self):
+        rollback_from = None
+        for packet in self.transport.receive():
+            if len(packet) < _PACKET.size:
+                continue
+            match_id, start, ack, count = _PACKET.unpack_from(packet)
+            if match_id != self.match_id:
+                continue  # 上一局的旧包
+            self.remote_ack = max(self.remote_ack, ack)
+            masks = packet[_PACKET.size:_PACKET.size + count]
+            for offset, mask in enumerate(masks):
+                tick = start + offset
+                if tick <= self.remote_confirmed or tick in self.remote_inputs:
+                    continue
+                self.remote_inputs[tick] = mask
+                predicted = self.predicted.get(tick)
+                if predicted is not None and predicted != mask and (rollback_from is None or tick < rollback_from):
+                    rollback_from = tick
+            while self.remote_confirmed + 1 in self.remote_inputs:
+                self.remote_confirmed += 1
+        if rollback_from is not None:
+            self._rollback(rollback_from)
+        self._trim()
+
+    def _rollback(self, tick):
+        """恢复到第tick帧之前的快照，用最新的输入重新模拟到当前帧；重算期间不产生战斗事件"""
+        current = self.tick
+        if tick >= current:
+            # 之前的重算已经提前分出胜负，这一帧在当前的时间线里没有被模拟，它的输入不影响结果
+            return
+        start = time.perf_counter()
+        saved_tick, blob = self.ring[tick % len(self.ring)]
+        assert saved_tick == tick, "回滚超出快照环的范围"
+        self.state.restore(blob)
+        fighters = (self.state.player1, self.state.player2)
+        events = [fighter.events for fighter in fighters]
+        for fighter in fighters:
+            fighter.events = None
+        frames = 0
+        for t in range(tick, current):
+            frames += 1
+            if self._step(t):
+                # 重算中分出胜负后帧号不再前进，不能再按t往快照环里存快照
+                break
+        for fighter, sink in zip(fighters, events):
+            fighter.events = sink
+        self.rollbacks += 1
+        self.resimulated += frames
+        self.max_resimulated = max(self.max_resimulated, frames)
+        self.resim_times.append(time.perf_counter() - start)
+
+    def _record_checksums(self):
+        """
+        第t帧之前的快照只取决于t之前的输入，对方输入确认到t - 1之后就不会再被回滚改写，
+        此时记下校验值，两端比较同一帧的校验值即可发现不同步
+        """
+        for tick, blob in filter(None, self.ring):
+            # 不小于当前帧的是重算提前结束对战之前留下的旧时间线
+            if tick < self.tick and tick <= self.remote_confirmed + 1 and tick not in self.checksums:
+                self.checksums[tick] = zlib.crc32(blob)
+
+    def _trim(self):
+        """丢掉不会再被回滚、重发或比较用到的旧数据，长时间对战时内存不增长"""
+        oldest = self.tick - len(self.ring)
+        for table in (self.remote_inputs, self.predicted):
+            for tick in [t for t in table if t < oldest and t < self.remote_confirmed]:
+                del table[tick]
+        for tick in [t for t in self.checksums if t < oldest]:
+            del self.checksums[tick]
+        # 本地输入还要留着对方没确认收到的部分用于重发
+        keep_from = min(oldest, self.remote_confirmed, self.remote_ack)
+        if keep_from > self.local_base:
+            del self.local_inputs[:keep_from - self.local_base]
+            self.local_base = keep_from
+
+    def _send(self):
+        start = self.remote_ack + 1
+        offset = start - self.local_base
+        masks = self.local_inputs[offset:offset + MAX_PACKET_INPUTS]
+        if masks:
+            self.transport.send(_PACKET.pack(self.match_id, start, self.remote_confirmed, len(masks)) + bytes(masks))
+
+    def stats(self):
+        times = sorted(self.resim_times)
+        return {
+            'frames': self.frames, 'stalls': self.stalls, 'rollbacks': self.rollbacks,
+            'resimulated': self.resimulated, 'max_resimulated': self.max_resimulated,
+            'resim_p99_ms': times[int(len(times) * 0.99)] * 1000 if times else 0.0,
+            'resim_max_ms': times[-1] * 1000 if times else 0.0,
+        }
+
+class UdpTransport:
+    """UDP收发，listen_port为本地端口，peer为(主机, 端口)"""
+    def __init__(self, listen_port, peer):
+        self.peer = peer
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('0.0.0.0', listen_port))
+        self.sock.setblocking(False)
+
+    def send(self, data):
+        try:
+            self.sock.sendto(data, self.peer)
+        except (BlockingIOError, ConnectionError):
+            pass  # 丢掉这个包，下一帧的包会带上同样的输入
+
+    def receive(self):
+        packets = []
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except (BlockingIOError, ConnectionError):
+                return packets
+            packets.append(data)
+
+    def close(self):
+        self.sock.close()
+
+class LossyLink:
+    """
+    模拟网络：两端之间的单向延迟为rtt_ms / 2加上随机抖动，按loss的概率丢包
+    clock返回当前时间（秒），离线模拟时用虚拟时钟，不必真的等待
+    """
+    def __init__(self, rtt_ms, jitter_ms=0.0, loss=0.0, seed=None, clock=time.perf_counter):
+        self.delay = rtt_ms / 2000
+        self.jitter = jitter_ms / 1000
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.queues = ([], [])  # 发往两端的(到达时间, 序号, 数据)
+        self.sent = 0
+        self.dropped = 0
+
+    def endpoints(self):
+        return _LinkEndpoint(self, 0), _LinkEndpoint(self, 1)
+
+    def _send(self, target, data):
+        self.sent += 1
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        arrival = self.clock() + self.delay + self.rng.uniform(0.0, self.jitter)
+        heapq.heappush(self.queues[target], (arrival, self.sent, data))
+
+    def _receive(self, side):
+        queue = self.queues[side]
+        now = self.clock()
+        packets = []
+        while queue and queue[0][0] <= now:
+            packets.append(heapq.heappop(queue)[2])
+        return packets
+
+class _LinkEndpoint:
+    def __init__(self, link, side):
+        self.link = link
+        self.side = side
+
+    def send(self, data):
+        self.link._send(1 - self.side, data)
+
+    def receive(self):
+        return self.link._receive(self.side)
+
+class _InputBot:
+    """模拟玩家：按住的方向/防御偶尔变化，隔一阵按一次攻击、特技或闪现"""
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.held = {}
+
+    def inputs(self):
+        rng = self.rng
+        if rng.random() < 0.05:
+            self.held = {action: rng.random() < 0.3 for action in ('left', 'right', 'jump', 'block')}
+        inputs = dict.fromkeys(ACTIONS, False)
+        inputs.update(self.held)
+        if rng.random() < 0.08:
+            inputs[rng.choice(('attack', 'attack', 'special', 'dash'))] = True
+        return inputs
+
+def simulate(seconds, rtt_ms, jitter_ms, loss, input_delay, max_rollback, seed=0):
+    """两个对等端经由LossyLink对战seconds秒（虚拟时钟），返回各端统计和不同步的帧数"""
+    now = [0.0]
+    link = LossyLink(rtt_ms, jitter_ms, loss, seed=seed, clock=lambda: now[0])
+    ends = link.endpoints()
+    sessions = [RollbackSession(MatchState(), slot, ends[slot], input_delay, max_rollback) for slot in (0, 1)]
+    bots = [_InputBot(seed * 2 + slot) for slot in (0, 1)]
+    idle = dict.fromkeys(ACTIONS, False)
+
+    ticks = int(seconds * FPS)
+    frame_times = []
+    # 会话只保留最近的校验值，这里每帧收集起来，最后比较两端的全部帧
+    checksums = [{}, {}]
+    for frame in range(ticks + 4 * max_rollback + 60):
+        # 最后一段只发空输入，让两端都确认完所有输入
+        for session, bot, collected in zip(sessions, bots, checksums):
+            start = time.perf_counter()
+            session.advance(bot.inputs() if frame < ticks else idle)
+            frame_times.append(time.perf_counter() - start)
+            collected.update(session.checksums)
+        now[0] += 1 / FPS
+
+    common = checksums[0].keys() & checksums[1].keys()
+    desyncs = sum(1 for tick in common if checksums[0][tick] != checksums[1][tick])
+    if all(session.finished for session in sessions) and sessions[0].state.snapshot() != sessions[1].state.snapshot():
+        desyncs += 1  # 两端的结局不同
+    frame_times.sort()
+    return {
+        'sessions': [session.stats() for session in sessions],
+        'checked_ticks': len(common),
+        'desyncs': desyncs,
+        'frame_p99_ms': frame_times[int(len(frame_times) * 0.99)] * 1000,
+        'frame_max_ms': frame_times[-1] * 1000,
+        'packets': link.sent,
+        'dropped': link.dropped,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="回滚网络对战的模拟测试")
+    parser.add_argument('--seconds', type=float, default=60.0, help="模拟的对战时长（秒）")
+    parser.add_argument('--rtt', type=float, default=100.0, help="往返延迟（毫秒）")
+    parser.add_argument('--jitter', type=float, default=10.0, help="单向延迟的随机抖动（毫秒）")
+    parser.add_argument('--loss', type=float, default=0.02, help="丢包率")
+    parser.add_argument('--input-delay', type=int, default=DEFAULT_INPUT_DELAY, help="本地输入延迟（帧）")
+    parser.add_argument('--max-rollback', type=int, default=DEFAULT_MAX_ROLLBACK, help="最多回滚的帧数")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    result = simulate(args.seconds, args.rtt, args.jitter, args.loss, args.input_delay, args.max_rollback, args.seed)
+    print(f"往返{args.rtt:.0f}毫秒 抖动{args.jitter:.0f}毫秒 丢包{args.loss:.0%} 输入延迟{args.input_delay}帧 "
+          f"最多回滚{args.max_rollback}帧：发包{result['packets']}个，丢弃{result['dropped']}个")
+    for slot, stats in enumerate(result['sessions'], 1):
+        print(f"  玩家{slot}：推进{stats['frames']}帧，等待{stats['stalls']}帧，回滚{stats['rollbacks']}次"
+              f"（重算{stats['resimulated']}帧，单次最多{stats['max_resimulated']}帧），"
+              f"重算耗时p99 {stats['resim_p99_ms']:.3f}毫秒 最大{stats['resim_max_ms']:.3f}毫秒")
+    print(f"  每帧耗时p99 {result['frame_p99_ms']:.3f}毫秒 最大{result['frame_max_ms']:.3f}毫秒，"
+          f"校验{result['checked_ticks']}帧，不同步{result['desyncs']}帧")
+
+if __name__ == "__main__":
+    main()
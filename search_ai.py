@@ -0,0 +1,171 @@
+"""
+北航自由搏击 - 搜索型AI（大师难度）
+决策时把双方角色的状态复制到影子对局里，对每个候选动作模拟对手的几种应对，
+按期望局面分数选出最好的动作（一层己方取最大、一层对手取期望的expectimax），
+模拟时长逐步加深，超过每次决策的时间预算就停止并使用已完成的最深一轮结果
+"""
+
+import time
+
+from fight_core import (GROUND_Y, MOVE_SET, AIDifficulty, AIController, AI_POLICY_TABLES,
+                        FighterCore, MatchState, step)
+
+# 己方候选动作
+SEARCH_ACTIONS = ('attack', 'special_attack', 'dash', 'block', 'jump', 'move_closer', 'move_back', 'wait')
+# 对手模型：机会节点上对手的应对及其权重
+OPPONENT_MODEL = (
+    ('attack', 0.3),
+    ('special_attack', 0.15),
+    ('block', 0.2),
+    ('move_closer', 0.2),
+    ('wait', 0.15),
+)
+# 己方动作保持的帧数，等于大师难度的决策间隔（150毫秒），超过后按默认策略推演
+ACTION_TICKS = 9
+# 逐步加深的模拟帧数：4帧是保底的浅搜索，ACTION_TICKS正好覆盖实际执行的整个动作，
+# 2倍的一轮再看一个决策间隔的后续；2毫秒预算下通常完成到ACTION_TICKS一轮，18帧只在较快的机器上完成
+SEARCH_HORIZONS = (4, ACTION_TICKS, 2 * ACTION_TICKS)
+DEFAULT_BUDGET_MS = 2.0
+# 普通攻击能打到的水平距离
+ATTACK_REACH = MOVE_SET['attack'].reach
+
+# 动作对应的引擎输入，移动方向在模拟开始时按双方位置确定
+_ACTION_INPUTS = {
+    'attack': {'attack': True},
+    'special_attack': {'special': True},
+    'dash': {'dash': True},
+    'block': {'block': True},
+    'jump': {'jump': True},
+    'wait': {},
+}
+
+def action_inputs(action, fighter, target):
+    """把AI动作换算成一帧的引擎输入"""
+    if action == 'move_closer':
+        return {'right': True} if target.x > fighter.x else {'left': True}
+    if action == 'move_back':
+        return {'left': True} if target.x > fighter.x else {'right': True}
+    return _ACTION_INPUTS[action]
+
+def rollout_inputs(fighter, target):
+    """推演用的默认策略：在攻击距离内就攻击，否则靠近对手"""
+    if abs(fighter.x - target.x) <= ATTACK_REACH:
+        return _ACTION_INPUTS['attack']
+    return action_inputs('move_closer', fighter, target)
+
+def evaluate(me, opponent):
+    """局面分数：血量差为主，能量差、击晕状态和与攻击距离的差距为辅"""
+    score = me.health - opponent.health
+    score -= 0.02 * max(0.0, abs(me.x - opponent.x) - ATTACK_REACH)
+    score += 0.1 * (me.special_energy - opponent.special_energy)
+    if opponent.stunned:
+        score += 8
+    if me.stunned:
+        score -= 8
+    return score
+
+class SearchAIController(AIController):
+    """
+    在时间预算内做前瞻搜索的AI
+    budget_ms为每次决策的时间上限，max_nodes为模拟帧数上限；
+    需要结果可复现时（如循环赛）把budget_ms设为None，只用max_nodes限制搜索量
+    """
+    def __init__(self, fighter, difficulty=AIDifficulty.MASTER, clock=None, rng=None,
+                 budget_ms=DEFAULT_BUDGET_MS, max_nodes=None, ground_y=GROUND_Y):
+        super().__init__(fighter, difficulty, clock, rng)
+        # 预算耗尽时退回专家难度的策略表
+        self.policy = AI_POLICY_TABLES[AIDifficulty.EXPERT]
+        self.budget_ms = budget_ms
+        self.max_nodes = max_nodes
+        self.shadow = MatchState(FighterCore(0, 0, "me"), FighterCore(0, 0, "opponent"), ground_y)
+
+        # 搜索统计
+        self.searches = 0
+        self.nodes = 0
+        self.search_seconds = 0.0
+        self.max_search_ms = 0.0
+        self.depth_total = 0
+        self.fallbacks = 0
+
+    def _make_decision(self):
+        if not self.target:
+            return
+
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000 if self.budget_ms is not None else None
+        node_limit = self.nodes + self.max_nodes if self.max_nodes is not None else None
+
+        shadow = self.shadow
+        shadow.player1.restore(self.fighter.snapshot())
+        shadow.player2.restore(self.target.snapshot())
+        shadow.clock.ticks = self.clock.ticks
+        shadow.winner = None
+        shadow.finished = False
+        root = shadow.snapshot()
+
+        best_action = None
+        best_horizon = 0
+        for horizon in SEARCH_HORIZONS:
+            values = self._search(root, horizon, deadline, node_limit)
+            if values is None:
+                break
+            # 分数相同时按SEARCH_ACTIONS的顺序取第一个，保证结果确定
+            best_action = max(SEARCH_ACTIONS, key=values.__getitem__)
+            best_horizon = horizon
+
+        elapsed = time.perf_counter() - start
+        self.searches += 1
+        self.search_seconds += elapsed
+        self.max_search_ms = max(self.max_search_ms, elapsed * 1000)
+        self.depth_total += best_horizon
+
+        if best_action is None:
+            # 连最浅的一轮都没有完成
+            self.fallbacks += 1
+            super()._make_decision()
+            return
+        self.current_action = best_action
+        # 不论完成到哪一轮，搜索评估的都是把动作保持ACTION_TICKS帧的走法
+        self.action_timer = ACTION_TICKS
+
+    def _search(self, root, horizon, deadline, node_limit):
+        """
+        对每个己方动作求对手应对下的期望分数，返回{动作: 分数}
+        超出预算时返回None；预算在每个叶节点开始前检查，超出量不超过一个叶节点的模拟
+        """
+        shadow = self.shadow
+        me = shadow.player1
+        opponent = shadow.player2
+        values = {}
+        for action in SEARCH_ACTIONS:
+            expected = 0.0
+            for reply, weight in OPPONENT_MODEL:
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+                if node_limit is not None and self.nodes + horizon > node_limit:
+                    return None
+                shadow.restore(root)
+                inputs_me = action_inputs(action, me, opponent)
+                inputs_opponent = action_inputs(reply, opponent, me)
+                for tick in range(horizon):
+                    if tick >= ACTION_TICKS:
+                        inputs_me = rollout_inputs(me, opponent)
+                    if step(shadow, inputs_me, inputs_opponent):
+                        break
+                self.nodes += horizon
+                expected += weight * evaluate(me, opponent)
+            values[action] = expected
+        return values
+
+    def search_stats(self):
+        """搜索次数、每秒模拟帧数（节点数）、平均/最长耗时、平均完成深度"""
+        searches = max(1, self.searches)
+        return {
+            'searches': self.searches,
+            'nodes': self.nodes,
+            'nodes_per_second': self.nodes / self.search_seconds if self.search_seconds else 0.0,
+            'mean_ms': self.search_seconds * 1000 / searches,
+            'max_ms': self.max_search_ms,
+            'mean_horizon': self.depth_total / searches,
+            'fallbacks': self.fallbacks,
+        }
@@ -0,0 +1,470 @@
+"""
+北航自由搏击 - 观战广播
+把对战状态（双方位置、血量、能量、状态标记和剩余时间）通过TCP推送给任意多个观战客户端：
+定期发送完整的关键帧，其余每帧只发送变化了的字段
+
+游戏循环每帧只调用一次publish：消息编码一次后交给单独的广播进程，由它分别发给各客户端，
+游戏进程的耗时与观众人数无关；某个客户端积压的消息超过上限时直接断开，慢速观众不会拖慢游戏
+
+消息格式（小端）：
+  长度u16 | 类型u8 | 帧号u32 | 变化字段掩码u16 | 掩码中各字段的值（按FIELD_NAMES顺序）
+关键帧的掩码包含全部字段，新连接的客户端从最近的关键帧开始接收
+
+用法：
+  python fighting_game.py --spectate 9600        对战时开启观战广播
+  python spectator.py --clients 300 --slow 5     本地压力测试（AI对战 + 模拟观众）
+"""
+
+import argparse
+import multiprocessing
+import random
+import selectors
+import socket
+import struct
+import time
+from collections import deque
+
+from fight_core import FPS, AIDifficulty, MatchState, create_ai_controller, step, virtual_keys_to_inputs
+
+DEFAULT_PORT = 9600
+KEYFRAME_INTERVAL = FPS  # 每秒一个关键帧
+QUEUE_LIMIT = 4 * FPS  # 每个客户端最多积压的消息数，超过后断开
+SEND_BUFFER = 4096  # 缩小内核发送缓冲区，积压留在可计数的消息队列里而不是内核中
+
+MSG_KEYFRAME = 0
+MSG_DELTA = 1
+
+# 广播的字段及其struct格式：剩余时间，然后是双方的位置、血量、能量和状态标记
+FIGHTER_FIELDS = (('x', 'f'), ('y', 'f'), ('health', 'h'), ('special_energy', 'h'), ('flags', 'B'))
+FIELD_NAMES = ('game_time',) + tuple(f"p{i}_{name}" for i in (1, 2) for name, _ in FIGHTER_FIELDS)
+FIELD_FORMATS = 'f' + ''.join(fmt for _, fmt in FIGHTER_FIELDS) * 2
+FULL_MASK = (1 << len(FIELD_NAMES)) - 1
+
+# 状态标记的位顺序
+FLAGS = ('facing_right', 'on_ground', 'is_attacking', 'is_blocking', 'is_dashing', 'stunned')
+
+_LENGTH = struct.Struct('<H')
+_HEADER = struct.Struct('<BIH')
+
+def fighter_flags(fighter):
+    flags = 0
+    for bit, name in enumerate(FLAGS):
+        if getattr(fighter, name):
+            flags |= 1 << bit
+    return flags
+
+def match_fields(match):
+    """按FIELD_NAMES的顺序取出要广播的字段"""
+    p1 = match.player1
+    p2 = match.player2
+    return (match.game_time,
+            p1.x, p1.y, p1.health, p1.special_energy, fighter_flags(p1),
+            p2.x, p2.y, p2.health, p2.special_energy, fighter_flags(p2))
+
+# 各掩码对应的值格式，按需生成后缓存
+_value_structs = {}
+
+def _values_struct(mask):
+    values = _value_structs.get(mask)
+    if values is None:
+        fmt = ''.join(f for i, f in enumerate(FIELD_FORMATS) if mask >> i & 1)
+        values = _value_structs[mask] = struct.Struct('<' + fmt)
+    return values
+
+def encode(kind, tick, mask, fields):
+    """编码一条消息（含长度前缀），只写入mask中的字段"""
+    values = [value for i, value in enumerate(fields) if mask >> i & 1]
+    body = _HEADER.pack(kind, tick, mask) + _values_struct(mask).pack(*values)
+    return _LENGTH.pack(len(body)) + body
+
+class SpectatorView:
+    """观战端的状态还原：不断feed收到的字节，fields为当前的全部字段（收到首个关键帧之前为None）"""
+    def __init__(self):
+        self.buffer = bytearray()
+        self.fields = None
+        self.tick = -1
+        self.messages = 0
+        self.keyframes = 0
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        offset = 0
+        while len(buffer) - offset >= _LENGTH.size:
+            (length,) = _LENGTH.unpack_from(buffer, offset)
+            end = offset + _LENGTH.size + length
+            if end > len(buffer):
+                break
+            self._apply(buffer, offset + _LENGTH.size)
+            offset = end
+        del buffer[:offset]
+
+    def _apply(self, data, offset):
+        kind, tick, mask = _HEADER.unpack_from(data, offset)
+        values = _values_struct(mask).unpack_from(data, offset + _HEADER.size)
+        self.messages += 1
+        if kind == MSG_KEYFRAME:
+            self.keyframes += 1
+            self.fields = list(values)
+        elif self.fields is None:
+            return  # 还没收到关键帧，增量无从应用
+        else:
+            it = iter(values)
+            for i in range(len(FIELD_NAMES)):
+                if mask >> i & 1:
+                    self.fields[i] = next(it)
+        self.tick = tick
+
+    def state(self):
+        return None if self.fields is None else dict(zip(FIELD_NAMES, self.fields))
+
+class _Client:
+    __slots__ = ('sock', 'cursor', 'pending', 'writing')
+
+    def __init__(self, sock, cursor):
+        self.sock = sock
+        self.cursor = cursor  # 下一条要取出发送的消息序号
+        self.pending = b''  # 已取出但还没发完的字节
+        self.writing = False  # 是否在等待可写事件
+
+# 广播进程的统计，写在共享数组中：[累计连接数, 当前连接数, 断开的慢速客户端数, 发送字节数]
+_CONNECTED, _CLIENTS, _DROPPED, _BYTES_SENT = range(4)
+
+class _Broadcaster:
+    """
+    广播进程中的发送循环：从游戏进程的feed连接读入已编码的消息，再发给各客户端
+    消息队列是所有客户端共用的定长队列，每个客户端只记录自己取到了第几条；
+    客户端落后超过queue_limit条（需要的消息已被挤出队列）时断开该客户端
+    """
+    def __init__(self, listener, feed, queue_limit, counters):
+        self.listener = listener
+        self.feed = feed
+        self.counters = counters
+        self.messages = deque(maxlen=queue_limit)
+        self.base_seq = 0  # messages[0]的序号
+        self.next_seq = 0
+        self.keyframe_seq = None  # 最近一个关键帧的序号
+        self.incoming = bytearray()
+        self.closing = False
+        self.clients = {}
+
+        listener.setblocking(False)
+        feed.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(listener, selectors.EVENT_READ, 'accept')
+        self.selector.register(feed, selectors.EVENT_READ, 'feed')
+
+    def run(self, flush_timeout):
+        deadline = None
+        while True:
+            for key, _ in self.selector.select(timeout=0.5):
+                if key.data == 'accept':
+                    self._accept()
+                elif key.data == 'feed':
+                    self._read_feed()
+            for client in list(self.clients.values()):
+                self._flush(client)
+            if self.closing:
+                if deadline is None:
+                    deadline = time.perf_counter() + flush_timeout
+                if not any(c.pending or c.cursor < self.next_seq for c in self.clients.values()) \
+                        or time.perf_counter() > deadline:
+                    break
+        for client in list(self.clients.values()):
+            self._disconnect(client)
+        self.selector.close()
+
+    def _read_feed(self):
+        try:
+            data = self.feed.recv(65536)
+        except BlockingIOError:
+            return
+        if not data:
+            self.closing = True  # 游戏进程已退出
+            self.selector.unregister(self.feed)
+            return
+        incoming = self.incoming
+        incoming += data
+        offset = 0
+        while len(incoming) - offset >= _LENGTH.size:
+            (length,) = _LENGTH.unpack_from(incoming, offset)
+            end = offset + _LENGTH.size + length
+            if end > len(incoming):
+                break
+            if not length:
+                # 长度为0表示停止广播
+                self.closing = True
+            else:
+                if len(self.messages) == self.messages.maxlen:
+                    self.base_seq += 1
+                self.messages.append(bytes(incoming[offset:end]))
+                if incoming[offset + _LENGTH.size] == MSG_KEYFRAME:
+                    self.keyframe_seq = self.next_seq
+                self.next_seq += 1
+            offset = end
+        del incoming[:offset]
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except BlockingIOError:
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+            cursor = self.keyframe_seq if self.keyframe_seq is not None else self.next_seq
+            self.clients[sock] = _Client(sock, cursor)
+            self.counters[_CONNECTED] += 1
+            self.counters[_CLIENTS] = len(self.clients)
+
+    def _flush(self, client):
+        """把客户端还没收到的消息尽量发出去，发不完的留到可写时再发"""
+        if client.cursor < self.base_seq:
+            # 落后太多，需要的消息已被挤出队列
+            self.counters[_DROPPED] += 1
+            self._disconnect(client)
+            return
+        if not client.pending:
+            if client.cursor == self.next_seq:
+                return
+            start = client.cursor - self.base_seq
+            client.pending = b''.join([self.messages[i] for i in range(start, len(self.messages))])
+            client.cursor = self.next_seq
+        try:
+            sent = client.sock.send(client.pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._disconnect(client)
+            return
+        self.counters[_BYTES_SENT] += sent
+        client.pending = client.pending[sent:]
+
+        # 只在有剩余数据时关注可写事件，避免空转
+        writing = bool(client.pending)
+        if writing != client.writing:
+            if writing:
+                self.selector.register(client.sock, selectors.EVENT_WRITE, client)
+            else:
+                self.selector.unregister(client.sock)
+            client.writing = writing
+
+    def _disconnect(self, client):
+        if client.writing:
+            self.selector.unregister(client.sock)
+        self.clients.pop(client.sock, None)
+        self.counters[_CLIENTS] = len(self.clients)
+        client.sock.close()
+
+def _broadcast_loop(listener, feed, queue_limit, counters, flush_timeout):
+    _Broadcaster(listener, feed, queue_limit, counters).run(flush_timeout)
+    listener.close()
+    feed.close()
+
+class SpectatorServer:
+    """
+    观战广播服务器：监听和向各客户端发送都在单独的广播进程中完成，不与游戏循环争抢GIL
+    游戏进程每帧只把编码好的一条消息写进本地连接；连接暂时写不进去时跳过这一帧，
+    之后的第一条消息改发关键帧，观众端不会因为缺少增量而出错
+    """
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, queue_limit=QUEUE_LIMIT,
+                 keyframe_interval=KEYFRAME_INTERVAL, flush_timeout=1.0):
+        if keyframe_interval >= queue_limit:
+            raise ValueError("关键帧间隔必须小于消息队列长度，新客户端才能从关键帧开始接收")
+        self.keyframe_interval = keyframe_interval
+        self.last_fields = None
+        self.last_keyframe_tick = None
+        self.resync = False
+        self.unsent = b''
+        self.skipped = 0  # 因本地连接写满而跳过的帧数
+
+        listener = socket.create_server((host, port))
+        self.address = listener.getsockname()
+        self.feed, child_feed = socket.socketpair()
+        self.counters = multiprocessing.Array('q', 4, lock=False)
+        self.process = multiprocessing.Process(
+            target=_broadcast_loop, args=(listener, child_feed, queue_limit, self.counters, flush_timeout),
+            daemon=True)
+        self.process.start()
+        listener.close()
+        child_feed.close()
+        self.feed.setblocking(False)
+        self.flush_timeout = flush_timeout
+
+    def publish(self, match):
+        """游戏循环每帧调用一次：编码本帧状态（关键帧或增量）交给广播进程"""
+        if self.unsent:
+            self._send()
+            if self.unsent:
+                self.skipped += 1
+                self.resync = True
+                return
+
+        fields = match_fields(match)
+        tick = match.tick
+        previous = self.last_fields
+        if (self.resync or previous is None or tick < self.last_keyframe_tick
+                or tick - self.last_keyframe_tick >= self.keyframe_interval):
+            self.unsent = encode(MSG_KEYFRAME, tick, FULL_MASK, fields)
+            self.last_keyframe_tick = tick
+            self.resync = False
+        else:
+            mask = 0
+            for i, (value, old) in enumerate(zip(fields, previous)):
+                if value != old:
+                    mask |= 1 << i
+            self.unsent = encode(MSG_DELTA, tick, mask, fields)
+        self.last_fields = fields
+        self._send()
+
+    def _send(self):
+        try:
+            sent = self.feed.send(self.unsent)
+        except BlockingIOError:
+            sent = 0
+        self.unsent = self.unsent[sent:]
+
+    def close(self):
+        """停止广播：广播进程最多再用flush_timeout秒把已排队的消息发完，然后断开所有客户端"""
+        if self.process.is_alive():
+            self.feed.setblocking(True)
+            try:
+                self.feed.sendall(self.unsent + _LENGTH.pack(0))
+            except OSError:
+                pass
+            self.process.join(self.flush_timeout + 1.0)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.feed.close()
+
+    def stats(self):
+        counters = self.counters
+        return {'connected': counters[_CONNECTED], 'clients': counters[_CLIENTS],
+                'dropped': counters[_DROPPED], 'bytes_sent': counters[_BYTES_SENT],
+                'skipped': self.skipped}
+
+def _run_viewers(address, count, slow, duration, results):
+    """
+    模拟观众，在单独的进程中运行：count个正常读取的客户端和slow个几乎不读的客户端
+    结束时把各正常客户端还原出的最终状态和收到的消息数放进results
+    """
+    selector = selectors.DefaultSelector()
+    views = {}
+    slow_sockets = []
+    for i in range(count + slow):
+        sock = socket.create_connection(address)
+        if i >= count:
+            # 慢速观众：接收缓冲区尽量小且从不读取
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+            slow_sockets.append(sock)
+            continue
+        sock.setblocking(False)
+        views[sock] = SpectatorView()
+        selector.register(sock, selectors.EVENT_READ)
+
+    deadline = time.perf_counter() + duration
+    open_sockets = len(views)
+    while open_sockets and time.perf_counter() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            try:
+                data = key.fileobj.recv(65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                data = b''
+            if data:
+                views[key.fileobj].feed(data)
+            else:
+                selector.unregister(key.fileobj)
+                open_sockets -= 1
+    results.put([(view.messages, view.fields) for view in views.values()])
+    for sock in list(views) + slow_sockets:
+        sock.close()
+
+def _ai_match(seed):
+    state = MatchState()
+    rng = random.Random(seed)
+    ai1 = create_ai_controller(state.player1, AIDifficulty.HARD, rng=random.Random(rng.getrandbits(64)))
+    ai2 = create_ai_controller(state.player2, AIDifficulty.EXPERT, rng=random.Random(rng.getrandbits(64)))
+    return state, ai1, ai2
+
+def load_test(clients, slow, seconds, port, seed=0):
+    """
+    本地压力测试：以60帧/秒推进一局AI对战并广播，另一个进程中的模拟观众接收并还原状态
+    返回publish耗时、逻辑帧延迟和各观众的接收情况
+    """
+    server = SpectatorServer(port=port, flush_timeout=5.0)
+    results = multiprocessing.Queue()
+    viewers = multiprocessing.Process(target=_run_viewers,
+                                      args=(server.address, clients, slow, seconds + 30, results))
+    viewers.start()
+    # 等所有观众连上再开始，保证每个观众都能收到完整的比赛
+    while server.stats()['connected'] < clients + slow:
+        time.sleep(0.01)
+
+    state, ai1, ai2 = _ai_match(seed)
+    # 墙钟耗时包含单核机器上广播进程抢占CPU的时间，CPU耗时才是游戏进程自身的开销
+    publish_times = []
+    publish_cpu = []
+    late_ticks = 0
+    ticks = seconds * FPS
+    start = time.perf_counter()
+    for tick in range(ticks):
+        due = start + tick / FPS
+        now = time.perf_counter()
+        if now < due:
+            time.sleep(due - now)
+        elif now - due > 1 / FPS:
+            late_ticks += 1
+        if state.finished:
+            state.reset()
+        step(state, virtual_keys_to_inputs(ai1.update(state.player2), state.player1.controls),
+             virtual_keys_to_inputs(ai2.update(state.player1), state.player2.controls))
+        t = time.perf_counter()
+        cpu = time.thread_time()
+        server.publish(state)
+        publish_cpu.append(time.thread_time() - cpu)
+        publish_times.append(time.perf_counter() - t)
+
+    # 观众收到的是按struct格式截断精度后的值
+    full = _values_struct(FULL_MASK)
+    final = list(full.unpack(full.pack(*match_fields(state))))
+    server.close()
+    received = results.get()
+    viewers.join()
+
+    publish_times.sort()
+    publish_cpu.sort()
+    return {
+        'ticks': ticks,
+        'late_ticks': late_ticks,
+        'publish_p50_us': publish_times[len(publish_times) // 2] * 1e6,
+        'publish_p99_us': publish_times[int(len(publish_times) * 0.99)] * 1e6,
+        'publish_cpu_p50_us': publish_cpu[len(publish_cpu) // 2] * 1e6,
+        'publish_cpu_p99_us': publish_cpu[int(len(publish_cpu) * 0.99)] * 1e6,
+        'server': server.stats(),
+        'viewers_in_sync': sum(1 for _, fields in received if fields == final),
+        'viewer_messages_min': min((messages for messages, _ in received), default=0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="观战广播压力测试")
+    parser.add_argument('--clients', type=int, default=300, help="正常读取的模拟观众数")
+    parser.add_argument('--slow', type=int, default=5, help="从不读取的慢速观众数（应被断开）")
+    parser.add_argument('--seconds', type=int, default=20, help="测试时长（秒）")
+    parser.add_argument('--port', type=int, default=0, help="监听端口，默认自动选择")
+    args = parser.parse_args()
+
+    result = load_test(args.clients, args.slow, args.seconds, args.port)
+    server = result['server']
+    print(f"{result['ticks']}帧，publish耗时p50 {result['publish_p50_us']:.1f}微秒 "
+          f"p99 {result['publish_p99_us']:.1f}微秒（CPU耗时p50 {result['publish_cpu_p50_us']:.1f}微秒 "
+          f"p99 {result['publish_cpu_p99_us']:.1f}微秒），延迟超过一帧的逻辑帧{result['late_ticks']}个")
+    print(f"观众{server['connected']}个，断开慢速观众{server['dropped']}个，"
+          f"发送{server['bytes_sent'] / 1024:.0f}KB，本地连接写满跳过{server['skipped']}帧")
+    print(f"最终状态一致的观众{result['viewers_in_sync']}/{args.clients}个，"
+          f"每个观众至少收到{result['viewer_messages_min']}条消息")
+
+if __name__ == "__main__":
+    main()
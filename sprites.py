@@ -0,0 +1,126 @@
+"""
+北航自由搏击 - 角色精灵图集
+加载时把每种角色颜色的全部动画帧（状态 × 朝向 × 动画帧）画进同一张图集Surface，
+击晕/防御/攻击/闪现的变色和半透明版本也在这时生成，各帧用subsurface引用；
+对战中绘制角色本体只需按状态查表后blit一次
+"""
+
+import pygame
+
+# 状态对应的颜色，None表示角色本色；闪现时身体半透明
+STATE_NORMAL = 0
+STATE_STUNNED = 1
+STATE_BLOCKING = 2
+STATE_ATTACKING = 3
+STATE_DASHING = 4
+STATE_STUNNED_DASHING = 5  # 闪现途中被击晕
+STATE_TINTS = (None, (255, 255, 0), (0, 0, 255), (255, 0, 0), (255, 255, 255), (255, 255, 0))
+DASH_ALPHA = 150
+
+ANIMATION_FRAMES = 4  # 与FighterCore.animation_frame的取值范围一致
+LEG_SWING = (0, 3, 0, -3)  # 各动画帧的腿部摆动（像素）
+
+# 帧四周为伸出的手臂和腿留出的边距，帧左上角相对角色左上角的偏移为(-SPRITE_MARGIN, -1)
+SPRITE_MARGIN = 41
+SPRITE_BOTTOM = 16
+
+def sprite_state(fighter):
+    """按原来的变色优先级（击晕 > 防御 > 攻击 > 闪现）选出状态"""
+    if fighter.stunned:
+        return STATE_STUNNED_DASHING if fighter.is_dashing else STATE_STUNNED
+    if fighter.is_blocking:
+        return STATE_BLOCKING
+    if fighter.is_attacking:
+        return STATE_ATTACKING
+    if fighter.is_dashing:
+        return STATE_DASHING
+    return STATE_NORMAL
+
+def frame_size(width, height):
+    return (width + 2 * SPRITE_MARGIN + 1, height + SPRITE_BOTTOM + 1)
+
+def _draw_frame(surface, ox, oy, width, height, color, state, facing_right, frame):
+    """在surface的(ox, oy)处画出一帧，角色左上角位于(ox + SPRITE_MARGIN, oy + 1)"""
+    x = ox + SPRITE_MARGIN
+    y = oy + 1
+    tint = STATE_TINTS[state] or color
+
+    # 身体，闪现时半透明
+    body_alpha = DASH_ALPHA if state in (STATE_DASHING, STATE_STUNNED_DASHING) else 255
+    surface.fill(tint + (body_alpha,), (x, y, width, height))
+
+    # 眼睛
+    eye_x = x + width - 15 if facing_right else x + 10
+    pygame.draw.circle(surface, (255, 255, 255), (eye_x, y + 15), 5)
+    pygame.draw.circle(surface, (0, 0, 0), (eye_x, y + 15), 3)
+
+    # 手臂（攻击时延伸）
+    arm_length = 40 if state == STATE_ATTACKING else 20
+    arm_end_x = x + width + arm_length if facing_right else x - arm_length
+    pygame.draw.line(surface, tint, (x + width // 2, y + 30), (arm_end_x, y + 30), 5)
+
+    # 腿部，随动画帧前后摆动
+    swing = LEG_SWING[frame] if facing_right else -LEG_SWING[frame]
+    leg_y = y + height
+    pygame.draw.line(surface, tint, (x + 15, leg_y), (x + 15 + swing, leg_y + 10), 8)
+    pygame.draw.line(surface, tint, (x + width - 15, leg_y), (x + width - 15 - swing, leg_y + 10), 8)
+
+class SpriteAtlas:
+    """
+    一张图集Surface，每种颜色占一行，行内依次是各状态、朝向和动画帧
+    frames[颜色][状态][是否面向右][动画帧]为对应帧的subsurface
+    """
+    def __init__(self, colors, width, height):
+        self.colors = tuple(colors)
+        self.width = width
+        self.height = height
+        self.frame_width, self.frame_height = frame_size(width, height)
+        columns = len(STATE_TINTS) * 2 * ANIMATION_FRAMES
+
+        sheet = pygame.Surface((columns * self.frame_width, len(self.colors) * self.frame_height), pygame.SRCALPHA)
+        for row, color in enumerate(self.colors):
+            for column, (state, facing_right, frame) in enumerate(self._layout()):
+                _draw_frame(sheet, column * self.frame_width, row * self.frame_height,
+                            width, height, color, state, facing_right, frame)
+        # 有显示窗口时转换成屏幕的像素格式，blit时不用再逐像素转换
+        if pygame.display.get_surface() is not None:
+            sheet = sheet.convert_alpha()
+        self.sheet = sheet
+
+        self.frames = {}
+        for row, color in enumerate(self.colors):
+            table = [[[None] * ANIMATION_FRAMES for _ in range(2)] for _ in STATE_TINTS]
+            for column, (state, facing_right, frame) in enumerate(self._layout()):
+                rect = (column * self.frame_width, row * self.frame_height, self.frame_width, self.frame_height)
+                sprite = sheet.subsurface(rect)
+                # 每帧单独做RLE编码，透明像素在blit时整段跳过
+                sprite.set_alpha(255, pygame.RLEACCEL)
+                table[state][facing_right][frame] = sprite
+            self.frames[color] = tuple(tuple(tuple(frames) for frames in facings) for facings in table)
+
+    @staticmethod
+    def _layout():
+        for state in range(len(STATE_TINTS)):
+            for facing_right in (False, True):
+                for frame in range(ANIMATION_FRAMES):
+                    yield state, facing_right, frame
+
+# 已加载的图集，按角色尺寸分组
+_atlases = {}
+
+def load_sprite_atlas(colors, width, height):
+    """把colors中还没有图集的颜色一次性烘焙进一张新图集"""
+    atlases = _atlases.setdefault((width, height), [])
+    missing = [color for color in dict.fromkeys(colors)
+               if not any(color in atlas.frames for atlas in atlases)]
+    if missing:
+        atlases.append(SpriteAtlas(missing, width, height))
+
+def get_sprite_frames(color, width, height):
+    """某种颜色角色的帧表，颜色还没有加载时单独为它生成一张图集"""
+    for atlas in _atlases.get((width, height), ()):
+        frames = atlas.frames.get(color)
+        if frames is not None:
+            return frames
+    load_sprite_atlas((color,), width, height)
+    return _atlases[(width, height)][-1].frames[color]
@@ -0,0 +1,126 @@
+"""
+北航自由搏击 - AI循环赛
+在进程池上让各难度AI两两对战，输出胜/平/负矩阵、平均对局时长和Elo等级分
+用法：python tournament.py --games 200 --workers 8 --seed 2025
+"""
+
+import argparse
+import json
+import os
+import time
+from functools import partial
+from itertools import permutations
+from multiprocessing import Pool
+
+from fight_core import FPS, AIDifficulty, run_ai_match
+
+def match_seed(base_seed, index):
+    """每局对战的种子只由基础种子和对局编号决定，与进程调度顺序无关"""
+    return (base_seed * 1000003 + index) & 0xFFFFFFFFFFFF
+
+def schedule(difficulties, games, base_seed):
+    """生成循环赛赛程：每对难度各打games局，双方各执一半玩家1位置，局数为奇数时列表中靠前的难度多执一局"""
+    matches = []
+    order = {difficulty: i for i, difficulty in enumerate(difficulties)}
+    for p1, p2 in permutations(difficulties, 2):
+        for _ in range(games // 2 + (order[p1] < order[p2] and games % 2)):
+            index = len(matches)
+            matches.append((index, p1.name, p2.name, match_seed(base_seed, index)))
+    return matches
+
+def play(match, ai_options=None):
+    """进程池中执行的单局对战，返回(编号, 玩家1难度, 玩家2难度, 结果, 帧数)"""
+    index, p1_name, p2_name, seed = match
+    state = run_ai_match(AIDifficulty[p1_name], AIDifficulty[p2_name], seed=seed, ai_options=ai_options)
+    if state.winner is state.player1:
+        result = 1.0
+    elif state.winner is state.player2:
+        result = 0.0
+    else:
+        result = 0.5
+    return index, p1_name, p2_name, result, state.tick
+
+def elo_ratings(results, names, k=16, initial=1500):
+    """按对局编号顺序更新Elo，保证相同种子得到相同等级分"""
+    ratings = {name: float(initial) for name in names}
+    for _, p1, p2, score, _ in sorted(results):
+        expected = 1 / (1 + 10 ** ((ratings[p2] - ratings[p1]) / 400))
+        ratings[p1] += k * (score - expected)
+        ratings[p2] -= k * (score - expected)
+    return ratings
+
+def summarize(results, names):
+    """汇总胜/平/负矩阵（行对列，行方视角）和各难度平均对局时长"""
+    matrix = {row: {col: [0, 0, 0] for col in names if col != row} for row in names}
+    total_ticks = {name: 0 for name in names}
+    played = {name: 0 for name in names}
+    for _, p1, p2, score, ticks in results:
+        slot = {1.0: 0, 0.5: 1, 0.0: 2}[score]
+        matrix[p1][p2][slot] += 1
+        matrix[p2][p1][2 - slot] += 1
+        for name in (p1, p2):
+            total_ticks[name] += ticks
+            played[name] += 1
+    mean_length = {name: total_ticks[name] / played[name] / FPS if played[name] else 0.0 for name in names}
+    return matrix, mean_length
+
+def print_report(matrix, mean_length, ratings, names):
+    width = 14
+    print("胜/平/负矩阵（行方对列方）")
+    print(" " * 8 + "".join(name.rjust(width) for name in names))
+    for row in names:
+        cells = []
+        for col in names:
+            if col == row:
+                cells.append("-".rjust(width))
+            else:
+                win, draw, loss = matrix[row][col]
+                cells.append(f"{win}/{draw}/{loss}".rjust(width))
+        print(row.ljust(8) + "".join(cells))
+    print()
+    print(f"{'难度':<8}{'平均时长(秒)':>14}{'Elo':>10}")
+    for name in sorted(names, key=lambda n: -ratings[n]):
+        print(f"{name:<8}{mean_length[name]:>14.1f}{ratings[name]:>10.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="AI难度循环赛")
+    parser.add_argument('--games', type=int, default=100, help="每对难度之间的对局数")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="进程数，默认使用全部CPU核心")
+    parser.add_argument('--seed', type=int, default=0, help="基础随机种子")
+    parser.add_argument('--json', help="把结果另存为JSON文件")
+    parser.add_argument('--search-nodes', type=int, default=1200,
+                        help="大师难度每次决策的模拟帧数上限；循环赛按节点数而不是时间限制搜索，保证结果可复现")
+    parser.add_argument('--difficulties', nargs='+', choices=[d.name for d in AIDifficulty],
+                        help="只让指定难度参赛，默认全部（未指定--policy时不含NEURAL）")
+    parser.add_argument('--policy', help="NEURAL难度使用的神经网络策略文件")
+    args = parser.parse_args()
+
+    if args.difficulties:
+        difficulties = [AIDifficulty[name] for name in args.difficulties]
+    else:
+        difficulties = [d for d in AIDifficulty if d != AIDifficulty.NEURAL or args.policy]
+    if AIDifficulty.NEURAL in difficulties and not args.policy:
+        parser.error("NEURAL难度需要--policy")
+    names = [d.name for d in difficulties]
+    matches = schedule(difficulties, args.games, args.seed)
+
+    start = time.perf_counter()
+    # 单局耗时很短，按块分发以减少进程间通信
+    chunksize = max(1, len(matches) // (args.workers * 8))
+    with Pool(args.workers) as pool:
+        ai_options = {'budget_ms': None, 'max_nodes': args.search_nodes, 'policy': args.policy}
+        results = list(pool.imap_unordered(partial(play, ai_options=ai_options), matches, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    matrix, mean_length = summarize(results, names)
+    ratings = elo_ratings(results, names)
+    print_report(matrix, mean_length, ratings, names)
+    print(f"\n共{len(results)}局，{args.workers}个进程，用时{elapsed:.2f}秒（{len(results) / elapsed:.0f}局/秒）")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'seed': args.seed, 'games': args.games, 'matrix': matrix,
+                       'mean_length': mean_length, 'elo': ratings}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+北航自由搏击 - 向量化训练环境
+在batch_sim.BatchMatch上同时运行N局对战，玩家1由训练中的策略控制，
+玩家2由向量化的AIController策略表控制，提供reset()/step(actions)接口，
+观测、奖励和结束标志都写入预先分配的数组，每步不分配新的观测数组
+
+用法：python training_env.py --envs 4096 --steps 2000 --opponent HARD
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from fight_core import (SCREEN_WIDTH, FPS, MATCH_DURATION, AIDifficulty, AIController,
+                        AI_POLICY_TABLES, FighterCore)
+from batch_sim import BIT, BatchMatch
+
+_PROTO = FighterCore(0, 0, '')
+
+# 训练策略的离散动作，与AIController的动作名一致
+ENV_ACTIONS = ('wait', 'move_closer', 'move_back', 'jump', 'attack', 'special_attack', 'block', 'dash')
+
+# 策略表中出现的全部动作，'approach'在决策时换成move_left/move_right
+POLICY_ACTIONS = ('wait', 'move_left', 'move_right', 'move_closer', 'move_back',
+                  'jump', 'attack', 'special_attack', 'block', 'dash')
+_POLICY_INDEX = {action: i for i, action in enumerate(POLICY_ACTIONS)}
+_APPROACH = -1
+
+# 不依赖方向的动作直接对应的按键位
+_FIXED_BITS = np.zeros(len(POLICY_ACTIONS), dtype=np.int64)
+for _action, _key in (('move_left', 'left'), ('move_right', 'right'), ('jump', 'jump'),
+                      ('attack', 'attack'), ('special_attack', 'special'),
+                      ('block', 'block'), ('dash', 'dash')):
+    _FIXED_BITS[_POLICY_INDEX[_action]] = BIT[_key]
+
+# 每名角色的观测字段，观测向量依次为：己方字段、对手字段、相对距离、剩余时间比例
+FIGHTER_FEATURES = ('x', 'height', 'velocity_y', 'health', 'special_energy', 'dash_cooldown',
+                    'stunned', 'attacking', 'blocking', 'dashing', 'facing_right')
+OBS_SIZE = 2 * len(FIGHTER_FEATURES) + 2
+
+def observe(me, opponent, ticks, ground_y, out):
+    """
+    单局版本的观测：按与VectorFightEnv相同的布局把me视角的观测写入out（长度OBS_SIZE），
+    用于在游戏或标量对战中运行训练好的策略
+    """
+    current_time = ticks * 1000 // FPS
+    width = len(FIGHTER_FEATURES)
+    for base, fighter in ((0, me), (width, opponent)):
+        out[base] = fighter.x * (1 / SCREEN_WIDTH)
+        out[base + 1] = (ground_y - fighter.height - fighter.y) * (1 / 200)
+        out[base + 2] = fighter.velocity_y * (1 / fighter.jump_power)
+        out[base + 3] = fighter.health * (1 / fighter.max_health)
+        out[base + 4] = fighter.special_energy * (1 / fighter.max_special_energy)
+        out[base + 5] = max(0, fighter.dash_cooldown - (current_time - fighter.last_dash_time)) * (1 / fighter.dash_cooldown)
+        out[base + 6] = fighter.stunned
+        out[base + 7] = fighter.is_attacking
+        out[base + 8] = fighter.is_blocking
+        out[base + 9] = fighter.is_dashing
+        out[base + 10] = fighter.facing_right
+    out[2 * width] = (opponent.x - me.x) * (1 / SCREEN_WIDTH)
+    out[2 * width + 1] = 1 - ticks * (1 / (MATCH_DURATION * FPS))
+    return out
+
+def action_masks(actions, me, opponent, x, out):
+    """
+    把动作编号（POLICY_ACTIONS下标）换算成输入位掩码写入out
+    move_closer/move_back按当前双方位置决定方向
+    """
+    np.take(_FIXED_BITS, actions, out=out)
+    toward = np.where(x[:, opponent] > x[:, me], BIT['right'], BIT['left'])
+    away = np.where(x[:, opponent] > x[:, me], BIT['left'], BIT['right'])
+    out += np.where(actions == _POLICY_INDEX['move_closer'], toward, 0)
+    out += np.where(actions == _POLICY_INDEX['move_back'], away, 0)
+    return out
+
+class VectorPolicy:
+    """
+    N个AIController的向量化版本：决策间隔、动作计时器和预编译策略表都与标量版本一致，
+    只是随机数来自NumPy，所以单局结果不同但动作分布相同
+    """
+    def __init__(self, count, difficulty, rng):
+        self.count = count
+        self.rng = rng
+        self.decision_interval = AIController(_PROTO, difficulty)._get_decision_interval()
+
+        # 策略表展开成(24, K)的数组，动作不足K个的格子重复最后一项
+        table = AI_POLICY_TABLES.get(difficulty, AI_POLICY_TABLES[AIDifficulty.MEDIUM])
+        width = max(len(cell) for cell in table)
+        shape = (len(table), width)
+        self.bounds = np.full(shape, np.inf)  # 查找用的上界，最后一项为inf以兜住浮点误差
+        self.upper = np.ones(shape)           # 真实的累积概率，用于换算持续帧数
+        self.lower = np.zeros(shape)
+        self.actions = np.zeros(shape, dtype=np.int64)
+        self.low = np.zeros(shape, dtype=np.int64)
+        self.span = np.ones(shape, dtype=np.int64)
+        for c, cell in enumerate(table):
+            previous = 0.0
+            for k, (total, action, low, high) in enumerate(cell):
+                if k < len(cell) - 1:
+                    self.bounds[c, k] = total
+                self.upper[c, k:] = total
+                self.lower[c, k:] = previous
+                self.actions[c, k:] = _APPROACH if action == 'approach' else _POLICY_INDEX[action]
+                self.low[c, k:] = low
+                self.span[c, k:] = high - low + 1
+                previous = total
+
+        self.current_action = np.zeros(count, dtype=np.int64)
+        self.action_timer = np.zeros(count, dtype=np.int64)
+        self.last_decision_time = np.zeros(count, dtype=np.int64)
+        self.reset()
+
+    def reset(self, rows=slice(None)):
+        self.current_action[rows] = _POLICY_INDEX['wait']
+        self.action_timer[rows] = 0
+        self.last_decision_time[rows] = -self.decision_interval
+
+    def sample(self, cells, draws):
+        """用[0, 1)随机数在各格子中选出(动作, 持续帧数)，与fight_core.sample_policy_cell相同"""
+        index = (draws[:, None] >= self.bounds[cells]).sum(axis=1)
+        previous = self.lower[cells, index]
+        fraction = (draws - previous) / (self.upper[cells, index] - previous)
+        span = self.span[cells, index]
+        timer = self.low[cells, index] + np.minimum((fraction * span).astype(np.int64), span - 1)
+        return self.actions[cells, index], timer
+
+    def act(self, batch, me, active, out):
+        """推进一帧AI并把玩家me的输入位掩码写入out，对应AIController.update"""
+        opponent = 1 - me
+        current_time = batch.ticks * 1000 // FPS
+        self.action_timer -= self.action_timer > 0
+
+        decide = active & (current_time - self.last_decision_time >= self.decision_interval)
+        if decide.any():
+            rows = np.flatnonzero(decide)
+            distance = np.abs(batch.x[rows, me] - batch.x[rows, opponent])
+            bucket = (distance <= 200).astype(np.int64) + (distance <= 80)
+            can_dash = ((current_time[rows] - batch.last_dash_time[rows, me] >= _PROTO.dash_cooldown)
+                        & ~batch.stunned[rows, me] & ~batch.is_attacking[rows, me]
+                        & ~batch.is_dashing[rows, me])
+            cells = (bucket * 8
+                     + (batch.special_energy[rows, me] >= _PROTO.special_energy_cost) * 4
+                     + can_dash * 2
+                     + batch.is_attacking[rows, opponent])
+            actions, timers = self.sample(cells, self.rng.random(len(rows)))
+            approach = actions == _APPROACH
+            actions[approach] = np.where(batch.x[rows[approach], opponent] > batch.x[rows[approach], me],
+                                         _POLICY_INDEX['move_right'], _POLICY_INDEX['move_left'])
+            self.current_action[rows] = actions
+            self.action_timer[rows] = timers
+            self.last_decision_time[rows] = current_time[rows]
+
+        action_masks(self.current_action, me, opponent, batch.x, out)
+        out[self.action_timer <= 0] = 0
+        return out
+
+class VectorFightEnv:
+    """
+    N局并行的训练环境，玩家1为训练对象
+    step(actions)中actions为长度N的ENV_ACTIONS下标，返回(obs, rewards, dones)，
+    三者都是环境内部预先分配的数组，每次调用原地覆盖；结束的对局自动重开，
+    对应的obs已经是新一局的初始观测，last_winner记录刚结束对局的胜负（0己方、1对手、-1平局）
+    奖励：每帧(造成伤害 - 受到伤害) / 100，获胜+1，失败-1
+    """
+    def __init__(self, count, opponent=AIDifficulty.MEDIUM, seed=0):
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+        self.batch = BatchMatch(count)
+        self.opponent = VectorPolicy(count, opponent, self.rng)
+
+        self.observations = np.zeros((count, OBS_SIZE), dtype=np.float32)
+        self.rewards = np.zeros(count, dtype=np.float32)
+        self.dones = np.zeros(count, dtype=bool)
+        self.last_winner = np.full(count, -1, dtype=np.int8)
+        self.episodes = 0
+
+        # 每步复用的中间数组
+        self.masks = np.zeros((count, 2), dtype=np.int64)
+        self.agent_actions = np.zeros(count, dtype=np.int64)
+        self.previous_health = np.zeros((count, 2), dtype=np.int32)
+        self.scratch = np.zeros(count, dtype=np.float64)
+
+        self._env_to_policy = np.array([_POLICY_INDEX[action] for action in ENV_ACTIONS], dtype=np.int64)
+
+    def reset(self):
+        self.batch.reset()
+        self.opponent.reset()
+        self.rewards[:] = 0
+        self.dones[:] = False
+        self._fill_observations()
+        return self.observations
+
+    def step(self, actions):
+        batch = self.batch
+        np.take(self._env_to_policy, actions, out=self.agent_actions)
+        action_masks(self.agent_actions, 0, 1, batch.x, self.masks[:, 0])
+        self.opponent.act(batch, 1, ~batch.finished, self.masks[:, 1])
+
+        np.copyto(self.previous_health, batch.health)
+        batch.step(self.masks)
+
+        # 伤害差奖励
+        np.subtract(self.previous_health[:, 1], batch.health[:, 1], out=self.scratch)
+        self.scratch -= self.previous_health[:, 0]
+        self.scratch += batch.health[:, 0]
+        np.multiply(self.scratch, 0.01, out=self.rewards, casting='unsafe')
+
+        np.copyto(self.dones, batch.finished)
+        if self.dones.any():
+            rows = np.flatnonzero(self.dones)
+            winner = batch.winner[rows]
+            self.rewards[rows] += np.where(winner == 0, 1.0, np.where(winner == 1, -1.0, 0.0))
+            self.last_winner[rows] = winner
+            self.episodes += len(rows)
+            batch.reset(rows)
+            self.opponent.reset(rows)
+
+        self._fill_observations()
+        return self.observations, self.rewards, self.dones
+
+    def _fill_observations(self):
+        """按FIGHTER_FEATURES原地写入观测，数值都缩放到[-1, 1]附近"""
+        batch = self.batch
+        obs = self.observations
+        floor = batch.ground_y - _PROTO.height
+        width = len(FIGHTER_FEATURES)
+        for p in (0, 1):
+            base = p * width
+            np.multiply(batch.x[:, p], 1 / SCREEN_WIDTH, out=obs[:, base], casting='unsafe')
+            np.subtract(floor, batch.y[:, p], out=obs[:, base + 1], casting='unsafe')
+            obs[:, base + 1] *= 1 / 200
+            np.multiply(batch.velocity_y[:, p], 1 / _PROTO.jump_power, out=obs[:, base + 2], casting='unsafe')
+            np.multiply(batch.health[:, p], 1 / _PROTO.max_health, out=obs[:, base + 3], casting='unsafe')
+            np.multiply(batch.special_energy[:, p], 1 / _PROTO.max_special_energy, out=obs[:, base + 4],
+                        casting='unsafe')
+
+            # 闪现剩余冷却 = max(0, 冷却 - (当前时间 - 上次闪现)) / 冷却
+            np.multiply(batch.ticks, 1000, out=self.scratch, casting='unsafe')
+            np.floor_divide(self.scratch, FPS, out=self.scratch)
+            self.scratch -= batch.last_dash_time[:, p]
+            np.subtract(_PROTO.dash_cooldown, self.scratch, out=self.scratch)
+            np.maximum(self.scratch, 0, out=self.scratch)
+            np.multiply(self.scratch, 1 / _PROTO.dash_cooldown, out=obs[:, base + 5], casting='unsafe')
+
+            np.copyto(obs[:, base + 6], batch.stunned[:, p])
+            np.copyto(obs[:, base + 7], batch.is_attacking[:, p])
+            np.copyto(obs[:, base + 8], batch.is_blocking[:, p])
+            np.copyto(obs[:, base + 9], batch.is_dashing[:, p])
+            np.copyto(obs[:, base + 10], batch.facing_right[:, p])
+
+        np.subtract(batch.x[:, 1], batch.x[:, 0], out=obs[:, 2 * width], casting='unsafe')
+        obs[:, 2 * width] *= 1 / SCREEN_WIDTH
+        np.multiply(batch.ticks, -1 / (MATCH_DURATION * FPS), out=obs[:, 2 * width + 1], casting='unsafe')
+        obs[:, 2 * width + 1] += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="向量化训练环境吞吐量测试（随机策略）")
+    parser.add_argument('--envs', type=int, default=4096, help="并行环境数")
+    parser.add_argument('--steps', type=int, default=2000, help="每个环境的步数")
+    parser.add_argument('--opponent', default='MEDIUM', choices=[d.name for d in AIDifficulty if d in AI_POLICY_TABLES])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    env = VectorFightEnv(args.envs, AIDifficulty[args.opponent], args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    actions = np.zeros(args.envs, dtype=np.int64)
+    env.reset()
+    wins = losses = 0
+    total_reward = 0.0
+
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        actions[:] = rng.integers(0, len(ENV_ACTIONS), args.envs)
+        _, rewards, dones = env.step(actions)
+        total_reward += float(rewards.sum())
+        if dones.any():
+            wins += int((env.last_winner[dones] == 0).sum())
+            losses += int((env.last_winner[dones] == 1).sum())
+    elapsed = time.perf_counter() - start
+
+    steps = args.envs * args.steps
+    print(f"{steps:,}步 用时{elapsed:.2f}秒，{steps / elapsed:,.0f}步/秒（{steps / elapsed * 3600 / 1e6:,.0f}百万步/小时）")
+    print(f"结束{env.episodes}局：随机策略胜{wins} 负{losses}，平均每步奖励{total_reward / steps:+.5f}")
+
+if __name__ == "__main__":
+    main()